@@ -0,0 +1,62 @@
+"""
+Load-test the JSON API served alongside the GUI.
+
+Starts N concurrent clients, each with its own keep-alive connection, that issue
+requests against a running `main.py --gui` server and report latency percentiles.
+
+Usage:
+    uv run main.py --gui &
+    uv run python -m benchmarks.api_load --clients 8 --requests 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def client(base_url, endpoint, num_requests, latencies):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as http:
+        for _ in range(num_requests):
+            start = time.perf_counter()
+            response = await http.get(endpoint)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+
+async def run(base_url, endpoint, num_clients, num_requests):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(base_url, endpoint, num_requests, latencies) for _ in range(num_clients)
+    ))
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent latency test for the inference API")
+    parser.add_argument("--url", type=str, default="http://localhost:4000")
+    parser.add_argument("--endpoint", type=str, default="/api/top?n=30")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per client")
+    args = parser.parse_args()
+
+    latencies, elapsed = asyncio.run(run(args.url, args.endpoint, args.clients, args.requests))
+    latencies_ms = [latency * 1000 for latency in latencies]
+    print(f"{len(latencies)} requests from {args.clients} clients in {elapsed:.2f} s "
+          f"({len(latencies) / elapsed:.1f} req/s)")
+    print(f"p50 {percentile(latencies_ms, 0.50):.1f} ms  "
+          f"p99 {percentile(latencies_ms, 0.99):.1f} ms  "
+          f"mean {statistics.mean(latencies_ms):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare model load times from the Hugging Face cache and from a local snapshot.
+
+Each load runs in a fresh process. The "cold" snapshot load first asks the kernel to
+drop the snapshot's pages from the page cache (Linux only); the "warm" load follows
+immediately after, with the pages still cached.
+
+Usage:
+    uv run main.py --prepare-model
+    uv run python -m benchmarks.load_time --snapshot snapshots/Qwen2.5-0.5B
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from src.snapshot import WEIGHTS_FILE
+
+
+def _load(model_name, queue):
+    start = time.perf_counter()
+    from src.explorer import Explorer
+
+    explorer = Explorer(model_name)
+    loaded = time.perf_counter()
+    explorer.set_prompt("Hello, world").get_top_n_tokens(n=5)
+    queue.put((loaded - start, time.perf_counter() - start))
+
+
+def _timed_load(model_name):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_load, args=(model_name, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _drop_page_cache(path):
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model load times")
+    parser.add_argument("--model", type=str, default="Qwen/Qwen2.5-0.5B")
+    parser.add_argument("--snapshot", type=str, required=True, help="Snapshot written by --prepare-model")
+    args = parser.parse_args()
+
+    runs = [("from_pretrained", args.model)]
+    dropped = _drop_page_cache(os.path.join(args.snapshot, WEIGHTS_FILE))
+    runs.append(("snapshot (cold)" if dropped else "snapshot (first)", args.snapshot))
+    runs.append(("snapshot (warm)", args.snapshot))
+
+    for label, model_name in runs:
+        load_seconds, first_query_seconds = _timed_load(model_name)
+        print(f"{label:>18}: load {load_seconds:6.2f} s, load + first top-n {first_query_seconds:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
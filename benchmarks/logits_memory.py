@@ -0,0 +1,61 @@
+"""
+Compare peak memory of next-token scoring with full-sequence logits versus the
+last-position-only projection used by Explorer.get_top_n_tokens.
+
+Each variant runs in a fresh process so that its peak RSS is measured in isolation.
+
+Usage:
+    uv run python -m benchmarks.logits_memory --tokens 2048
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+
+import torch
+
+from src.explorer import Explorer
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run(variant, model_name, num_tokens, queue):
+    explorer = Explorer(model_name)
+    explorer.prompt_tokens = [explorer.tokenizer.encode(" the")[0]] * num_tokens
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    if variant == "full":
+        input_ids = torch.tensor([explorer.prompt_tokens], dtype=torch.long, device=explorer.device)
+        with torch.no_grad():
+            logits = explorer.model(input_ids).logits
+            torch.topk(torch.softmax(logits[0, -1, :], dim=0), 30)
+    else:
+        explorer.get_top_n_tokens(n=30)
+    elapsed = time.perf_counter() - start
+    queue.put((baseline, _peak_rss_mb(), elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of next-token scoring")
+    parser.add_argument("--model", type=str, default="Qwen/Qwen2.5-0.5B")
+    parser.add_argument("--tokens", type=int, default=2048)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    for variant in ("full", "last"):
+        queue = context.Queue()
+        process = context.Process(target=_run, args=(variant, args.model, args.tokens, queue))
+        process.start()
+        baseline, peak, elapsed = queue.get()
+        process.join()
+        print(f"{variant:>5} logits: peak RSS {peak:8.1f} MB "
+              f"(+{peak - baseline:7.1f} MB over loaded model), {elapsed * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Time nearest-neighbour token lookups over the input embedding index.
+
+Reports the time to build the index from the model, to load it back from its disk
+cache in each storage dtype, and the per-query latency for single and batched lookups.
+
+Usage:
+    uv run python -m benchmarks.nearest_tokens
+"""
+import argparse
+import tempfile
+import time
+
+from src.embedding_index import EmbeddingIndex
+from src.explorer import Explorer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest-token lookup latency")
+    parser.add_argument("--model", type=str, default="Qwen/Qwen2.5-0.5B")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    explorer = Explorer(args.model)
+    start = time.perf_counter()
+    index = EmbeddingIndex.from_model(explorer.model, device=explorer.device)
+    print(f"build: {time.perf_counter() - start:.2f} s for {tuple(index.embeddings.shape)}")
+
+    with tempfile.TemporaryDirectory() as path:
+        for dtype in ("float16", "int8"):
+            index.save(path, dtype=dtype)
+            start = time.perf_counter()
+            EmbeddingIndex.load(path, device=explorer.device)
+            print(f"load ({dtype}): {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    token_ids = explorer.encode(" the quick brown fox jumps over the lazy dog")
+    for batch in (token_ids[:1], token_ids):
+        index.nearest(batch, k=10)
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            index.nearest(batch, k=10)
+        elapsed = (time.perf_counter() - start) / args.repeats
+        print(f"{len(batch):>2} queries: {elapsed * 1000:.1f} ms per lookup")
+
+
+if __name__ == "__main__":
+    main()
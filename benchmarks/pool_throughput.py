@@ -0,0 +1,42 @@
+"""
+Measure next-token throughput of ExplorerPool as the number of workers grows.
+
+Usage:
+    uv run python -m benchmarks.pool_throughput --prompts 64 --workers 1 2 4 8
+"""
+import argparse
+import os
+import time
+
+from src.explorer import Explorer
+from src.pool import ExplorerPool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ExplorerPool throughput")
+    parser.add_argument("--model", type=str, default="Qwen/Qwen2.5-0.5B")
+    parser.add_argument("--prompts", type=int, default=64)
+    parser.add_argument("--tokens", type=int, default=256, help="Tokens per prompt")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    explorer = Explorer(args.model)
+    filler = explorer.tokenizer.encode(" the")[0]
+    prompts = [[filler] * args.tokens for _ in range(args.prompts)]
+
+    baseline = None
+    for num_workers in args.workers:
+        with ExplorerPool(explorer, num_workers=num_workers) as pool:
+            pool.top_n_tokens(prompts[:num_workers], n=30)  # warm up every worker
+            start = time.perf_counter()
+            pool.top_n_tokens(prompts, n=30)
+            elapsed = time.perf_counter() - start
+        throughput = len(prompts) / elapsed
+        baseline = baseline or throughput / num_workers
+        print(f"{num_workers:>3} workers x {pool.threads_per_worker:>2} threads "
+              f"({os.cpu_count()} cores): {throughput:7.2f} prompts/s, "
+              f"scaling {throughput / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
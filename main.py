@@ -1,11 +1,15 @@
 from itertools import cycle
 from src.explorer import Explorer
+from src.registry import ModelRegistry
+from src.prompt_view import PromptView
 from src.utils import probability_to_color
+from rich.markup import escape
 from textual.app import App, ComposeResult, Binding
 from textual.containers import VerticalScroll
 from textual.reactive import reactive
 from textual.widgets import Footer, Header, Static, DataTable
-from textwrap import dedent
+import json
+import math
 import random
 import sys
 import argparse
@@ -28,9 +32,21 @@ def load_config():
 
 config = load_config()
 MODEL_NAME = config["model"]["name"]
+DRAFT_MODEL_NAME = config["model"].get("draft")
+MODEL_NAMES = [MODEL_NAME] + config["model"].get("models", [])
+MEMORY_BUDGET_GB = config["model"].get("memory_budget_gb")
 EXAMPLE_PROMPT = config["prompt"]["example_prompt"]
 TOKENS_TO_SHOW = config["display"]["tokens_to_show"]
+TOP_P = config["display"].get("top_p")
 MAX_PROMPTS = config["prompt"]["max_prompts"]
+LENS_TOKENS = 5
+COMPARE_TOKENS = 5
+NEIGHBOUR_TOKENS = 8
+DIFF_ROWS = 20
+
+PROB_LEGEND = "[bold]Token prob:[/bold]" + "".join(
+    f"[on {probability_to_color(i/10)}] {i/10:.2f} [/on]" for i in range(11)
+)
 
 class TokenExplorer(App):
     """Main application class."""
@@ -46,115 +62,407 @@ class TokenExplorer(App):
                 ("w", "increment_prompt", "Next"),
                 ("s", "decrement_prompt", "Prev"),
                 ("x", "save_prompt", "Save"),
+                ("o", "export_session", "Export"),
                 ("j", "select_next", "Down"),
                 ("k", "select_prev", "Up"),
-                ("space", "append_weighted_token", "Weighted")
+                ("space", "append_weighted_token", "Weighted"),
+                ("g", "toggle_lens", "Lens"),
+                ("c", "toggle_compare", "Compare"),
+                ("n", "toggle_neighbours", "Similar"),
+                ("m", "next_model", "Model"),
+                ("v", "toggle_models", "Models"),
+                ("r", "toggle_continuations", "Rank"),
+                ("f", "toggle_diff", "Diff"),
+                ("F", "next_diff_prompt", "Diff vs"),
+                ("left_square_bracket", "cursor_prev", "Token<"),
+                ("right_square_bracket", "cursor_next", "Token>"),
+                ("b", "branch_at_cursor", "Branch")
 
                 ]
     
     
-    def __init__(self, prompt=EXAMPLE_PROMPT):
+    def __init__(self, prompt=EXAMPLE_PROMPT, candidates=None):
         super().__init__()
         # Add support for multiple prompts.
         self.prompts = [prompt]
         self.prompt_index = 0
-        self.explorer = Explorer(MODEL_NAME)
+        memory_budget = MEMORY_BUDGET_GB * 1024 ** 3 if MEMORY_BUDGET_GB else None
+        self.registry = ModelRegistry(MODEL_NAMES, memory_budget=memory_budget)
+        self.explorer = self.registry.activate(MODEL_NAME)
         self.explorer.set_prompt(prompt)
-        self.displayed_tokens = self.explorer.get_top_n_tokens(n=TOKENS_TO_SHOW)
+        # Token ids of each prompt, so switching prompts never re-encodes a branch from its text
+        self.prompts_tokens = [list(self.explorer.get_prompt_tokens())]
+        self.displayed_tokens = self._next_tokens()
         self.rows = self._top_tokens_to_rows(self.displayed_tokens)
         self.selected_row = 0  # Track currently selected token row
+        self.show_lens = False
+        self.show_compare = False
+        self.show_neighbours = False
+        self.show_models = False
+        self.show_continuations = False
+        self.show_diff = False
+        self.diff_prompt = None  # Prompt the diff compares with, None for the first (or second) one
+        self.candidates = candidates or []  # Continuations ranked after the prompt with 'r'
+        self.prompt_cursor = None  # Index of the selected prompt token, if any
+
+    def _next_tokens(self):
+        """Next-token candidates for the table: the top_p nucleus if configured, capped at TOKENS_TO_SHOW."""
+        if TOP_P is None:
+            return self.explorer.get_top_n_tokens(n=TOKENS_TO_SHOW)
+        return self.explorer.get_nucleus_tokens(top_p=TOP_P, max_n=TOKENS_TO_SHOW)
 
     def _top_tokens_to_rows(self, tokens):
-        return [("token_id", "token", "% probability")] + [
-            (token["token_id"], token["token"], int(round(token["probability"] * 100)))
-            for token in tokens
-        ]
+        percentages = (tokens.probs * 100).round().astype(int).tolist()
+        return [("token_id", "token", "% probability")] + list(
+            zip(tokens.token_ids.tolist(), tokens.tokens, percentages)
+        )
         
     def compose(self) -> ComposeResult:
         yield Header()
+        yield PromptView(id="prompt")
+        yield Static(id="results")
+        yield Static(id="alternatives")
+        yield Static(id="lens")
+        yield Static(id="compare")
+        yield Static(id="neighbours")
+        yield Static(id="models")
+        yield Static(id="continuations")
+        yield Static(id="diff")
         with VerticalScroll():
-            yield Static(id="results")
             yield DataTable(id="table")
         yield Footer()
 
     def _refresh_table(self):
         table = self.query_one(DataTable)
-        self.displayed_tokens = self.explorer.get_top_n_tokens(n=TOKENS_TO_SHOW)
+        self.displayed_tokens = self._next_tokens()
         self.rows = self._top_tokens_to_rows(self.displayed_tokens)
         table.clear()
         table.add_rows(self.rows[1:])
         # Reset cursor to top
         self.selected_row = 0
         table.move_cursor(row=self.selected_row)
-        self.query_one("#results", Static).update(self._render_prompt())
-    
-    def _render_prompt(self):
-        if self.display_mode == "prob":
-            prob_legend = "".join([
-                f"[on {probability_to_color(i/10)}] {i/10:.2f} [/on]"
-                for i in range(11)
-                ])
-            prompt_legend = f"[bold]Token prob:[/bold]{prob_legend}"
-            token_probs = self.explorer.get_prompt_token_probabilities()
-            token_strings = self.explorer.get_prompt_tokens_strings()
-            prompt_text = "".join(f"[on {probability_to_color(prob)}]{token}[/on]" for token, prob in zip(token_strings, token_probs))
-        else:
-            prompt_text = self.explorer.get_prompt()
-            prompt_legend = ""
-        return dedent(f"""
-{prompt_text}
+        self._render_lens()
+        self._render_compare()
+        self._render_models()
+        self._render_continuations()
+        self._render_diff()
 
+    def _render_lens(self):
+        """Show the top tokens each layer predicts after the selected prompt token, else the next token (logit lens)."""
+        lens = self.query_one("#lens", Static)
+        if not self.show_lens:
+            lens.update("")
+            return
+        title = "next token" if self.prompt_cursor is None else f"after token {self.prompt_cursor + 1}"
+        rows = [f"[bold]Logit lens[/bold]: {title}"]
+        for layer, tokens in enumerate(self.explorer.get_logit_lens(position=self.prompt_cursor, n=LENS_TOKENS)):
+            candidates = "  ".join(
+                f"{escape(repr(token['token']))} {token['probability'] * 100:.0f}%" for token in tokens
+            )
+            rows.append(f"[bold]{'emb' if layer == 0 else f'L{layer}':>4}[/bold]  {candidates}")
+        lens.update("\n".join(rows))
+    
+    def _render_alternatives(self):
+        """Show what the model considered instead of the selected prompt token."""
+        alternatives = self.query_one("#alternatives", Static)
+        if self.prompt_cursor is None:
+            alternatives.update("")
+            return
+        token_strings = self.explorer.get_prompt_tokens_strings()
+        candidates = self.explorer.get_prompt_alternatives()[self.prompt_cursor]
+        listing = "  ".join(
+            f"{escape(repr(token['token']))} {token['probability'] * 100:.0f}%" for token in candidates
+        ) or "(no context)"
+        alternatives.update(
+            f"[bold]Token {self.prompt_cursor + 1}[/bold] {escape(repr(token_strings[self.prompt_cursor]))}"
+            f"  [bold]alternatives:[/bold] {listing}"
+        )
 
+    def _set_prompt_cursor(self, index):
+        self.prompt_cursor = index
+        self.query_one(PromptView).set_cursor(index)
+        self._render_alternatives()
+        self._render_lens()
 
+    def _render_prompt(self):
+        """Rebuild the whole prompt view, e.g. after switching prompts or modes."""
+        self.prompt_cursor = None
+        self.query_one(PromptView).set_cursor(None)
+        self._render_alternatives()
+        token_strings = self.explorer.get_prompt_tokens_strings()
+        token_probs = self.explorer.get_prompt_token_probabilities() if self.display_mode == "prob" else None
+        self.query_one(PromptView).set_tokens(token_strings, token_probs)
+        self._render_status()
 
+    def _render_status(self):
+        prompt_legend = PROB_LEGEND if self.display_mode == "prob" else ""
+        self.query_one("#results", Static).update(
+            f"{prompt_legend}\n"
+            f"[bold]Prompt[/bold] {self.prompt_index+1}/{len(self.prompts)} tokens: {len(self.explorer.prompt_tokens)}"
+            f"  [bold]Model[/bold] {self.registry.active}"
+        )
 
-{prompt_legend}
-[bold]Prompt[/bold] {self.prompt_index+1}/{len(self.prompts)} tokens: {len(self.explorer.prompt_tokens)}
-""")
+    def _append_to_prompt(self, token):
+        """Append a token from the displayed table, updating only the tail of the prompt view."""
+        self.explorer.append_token(token["token_id"])
+        self._store_prompt()
+        # The table already holds the appended token's probability given the prefix
+        probability = token["probability"] if self.display_mode == "prob" else None
+        self.query_one(PromptView).append_token(token["token"], probability)
+        self._render_status()
+        self._refresh_table()  # This will reset cursor position
     
     def on_mount(self) -> None:
-        self.query_one("#results", Static).update(self._render_prompt())
+        self._render_prompt()
         table = self.query_one(DataTable)
         table.add_columns(*self.rows[0])
         table.add_rows(self.rows[1:])
         table.cursor_type = "row"
         
+    def _store_prompt(self):
+        self.prompts[self.prompt_index] = self.explorer.get_prompt()
+        self.prompts_tokens[self.prompt_index] = list(self.explorer.get_prompt_tokens())
+
+    def _load_prompt(self):
+        self.explorer.set_prompt_tokens(self.prompts_tokens[self.prompt_index])
+
     def action_add_prompt(self):
         if len(self.prompts) < MAX_PROMPTS:
             self.prompts.append(self.explorer.get_prompt())
+            self.prompts_tokens.append(list(self.explorer.get_prompt_tokens()))
             self.prompt_index = (self.prompt_index + 1) % len(self.prompts)
-            self.explorer.set_prompt(self.prompts[self.prompt_index])
-            self.query_one("#results", Static).update(self._render_prompt())
+            self._load_prompt()
+            self._render_prompt()
             self._refresh_table()
 
     def action_remove_prompt(self):
         if len(self.prompts) > 1:
             self.prompts.pop(self.prompt_index)
+            self.prompts_tokens.pop(self.prompt_index)
             self.prompt_index = (self.prompt_index - 1) % len(self.prompts)
-            self.explorer.set_prompt(self.prompts[self.prompt_index])
-            self.query_one("#results", Static).update(self._render_prompt())
+            self._load_prompt()
+            self._render_prompt()
             self._refresh_table()
     
     def action_increment_prompt(self):
         self.prompt_index = (self.prompt_index + 1) % len(self.prompts)
-        self.explorer.set_prompt(self.prompts[self.prompt_index])
-        self.query_one("#results", Static).update(self._render_prompt())
+        self._load_prompt()
+        self._render_prompt()
         self._refresh_table()
 
     def action_decrement_prompt(self):
         self.prompt_index = (self.prompt_index - 1) % len(self.prompts)
-        self.explorer.set_prompt(self.prompts[self.prompt_index])
-        self.query_one("#results", Static).update(self._render_prompt())
+        self._load_prompt()
+        self._render_prompt()
         self._refresh_table()
 
     def action_change_display_mode(self):
         self.display_mode = next(self.display_modes)
-        self.query_one("#results", Static).update(self._render_prompt())
+        self._render_prompt()
+
+    def action_cursor_prev(self):
+        """Select the previous prompt token (starting from the end)."""
+        num_tokens = len(self.explorer.get_prompt_tokens())
+        if self.prompt_cursor is None:
+            self._set_prompt_cursor(num_tokens - 1)
+        elif self.prompt_cursor > 0:
+            self._set_prompt_cursor(self.prompt_cursor - 1)
+
+    def action_cursor_next(self):
+        """Select the next prompt token, clearing the selection past the end."""
+        if self.prompt_cursor is None:
+            return
+        if self.prompt_cursor < len(self.explorer.get_prompt_tokens()) - 1:
+            self._set_prompt_cursor(self.prompt_cursor + 1)
+        else:
+            self._set_prompt_cursor(None)
+
+    def action_branch_at_cursor(self):
+        """Copy the prompt up to (not including) the selected token into a new prompt."""
+        if self.prompt_cursor is None or self.prompt_cursor == 0 or len(self.prompts) >= MAX_PROMPTS:
+            return
+        # Cached scores and KV for the shared prefix are reused, no token-by-token popping
+        self.explorer.set_prompt_tokens(self.explorer.get_prompt_tokens()[:self.prompt_cursor])
+        self.prompts.append(self.explorer.get_prompt())
+        self.prompts_tokens.append(list(self.explorer.get_prompt_tokens()))
+        self.prompt_index = len(self.prompts) - 1
+        self._render_prompt()
+        self._refresh_table()
+
+    def _render_compare(self):
+        """Show the top next tokens of every prompt side by side, scoring changed prompts in one batch."""
+        compare = self.query_one("#compare", Static)
+        if not self.show_compare:
+            compare.update("")
+            return
+        # Same settings as the table, so switching to any of these prompts needs no forward pass
+        distributions = self.explorer.get_top_n_tokens_batch(self.prompts_tokens, n=TOKENS_TO_SHOW, top_p=TOP_P)
+        rows = []
+        for index, (prompt, tokens) in enumerate(zip(self.prompts, distributions)):
+            marker = ">" if index == self.prompt_index else " "
+            candidates = "  ".join(
+                f"{escape(repr(token['token']))} {token['probability'] * 100:.0f}%" for token in tokens[:COMPARE_TOKENS]
+            )
+            rows.append(f"[bold]{marker}{index + 1}[/bold] {escape(repr(prompt[-30:]))}  {candidates}")
+        compare.update("\n".join(rows))
+
+    def _render_neighbours(self, row=None):
+        """Show the tokens nearest to the highlighted candidate in input embedding space."""
+        neighbours = self.query_one("#neighbours", Static)
+        if row is None:
+            row = self.query_one(DataTable).cursor_row
+        if not self.show_neighbours or row is None or row >= len(self.displayed_tokens):
+            neighbours.update("")
+            return
+        token = self.displayed_tokens[row]
+        similar = self.explorer.get_nearest_tokens([token["token_id"]], n=NEIGHBOUR_TOKENS)[0]
+        listing = "  ".join(f"{escape(repr(match['token']))} {match['similarity']:.2f}" for match in similar)
+        neighbours.update(f"[bold]Similar to[/bold] {escape(repr(token['token']))}: {listing}")
+
+    def on_data_table_row_highlighted(self, event):
+        self._render_neighbours(event.cursor_row)
+
+    def action_toggle_neighbours(self):
+        self.show_neighbours = not self.show_neighbours
+        self._render_neighbours()
+
+    def _render_models(self):
+        """Show the top next tokens of every configured model, computed concurrently."""
+        models = self.query_one("#models", Static)
+        if not self.show_models:
+            models.update("")
+            return
+        distributions = self.registry.top_n_tokens(self.explorer.get_prompt(), n=COMPARE_TOKENS)
+        rows = []
+        for model_name, tokens in distributions.items():
+            marker = ">" if model_name == self.registry.active else " "
+            candidates = "  ".join(
+                f"{escape(repr(token['token']))} {token['probability'] * 100:.0f}%" for token in tokens
+            )
+            rows.append(f"[bold]{marker}{escape(model_name)}[/bold]  {candidates}")
+        models.update("\n".join(rows))
+
+    def action_next_model(self):
+        """Switch to the next configured model, keeping the prompts."""
+        if len(self.registry.model_names) < 2:
+            return
+        self.explorer = self.registry.activate(self.registry.next_model(self.registry.active))
+        # Token ids belong to the previous model's tokenizer
+        self.prompts_tokens = [self.explorer.encode(prompt) for prompt in self.prompts]
+        self._load_prompt()
+        self._render_prompt()
+        self._refresh_table()
+
+    def action_toggle_models(self):
+        self.show_models = not self.show_models
+        self._render_models()
+
+    def _render_continuations(self):
+        """Rank the --candidates continuations after the prompt, scored in one batch."""
+        continuations = self.query_one("#continuations", Static)
+        if not self.show_continuations:
+            continuations.update("")
+            return
+        if not self.candidates:
+            continuations.update("No candidates: start with --candidates FILE (one continuation per line)")
+            return
+        scores = self.explorer.score_continuations(self.candidates)
+        ranked = sorted(zip(self.candidates, scores), key=lambda pair: pair[1]["logprob"], reverse=True)
+        rows = []
+        for candidate, score in ranked:
+            per_token = "  ".join(
+                f"{escape(repr(token))} {math.exp(logprob) * 100:.0f}%"
+                for token, logprob in zip(score["tokens"], score["token_logprobs"])
+            )
+            rows.append(f"[bold]{score['logprob']:8.2f}[/bold] {escape(repr(candidate))}  {per_token}")
+        continuations.update("\n".join(rows))
+
+    def _render_diff(self):
+        """Align the prompt with the chosen prompt (default the first, or the second) after their shared prefix."""
+        diff = self.query_one("#diff", Static)
+        if not self.show_diff:
+            diff.update("")
+            return
+        if len(self.prompts) < 2:
+            diff.update("Diff needs a second prompt")
+            return
+        other = self._diff_other()
+        # Only the divergent suffixes are scored and an unchanged pair is cached; the shared prefix is reused
+        result = self.explorer.diff_prompt_scores(self.prompts_tokens[other])
+        rows = [
+            f"[bold]Prompt {self.prompt_index + 1} vs {other + 1}[/bold]: {result['prefix_length']} shared tokens"
+        ]
+
+        def side(token_id, logprob, entropy):
+            if token_id < 0:
+                return f"{'':>14} {'':>4} {'':>5}"
+            token = escape(repr(self.explorer.token_string(int(token_id))))
+            probability = "-" if math.isnan(logprob) else f"{math.exp(logprob) * 100:.0f}%"
+            entropy = "-" if math.isnan(entropy) else f"{entropy:.2f}"
+            return f"{token:>14} {probability:>4} {entropy:>5}"
+
+        count = len(result["token_ids_a"])
+        for row in range(min(count, DIFF_ROWS)):
+            delta_p = math.exp(result["logprobs_b"][row]) - math.exp(result["logprobs_a"][row])
+            delta_h = result["entropy_delta"][row]
+            delta = "" if math.isnan(delta_p) else f"  Δp {delta_p * 100:+.0f}  ΔH {delta_h:+.2f}"
+            rows.append(
+                f"{side(result['token_ids_a'][row], result['logprobs_a'][row], result['entropy_a'][row])}  |"
+                f"{side(result['token_ids_b'][row], result['logprobs_b'][row], result['entropy_b'][row])}{delta}"
+            )
+        if count > DIFF_ROWS:
+            rows.append(f"... {count - DIFF_ROWS} more")
+        diff.update("\n".join(rows))
+
+    def _diff_other(self):
+        chosen = self.diff_prompt
+        if chosen is not None and chosen != self.prompt_index and chosen < len(self.prompts):
+            return chosen
+        return 0 if self.prompt_index != 0 else 1
+
+    def action_toggle_diff(self):
+        self.show_diff = not self.show_diff
+        self._render_diff()
+
+    def action_next_diff_prompt(self):
+        """Compare the prompt with the next other prompt."""
+        if len(self.prompts) < 2:
+            return
+        other = (self._diff_other() + 1) % len(self.prompts)
+        if other == self.prompt_index:
+            other = (other + 1) % len(self.prompts)
+        self.diff_prompt = other
+        self.show_diff = True
+        self._render_diff()
+
+    def action_toggle_continuations(self):
+        self.show_continuations = not self.show_continuations
+        self._render_continuations()
+
+    def action_toggle_compare(self):
+        self.show_compare = not self.show_compare
+        self._render_compare()
+
+    def action_toggle_lens(self):
+        self.show_lens = not self.show_lens
+        self._render_lens()
 
     def action_save_prompt(self):
         with open(f"prompts/prompt_{self.prompt_index}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt", "w") as f:
             f.write(self.explorer.get_prompt())
 
+    def action_export_session(self):
+        """Write every prompt with its per-token scores to prompts/session_*.parquet."""
+        from src.export import export_branches
+        path = f"prompts/session_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.parquet"
+        try:
+            export_branches(self.explorer, self.prompts_tokens, path, prompt_index=self.prompt_index,
+                            next_tokens=TOKENS_TO_SHOW, top_p=TOP_P)
+        except ImportError as error:
+            self.notify(str(error), severity="error")
+            return
+        self.notify(f"Exported {len(self.prompts)} prompts to {path}")
+
     def action_select_next(self):
         """Move selection down one row"""
         if self.selected_row < len(self.rows) - 2:  # -2 for header row
@@ -173,10 +481,8 @@ class TokenExplorer(App):
         """Append currently selected token"""
         table = self.query_one(DataTable)
         if table.cursor_row is not None:
-            if len(self.rows) > (table.cursor_row+1):
-                self.explorer.append_token(self.rows[table.cursor_row+1][0])
-                self.prompts[self.prompt_index] = self.explorer.get_prompt()
-                self._refresh_table()  # This will reset cursor position
+            if len(self.displayed_tokens) > table.cursor_row:
+                self._append_to_prompt(self.displayed_tokens[table.cursor_row])
 
     def action_append_weighted_token(self):
         """Append a randomly chosen token weighted by probability."""
@@ -186,15 +492,16 @@ class TokenExplorer(App):
         if not any(weight > 0 for weight in weights):
             return
         chosen_token = random.choices(self.displayed_tokens, weights=weights, k=1)[0]
-        self.explorer.append_token(chosen_token["token_id"])
-        self.prompts[self.prompt_index] = self.explorer.get_prompt()
-        self._refresh_table()
+        self._append_to_prompt(chosen_token)
 
     def action_pop_token(self):
         if len(self.explorer.get_prompt_tokens()) > 1:
             self.explorer.pop_token()
-            self.prompts[self.prompt_index] = self.explorer.get_prompt()
-            self.query_one("#results", Static).update(self._render_prompt())
+            self._store_prompt()
+            self.query_one(PromptView).pop_token()
+            if self.prompt_cursor is not None and self.prompt_cursor >= len(self.explorer.get_prompt_tokens()):
+                self._set_prompt_cursor(None)
+            self._render_status()
             self._refresh_table()
 
 
@@ -205,8 +512,50 @@ if __name__ == "__main__":
     parser.add_argument('--gui', action='store_true', help='Run the web GUI instead of the TUI')
     parser.add_argument('--host', type=str, default='localhost', help='Host for the GUI server')
     parser.add_argument('--port', type=int, default=4000, help='Port for the GUI server')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Run GUI and --score forward passes on N worker processes sharing the model weights')
+    parser.add_argument('--prepare-model', nargs='?', const='', default=None, metavar='DIR',
+                        help='Write a zero-copy snapshot of the configured model to DIR '
+                             '(default: snapshots/<model>) and exit')
+    parser.add_argument('--dtype', type=str, default='float32',
+                        help='Weight dtype for --prepare-model (e.g. float32, bfloat16)')
+    parser.add_argument('--score', nargs='+', metavar='PATH',
+                        help='Score .txt/.jsonl documents under PATH for per-token surprisal and perplexity, then exit')
+    parser.add_argument('--output', type=str, default='scores.jsonl',
+                        help='JSON lines file for --score results (re-running resumes from it)')
+    parser.add_argument('--batch-tokens', type=int, default=8192,
+                        help='Padded token budget per forward pass for --score')
+    parser.add_argument('--max-tokens', type=int, default=None,
+                        help="Truncate --score documents to this many tokens (default: the model's context length)")
+    parser.add_argument('--candidates', type=str, metavar='PATH',
+                        help='Text file with one candidate continuation per line, ranked after the prompt '
+                             '(press r in the TUI)')
+    parser.add_argument('--rank', action='store_true',
+                        help='Print the --candidates scores for the prompt as JSON lines and exit')
     args = parser.parse_args()
 
+    if args.prepare_model is not None:
+        from src.snapshot import default_snapshot_dir, prepare_snapshot
+        output_dir = args.prepare_model or default_snapshot_dir(MODEL_NAME)
+        prepare_snapshot(MODEL_NAME, output_dir, dtype=args.dtype)
+        print(f"Wrote snapshot of {MODEL_NAME} to {output_dir}")
+        print(f'Set name = "{output_dir}" in the [model] section of config.toml to use it')
+        sys.exit(0)
+
+    if args.score:
+        from src.scoring import score_corpus
+        explorer = Explorer(MODEL_NAME)
+        max_tokens = args.max_tokens or getattr(explorer.model.config, "max_position_embeddings", None)
+        if args.workers:
+            from src.pool import ExplorerPool, PooledExplorer
+            # Each batch is split into one sub-batch per worker
+            with ExplorerPool(explorer, num_workers=args.workers) as pool:
+                score_corpus(PooledExplorer(pool), args.score, args.output, max_batch_tokens=args.batch_tokens,
+                             max_tokens=max_tokens)
+        else:
+            score_corpus(explorer, args.score, args.output, max_batch_tokens=args.batch_tokens, max_tokens=max_tokens)
+        sys.exit(0)
+
     prompt = EXAMPLE_PROMPT
     if args.input:
         try:
@@ -218,9 +567,26 @@ if __name__ == "__main__":
         except Exception as e:
             print(f"Error reading file: {e}")
             sys.exit(1)
+
+    candidates = []
+    if args.candidates:
+        with open(args.candidates) as f:
+            candidates = [line.rstrip("\n") for line in f if line.strip()]
+    if args.rank:
+        if not candidates:
+            print("Error: --rank needs a non-empty --candidates file")
+            sys.exit(1)
+        explorer = Explorer(MODEL_NAME).set_prompt(prompt)
+        for candidate, score in zip(candidates, explorer.score_continuations(candidates)):
+            print(json.dumps({"candidate": candidate, **score}))
+        sys.exit(0)
     if args.gui:
         from src.gui import run_gui
-        run_gui(prompt, host=args.host, port=args.port, model_name=MODEL_NAME, tokens_to_show=TOKENS_TO_SHOW)
+        run_gui(prompt, host=args.host, port=args.port, model_name=MODEL_NAME, tokens_to_show=TOKENS_TO_SHOW,
+                top_p=TOP_P, max_prompts=MAX_PROMPTS,
+                draft_model_name=DRAFT_MODEL_NAME, workers=args.workers, model_names=MODEL_NAMES[1:],
+                memory_budget=MEMORY_BUDGET_GB * 1024 ** 3 if MEMORY_BUDGET_GB else None,
+                candidates=candidates)
     else:
-        app = TokenExplorer(prompt)
+        app = TokenExplorer(prompt, candidates=candidates)
         app.run()
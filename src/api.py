@@ -0,0 +1,161 @@
+"""
+JSON and WebSocket inference API served next to the NiceGUI app.
+
+The endpoints drive a TokenSession backed by the same in-process model as the GUI,
+so notebooks and scripts on other machines can explore without scraping the page.
+Model calls run in a worker thread and are serialized by a lock, so the event loop
+stays free while a forward pass is running. The prompt state a response reports is
+read in the same locked call, so it never mixes in a concurrent request.
+"""
+import asyncio
+
+from fastapi import HTTPException, Query, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field, ValidationError
+
+# Upper bounds on client-chosen sizes, so one request cannot sort the whole vocabulary or stream without end
+MAX_TOP_TOKENS = 1000
+MAX_NEW_TOKENS = 500
+
+
+class PromptRequest(BaseModel):
+    text: str
+
+
+class TokenRequest(BaseModel):
+    token_id: int = Field(ge=0)
+
+
+class ContinuationsRequest(BaseModel):
+    candidates: list[str]
+
+
+class ContinueRequest(BaseModel):
+    max_new_tokens: int = 20
+
+
+def register_api(app, session, prefix="/api"):
+    """
+    Register the inference endpoints on a FastAPI app.
+
+    Args:
+        app: The FastAPI (or NiceGUI) app to extend
+        session: The TokenSession the endpoints read and modify
+        prefix: URL prefix for all endpoints (default "/api")
+    """
+    lock = asyncio.Lock()
+
+    async def run(func, *args, **kwargs):
+        async with lock:
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    def check_token_id(token_id):
+        vocab_size = len(session.explorer.tokenizer)
+        if token_id >= vocab_size:
+            raise HTTPException(status_code=422, detail=f"token_id must be below the vocabulary size {vocab_size}")
+
+    def state():
+        return {
+            "prompt": session.get_prompt(),
+            "tokens": list(session.get_prompt_tokens()),
+            "token_strings": session.get_prompt_tokens_strings(),
+        }
+
+    async def run_with_state(func=None, *args):
+        """Run a session call and read the resulting state under the same lock."""
+        def job():
+            result = func(*args) if func is not None else None
+            return result, state()
+        return await run(job)
+
+    @app.get(f"{prefix}/prompt")
+    async def get_prompt():
+        _, current = await run_with_state()
+        return current
+
+    @app.post(f"{prefix}/prompt")
+    async def set_prompt(request: PromptRequest):
+        _, current = await run_with_state(session.set_prompt_text, request.text)
+        return current
+
+    @app.get(f"{prefix}/top")
+    async def top_tokens(n: int = Query(10, ge=1, le=MAX_TOP_TOKENS), search: str = "",
+                         top_p: float | None = Query(None, gt=0, le=1)):
+        if top_p is not None and search:
+            raise HTTPException(status_code=422, detail="search cannot be combined with top_p")
+        if top_p is not None:
+            # The smallest set covering top_p, at most n tokens
+            tokens = await run(session.explorer.get_nucleus_tokens, top_p=top_p, max_n=n)
+        else:
+            tokens = await run(session.explorer.get_top_n_tokens, n=n, search=search)
+        return {"tokens": list(tokens)}
+
+    @app.get(f"{prefix}/neighbours")
+    async def nearest_tokens(token_id: int = Query(ge=0), n: int = Query(10, ge=1, le=MAX_TOP_TOKENS)):
+        check_token_id(token_id)
+        neighbours = await run(session.explorer.get_nearest_tokens, [token_id], n=n)
+        return {"token_id": token_id, "neighbours": neighbours[0]}
+
+    @app.get(f"{prefix}/probabilities")
+    async def token_probabilities():
+        probabilities, current = await run_with_state(session.get_prompt_token_probabilities)
+        return {**current, "probabilities": probabilities}
+
+    @app.post(f"{prefix}/continuations")
+    async def score_continuations(request: ContinuationsRequest):
+        scores, current = await run_with_state(session.score_continuations, request.candidates)
+        return {**current, "continuations": [
+            {"candidate": candidate, **score} for candidate, score in zip(request.candidates, scores)
+        ]}
+
+    @app.post(f"{prefix}/append")
+    async def append_token(request: TokenRequest):
+        check_token_id(request.token_id)
+        _, current = await run_with_state(session.append_token, request.token_id)
+        return current
+
+    @app.post(f"{prefix}/pop")
+    async def pop_token():
+        _, current = await run_with_state(session.pop_token)
+        return current
+
+    @app.websocket(f"{prefix}/continue")
+    async def stream_continuation(websocket: WebSocket):
+        """
+        Stream sampled continuation tokens.
+
+        The client sends {"max_new_tokens": N}, clamped to 1..MAX_NEW_TOKENS; the server replies with one
+        {"token_id", "token"} message per appended token and a final {"done": true}. A malformed
+        message gets an {"error"} reply and the connection stays open.
+        """
+        await websocket.accept()
+        end_token_id = session.explorer.tokenizer.eos_token_id
+
+        def append_step():
+            before = len(session.get_prompt_tokens())
+            if not session.append_weighted_token():
+                return []
+            tokens = session.get_prompt_tokens()
+            return list(zip(tokens[before:], session.get_prompt_tokens_strings()[before:]))
+
+        try:
+            while True:
+                try:
+                    request = ContinueRequest.model_validate_json(await websocket.receive_text())
+                except ValidationError as error:
+                    await websocket.send_json({"error": str(error)})
+                    continue
+                max_new_tokens = max(1, min(request.max_new_tokens, MAX_NEW_TOKENS))
+                generated = 0
+                while generated < max_new_tokens:
+                    appended = await run(append_step)
+                    if not appended:
+                        break
+                    for token_id, token in appended:
+                        await websocket.send_json({"token_id": token_id, "token": token})
+                    generated += len(appended)
+                    if appended[-1][0] == end_token_id:
+                        break
+                _, current = await run_with_state()
+                await websocket.send_json({"done": True, **current})
+        except WebSocketDisconnect:
+            pass
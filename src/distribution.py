@@ -0,0 +1,69 @@
+"""
+Compact columnar result type for next-token distributions.
+
+A TokenDistribution keeps token ids, probabilities and log-probabilities as NumPy
+arrays and only decodes token strings when they are first asked for. Indexing and
+iteration still yield the {"token_id", "token", "probability"} dicts that the rest
+of the app has always used.
+"""
+import numpy as np
+
+
+class TokenDistribution:
+    """Array-backed list of candidate tokens, sorted by probability."""
+
+    __slots__ = ("token_ids", "probs", "logprobs", "_token_string", "_tokens")
+
+    def __init__(self, token_ids, logprobs, token_string):
+        """
+        Args:
+            token_ids: 1-D integer array of token ids
+            logprobs: 1-D float array of log-probabilities, aligned with token_ids
+            token_string: Callable mapping a token id to its decoded string
+        """
+        self.token_ids = np.asarray(token_ids, dtype=np.int64)
+        self.logprobs = np.asarray(logprobs, dtype=np.float64)
+        self.probs = np.exp(self.logprobs)
+        self._token_string = token_string
+        self._tokens = None
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), str)
+
+    @property
+    def tokens(self):
+        """Decoded token strings, resolved on first access."""
+        if self._tokens is None:
+            self._tokens = [self._token_string(token_id) for token_id in self.token_ids.tolist()]
+        return self._tokens
+
+    def __len__(self):
+        return len(self.token_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            sliced = TokenDistribution(self.token_ids[index], self.logprobs[index], self._token_string)
+            if self._tokens is not None:
+                sliced._tokens = self._tokens[index]
+            return sliced
+        token_id = int(self.token_ids[index])
+        token = self._tokens[index] if self._tokens is not None else self._token_string(token_id)
+        return {"token_id": token_id, "token": token, "probability": float(self.probs[index])}
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return f"TokenDistribution({len(self)} tokens)"
+
+    def nucleus(self, top_p):
+        """Return the smallest leading slice whose probabilities sum to at least top_p."""
+        count = int(np.searchsorted(np.cumsum(self.probs), top_p)) + 1
+        return self[:count]
+
+    def to_list(self):
+        """Return the distribution as a list of dicts."""
+        return list(self)
+
@@ -0,0 +1,138 @@
+"""
+Nearest-neighbour lookup over a model's input embeddings.
+
+The embedding matrix is L2-normalized once per model and cached on disk, either as
+float16 or as int8 with one scale per row, so later runs load it instead of
+recomputing it. A fingerprint of the weights is stored next to it, so a cache written
+for another model is rebuilt rather than reused. In memory the index is float16. A
+query for a batch of tokens is one matrix product against their vectors followed by
+a top-k, so cosine similarities over the whole vocabulary take milliseconds and no
+forward pass.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import torch
+
+DTYPES = ("float16", "int8")
+
+
+def default_index_dir(model_name):
+    """Cache directory for a model's index, keyed on its full name or snapshot path."""
+    if os.path.isdir(model_name):
+        model_name = os.path.abspath(model_name)
+    key = model_name.replace(os.sep, "/").strip("/").replace("/", "--")
+    return os.path.join("cache", "embeddings", key)
+
+
+def weight_fingerprint(weight):
+    """Hash of an embedding matrix's shape and a sample of its rows."""
+    digest = hashlib.sha1(repr(tuple(weight.shape)).encode())
+    rows = weight.detach()[::max(1, len(weight) // 256)]
+    digest.update(rows.float().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+class EmbeddingIndex:
+    """Normalized input embeddings queried by cosine similarity."""
+
+    def __init__(self, embeddings, device="cpu", vocab_size=None, fingerprint=None):
+        """
+        Args:
+            embeddings: [vocab, hidden] float tensor of unit-norm rows
+            device: Device to run queries on (default "cpu")
+            vocab_size: Number of leading rows that are real tokens; padding rows
+                        past it are never returned (default: every row)
+            fingerprint: weight_fingerprint of the source embeddings (default None)
+        """
+        self.device = torch.device(device)
+        self.embeddings = embeddings.to(self.device, torch.float16)
+        self.vocab_size = min(vocab_size or len(embeddings), len(embeddings))
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_model(cls, model, device="cpu", vocab_size=None):
+        """Build an index from a model's input embedding matrix."""
+        with torch.no_grad():
+            weight = model.get_input_embeddings().weight.detach()
+            return cls(torch.nn.functional.normalize(weight.float(), dim=-1), device=device,
+                       vocab_size=vocab_size, fingerprint=weight_fingerprint(weight))
+
+    @classmethod
+    def load(cls, path, device="cpu", vocab_size=None):
+        """Load an index written by save."""
+        embeddings = torch.from_numpy(np.load(os.path.join(path, "embeddings.npy")))
+        scales_path = os.path.join(path, "scales.npy")
+        if os.path.exists(scales_path):
+            embeddings = embeddings.float() * torch.from_numpy(np.load(scales_path))[:, None]
+        fingerprint = None
+        metadata_path = os.path.join(path, "index.json")
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                fingerprint = json.load(f).get("fingerprint")
+        return cls(embeddings, device=device, vocab_size=vocab_size, fingerprint=fingerprint)
+
+    @classmethod
+    def load_or_build(cls, model, path, dtype="float16", device="cpu", vocab_size=None):
+        """
+        Load the index cached at path, or build it from the model and cache it there.
+
+        A cached index whose weight fingerprint does not match the model's embeddings
+        is rebuilt.
+        """
+        fingerprint = weight_fingerprint(model.get_input_embeddings().weight)
+        if os.path.exists(os.path.join(path, "embeddings.npy")):
+            index = cls.load(path, device=device, vocab_size=vocab_size)
+            if index.fingerprint == fingerprint:
+                return index
+        index = cls.from_model(model, device=device, vocab_size=vocab_size)
+        index.save(path, dtype=dtype)
+        return index
+
+    def save(self, path, dtype="float16"):
+        """
+        Write the index to path as float16, or as int8 with a float32 scale per row.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported index dtype {dtype!r}, expected one of {DTYPES}")
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "index.json"), "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "shape": list(self.embeddings.shape)}, f)
+        embeddings = self.embeddings.cpu()
+        scales_path = os.path.join(path, "scales.npy")
+        if dtype == "float16":
+            np.save(os.path.join(path, "embeddings.npy"), embeddings.numpy())
+            if os.path.exists(scales_path):
+                os.remove(scales_path)
+            return
+        embeddings = embeddings.float()
+        scales = embeddings.abs().amax(dim=-1).clamp(min=1e-8) / 127
+        quantized = torch.round(embeddings / scales[:, None]).to(torch.int8)
+        np.save(os.path.join(path, "embeddings.npy"), quantized.numpy())
+        np.save(scales_path, scales.numpy())
+
+    def nearest(self, token_ids, k=10, exclude_self=True):
+        """
+        Find the k tokens whose input embedding is most similar to each query token's.
+
+        Args:
+            token_ids: List of query token ids
+            k: Number of neighbours per query (default 10)
+            exclude_self: Leave each query token out of its own neighbours (default True)
+
+        Returns:
+            Tuple of ([queries, k] neighbour ids, [queries, k] cosine similarities) as NumPy arrays
+        """
+        ids = torch.as_tensor(token_ids, dtype=torch.long, device=self.device)
+        with torch.no_grad():
+            # Only real tokens are candidates; padding rows past vocab_size are untrained
+            scores = (self.embeddings[:self.vocab_size] @ self.embeddings[ids].T).T.float()
+            if exclude_self:
+                rows = torch.nonzero(ids < self.vocab_size).squeeze(-1)
+                scores[rows, ids[rows]] = -float("inf")
+            top_scores, top_ids = torch.topk(scores, k, dim=-1)
+            # One device-to-host transfer for ids and similarities together
+            host = torch.stack([top_ids.to(torch.float64), top_scores.to(torch.float64)]).cpu().numpy()
+        return host[0].astype(np.int64), host[1]
@@ -0,0 +1,54 @@
+"""
+Per-session serialized executor for blocking model calls.
+
+Each GUI session gets its own single-thread executor, so its calls run one at a time
+and in submission order while the event loop stays free. Calls can carry a key;
+a call that has not started yet is dropped when a newer call with the same key is
+submitted (e.g. an edit superseded by further typing).
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Superseded(Exception):
+    """Raised for a call that was dropped in favour of a newer call with the same key."""
+
+
+class SerialExecutor:
+    """Runs blocking calls one at a time on a dedicated thread, in submission order."""
+
+    def __init__(self, name="session"):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._generations = {}
+        self.pending = 0
+
+    async def run(self, func, *args, key=None, **kwargs):
+        """
+        Run func(*args, **kwargs) on the executor thread and return its result.
+
+        Args:
+            func: The blocking callable
+            key: Optional key; a newer call with the same key supersedes this one
+                 if it has not started yet
+
+        Raises:
+            Superseded: If the call was dropped in favour of a newer one
+        """
+        generation = None
+        if key is not None:
+            generation = self._generations[key] = self._generations.get(key, 0) + 1
+
+        def call():
+            if key is not None and self._generations[key] != generation:
+                raise Superseded(key)
+            return func(*args, **kwargs)
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        """Stop accepting work and drop calls that have not started."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -3,19 +3,41 @@ This code is used to process an LLM one token at at time.
 
 The Explorer class manages the prompt internally and handles all interactions with the LLM.
 """
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import contextlib
+import copy
+import os
+import time
+
+from transformers import AutoTokenizer, AutoModelForCausalLM, DynamicCache
+import numpy as np
 import torch
+
+from src.distribution import TokenDistribution
+from src.embedding_index import EmbeddingIndex, default_index_dir
+from src.snapshot import is_snapshot, load_snapshot
+
+# Number of alternatives scored per prompt position
+DEFAULT_ALTERNATIVES = 5
+
+# Number of next-token distributions kept per Explorer, so switching between prompts is free
+DISTRIBUTION_CACHE_SIZE = 64
+# Number of branch diffs kept per Explorer, so redrawing an unchanged diff runs no forward pass
+DIFF_CACHE_SIZE = 8
+
+
 class Explorer:
-    def __init__(self, model_name="Qwen/Qwen2.5-0.5B"):
+    def __init__(self, model_name="Qwen/Qwen2.5-0.5B", draft_model_name=None):
         """
         Initialize the Explorer with a model name.
         
         Args:
-            model_name: Name of the model to load (default "Qwen/Qwen2.5-0.5B")
+            model_name: Name of the model to load, or path to a snapshot written by
+                        `main.py --prepare-model` (default "Qwen/Qwen2.5-0.5B")
+            draft_model_name: Optional smaller model sharing the tokenizer, used
+                              for speculative decoding (default None)
         """
         self.model_name = model_name
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(model_name)
+        self.tokenizer, self.model = _load_model(model_name)
         
         # Auto select device (CUDA > MPS > CPU)
         if torch.cuda.is_available():
@@ -25,12 +47,69 @@ class Explorer:
         else:
             self.device = torch.device("cpu")
         self.model = self.model.to(self.device)
+
+        # Optional draft model for speculative decoding
+        self.draft_model_name = draft_model_name
+        self.draft_model = None
+        if draft_model_name:
+            self.draft_model = _load_model(draft_model_name)[1].to(self.device)
+        self.speculative_stats = {"rounds": 0, "proposed": 0, "accepted": 0}
+        self._speculative_tokens = []
+        self._target_cache = None
+        self._draft_cache = None
+
+        # KV cache of the last prompt scored by get_top_n_tokens
+        self._prompt_cache_tokens = []
+        self._prompt_cache = None
+
+        # Per-position scores of the last prompt scored in full, and its KV cache
+        self._position_scores = None
+        self._position_cache = None
+
+        # Next-token distributions by (n or nucleus settings, prompt tokens), oldest first
+        self._distributions = {}
+        # Branch diffs by (prompt tokens, other tokens, k), oldest first
+        self._diffs = {}
+
+        # Normalized input embeddings for nearest-neighbour lookups, loaded lazily;
+        # the holder dict is shared with forks so the index is only loaded once
+        self._embedding_index = {}
+
+        # Decoded token strings, filled lazily
+        self._token_strings = {}
+        self._lower_vocab = None
+
+        # Callables observer(event, **fields) notified after each forward pass; shared with forks
+        self.observers = []
         
         # Initialize with empty promp
         self.prompt_text = ""
         self.prompt_tokens = []
     
 
+    def fork(self):
+        """
+        Create a new Explorer that shares this one's model weights and tokenizer
+        but has its own, empty prompt state.
+
+        Returns:
+            A new Explorer instance
+        """
+        forked = copy.copy(self)
+        forked.prompt_text = ""
+        forked.prompt_tokens = []
+        forked.speculative_stats = {"rounds": 0, "proposed": 0, "accepted": 0}
+        forked._speculative_tokens = []
+        forked._target_cache = None
+        forked._draft_cache = None
+        forked._prompt_cache_tokens = []
+        forked._prompt_cache = None
+        forked._position_scores = None
+        forked._position_cache = None
+        forked._distributions = {}
+        forked._diffs = {}
+        return forked
+
     def set_prompt(self, prompt_text):
         """
         Set the current prompt text and update the encoded tokens.
@@ -43,10 +122,49 @@ class Explorer:
         return self
     
 
+    def update_prompt(self, prompt_text):
+        """
+        Set the prompt text after an edit, re-encoding only the text near the edit.
+
+        Tokens ending before the first changed character are kept (backing off a few
+        tokens to a word boundary, since BPE merges can reach across the edit) and only
+        the remaining text is encoded. Falls back to a full encode if the kept tokens
+        do not decode to a prefix of the new text.
+
+        Args:
+            prompt_text: The edited prompt text
+        """
+        keep = self._unchanged_token_count(prompt_text)
+        kept_tokens = self.prompt_tokens[:keep]
+        kept_text = self.tokenizer.decode(kept_tokens)
+        if keep == 0 or not prompt_text.startswith(kept_text):
+            return self.set_prompt(prompt_text)
+        tail_tokens = self.tokenizer.encode(prompt_text[len(kept_text):], add_special_tokens=False)
+        self.prompt_text = prompt_text
+        self.prompt_tokens = kept_tokens + tail_tokens
+        return self
+
+    def _unchanged_token_count(self, prompt_text, margin=2):
+        """Number of leading prompt tokens that can be kept after editing to prompt_text."""
+        unchanged_chars = len(os.path.commonprefix([self.prompt_text, prompt_text]))
+        keep = 0
+        offset = 0
+        for token_id in self.prompt_tokens:
+            offset += len(self.token_string(token_id))
+            if offset > unchanged_chars:
+                break
+            keep += 1
+        keep = max(0, keep - margin)
+        while keep > 0 and not self.token_string(self.prompt_tokens[keep]).startswith((" ", "\n")):
+            keep -= 1
+        return keep
+
     def get_prompt_token_probabilities(self):
         """
-        Calculate the probability of each token in the sequence given its preceding context,
-        using a single forward pass.
+        Calculate the probability of each token in the sequence given its preceding context.
+
+        Scores are cached per prompt (see get_prompt_alternatives), so after appending
+        or popping tokens only the changed positions are recomputed.
         
         Args:
             self: The Explorer object
@@ -55,33 +173,326 @@ class Explorer:
         """
         if not self.prompt_tokens:
             return []
-        # Convert token IDs to tensor and create input
-        input_ids = torch.tensor([self.prompt_tokens], dtype=torch.long, device=self.device)
-        
-        # Get the model's output in a single forward pass
-        with torch.no_grad():
-            outputs = self.model(input_ids)
-            logits = outputs.logits[0]  # Shape: [sequence_length, vocab_size]
-        
-        # Calculate probabilities for each position
-        token_probabilities = []
+        scores = self._score_prompt_positions()
         
         # First token has no context, so we'll use None or some default
-        token_probabilities.append(0.5)
-        
-        # For each position after the first
-        for pos in range(len(self.prompt_tokens) - 1):
-            # The logits at position 'pos' predict the token at position 'pos+1'
-            position_logits = logits[pos]
-            position_probs = torch.softmax(position_logits, dim=-1)
-            
-            # Get probability of the actual next token
-            next_token_id = self.prompt_tokens[pos + 1]
-            next_token_prob = position_probs[next_token_id].item()
-            
-            token_probabilities.append(next_token_prob)
+        token_probabilities = [0.5] + np.exp(scores["chosen_logprobs"]).tolist()
         return token_probabilities
-    
+
+    def get_prompt_alternatives(self, k=DEFAULT_ALTERNATIVES):
+        """
+        Get the top k tokens the model considered at every position of the prompt.
+
+        All positions are scored with one vectorized top-k over the sequence logits and
+        the result is cached per prompt. When the prompt is extended or branched, the
+        positions in the shared prefix are reused along with its KV cache, and only
+        the new positions are computed.
+
+        Args:
+            k: Number of alternatives per position (default 5)
+
+        Returns:
+            List with one TokenDistribution per prompt token; the first token has no
+            context, so its distribution is empty
+        """
+        if not self.prompt_tokens:
+            return []
+        scores = self._score_prompt_positions(k)
+        return [TokenDistribution.empty()] + [
+            TokenDistribution(ids, logprobs, self.token_string)
+            for ids, logprobs in zip(scores["top_ids"], scores["top_logprobs"])
+        ]
+
+    def get_prompt_scores(self, k=DEFAULT_ALTERNATIVES):
+        """
+        Get the cached per-position scores of the prompt as NumPy arrays.
+
+        Position i of every array describes the prediction of prompt token i + 1
+        from the tokens before it; the first token has no context and no entry.
+
+        Args:
+            k: Number of alternatives per position (default 5)
+
+        Returns:
+            Dict with "tokens" (the prompt token ids), "chosen_logprobs" and "entropy"
+            (in nats) of shape [n - 1], and "top_ids" and "top_logprobs" of shape [n - 1, k]
+        """
+        return self._score_prompt_positions(k)
+
+    def set_prompt_scores(self, scores):
+        """
+        Seed the per-position score cache with scores computed earlier, e.g. loaded
+        from an export, so they are not recomputed.
+
+        Args:
+            scores: Dict in the format returned by get_prompt_scores
+
+        Returns:
+            True if the scores match the current prompt and were used
+        """
+        if list(scores["tokens"]) != self.prompt_tokens:
+            return False
+        self._position_scores = {
+            "k": scores["top_ids"].shape[1],
+            "tokens": list(self.prompt_tokens),
+            "chosen_logprobs": scores["chosen_logprobs"],
+            "entropy": scores["entropy"],
+            "top_ids": scores["top_ids"],
+            "top_logprobs": scores["top_logprobs"],
+        }
+        # No KV cache comes with loaded scores; extending the prompt rebuilds it
+        self._position_cache = None
+        return True
+
+    def diff_prompt_scores(self, other_tokens, k=DEFAULT_ALTERNATIVES):
+        """
+        Compare the per-token scores of the prompt with those of another branch.
+
+        The other branch is scored first, reusing the cached scores and KV of the
+        prefix it shares with the last scored prompt, and the prompt is scored after
+        it, reusing their common prefix. Only the two divergent suffixes are run
+        through the model, and the score cache ends up on the prompt. Results are kept
+        per pair of branches, so comparing the same two branches again runs nothing.
+
+        Args:
+            other_tokens: Token ids of the branch to compare with
+            k: Number of alternatives per position kept in the score cache (default 5)
+
+        Returns:
+            Dict with "prefix_length" (number of shared tokens), "prefix_logprobs" and
+            "prefix_entropy" for the shared tokens after the first, and, for the aligned
+            suffixes after the prefix, "token_ids_a"/"token_ids_b" (-1 past the end),
+            "logprobs_a"/"logprobs_b", "entropy_a"/"entropy_b" (NaN where undefined) and
+            "logprob_delta"/"entropy_delta" (b minus a); a is the prompt, b the other branch
+        """
+        tokens = list(self.prompt_tokens)
+        other_tokens = list(other_tokens)
+        key = (tuple(tokens), tuple(other_tokens), k)
+        if key in self._diffs:
+            return self._diffs[key]
+        prefix_length = _common_prefix_length(tokens, other_tokens)
+        try:
+            self.prompt_tokens = other_tokens
+            other_scores = self._score_prompt_positions(k)
+        finally:
+            self.prompt_tokens = tokens
+        scores = self._score_prompt_positions(k)
+
+        rows = max(len(tokens), len(other_tokens)) - prefix_length
+        ids_a, logprobs_a, entropy_a = _aligned_suffix(tokens, scores, prefix_length, rows)
+        ids_b, logprobs_b, entropy_b = _aligned_suffix(other_tokens, other_scores, prefix_length, rows)
+        shared = max(0, prefix_length - 1)
+        diff = {
+            "prefix_length": prefix_length,
+            "prefix_logprobs": scores["chosen_logprobs"][:shared],
+            "prefix_entropy": scores["entropy"][:shared],
+            "token_ids_a": ids_a,
+            "token_ids_b": ids_b,
+            "logprobs_a": logprobs_a,
+            "logprobs_b": logprobs_b,
+            "entropy_a": entropy_a,
+            "entropy_b": entropy_b,
+            "logprob_delta": logprobs_b - logprobs_a,
+            "entropy_delta": entropy_b - entropy_a,
+        }
+        self._diffs[key] = diff
+        while len(self._diffs) > DIFF_CACHE_SIZE:
+            del self._diffs[next(iter(self._diffs))]
+        return diff
+
+    def _score_prompt_positions(self, k=DEFAULT_ALTERNATIVES, chunk_size=512):
+        """
+        Score every prompt token and its top k alternatives, reusing the previous result
+        for the prefix shared with the last scored prompt.
+        """
+        tokens = self.prompt_tokens
+        scores = self._position_scores
+        if scores is None or scores["k"] != k:
+            scores = {
+                "k": k,
+                "tokens": [],
+                "chosen_logprobs": np.empty(0),
+                "entropy": np.empty(0),
+                "top_ids": np.empty((0, k), dtype=np.int64),
+                "top_logprobs": np.empty((0, k)),
+            }
+        if scores["tokens"] == tokens:
+            return scores
+
+        # Position i predicts token i + 1, so predictions of tokens 1..common-1 still hold
+        keep = max(0, min(_common_prefix_length(scores["tokens"], tokens), len(tokens)) - 1)
+        if self._position_cache is None or keep == 0:
+            # Without a KV cache for the prefix (e.g. after loading scores), rescore from the start
+            keep = 0
+            self._position_cache = DynamicCache()
+        else:
+            _crop_cache(self._position_cache, keep)
+
+        new_scores = []
+        if len(tokens) - 1 > keep:
+            with torch.no_grad(), self._observe("prompt_scores") as record:
+                record["tokens"] = len(tokens) - 1 - keep
+                record["cached_tokens"] = keep
+                input_ids = torch.tensor([tokens[keep:-1]], dtype=torch.long, device=self.device)
+                targets = torch.tensor(tokens[keep + 1:], dtype=torch.long, device=self.device)
+                outputs = self.model.get_decoder()(input_ids, past_key_values=self._position_cache, use_cache=True)
+                hidden_states = outputs.last_hidden_state[0]
+                lm_head = self.model.get_output_embeddings()
+                for start in range(0, len(targets), chunk_size):
+                    end = start + chunk_size
+                    logprobs = torch.log_softmax(lm_head(hidden_states[start:end]).float(), dim=-1)
+                    chosen = logprobs.gather(-1, targets[start:end, None])
+                    entropy = -(logprobs.exp() * logprobs).sum(dim=-1, keepdim=True)
+                    top_logprobs, top_ids = torch.topk(logprobs, k, dim=-1)
+                    new_scores.append(torch.cat([chosen, entropy, top_ids.float(), top_logprobs], dim=-1))
+                host = torch.cat(new_scores).to(torch.float64).cpu().numpy()
+            new_chosen = host[:, 0]
+            new_entropy = host[:, 1]
+            new_ids = host[:, 2:k + 2].astype(np.int64)
+            new_logprobs = host[:, k + 2:]
+        else:
+            new_chosen = np.empty(0)
+            new_entropy = np.empty(0)
+            new_ids = np.empty((0, k), dtype=np.int64)
+            new_logprobs = np.empty((0, k))
+
+        self._position_scores = {
+            "k": k,
+            "tokens": list(tokens),
+            "chosen_logprobs": np.concatenate([scores["chosen_logprobs"][:keep], new_chosen]),
+            "entropy": np.concatenate([scores["entropy"][:keep], new_entropy]),
+            "top_ids": np.concatenate([scores["top_ids"][:keep], new_ids]),
+            "top_logprobs": np.concatenate([scores["top_logprobs"][:keep], new_logprobs]),
+        }
+        return self._position_scores
+
+    def get_token_logprobs_batch(self, token_lists, chunk_size=1024):
+        """
+        Score several token sequences in one right-padded forward pass.
+
+        Only real (non-padding) positions are projected through lm_head, chunk_size
+        positions at a time, so memory stays bounded for long batches.
+
+        Args:
+            token_lists: List of token id lists
+            chunk_size: Number of positions projected at once (default 1024)
+
+        Returns:
+            List with, for each sequence, the log-probability of every token after the
+            first given its preceding context
+        """
+        lengths = [len(tokens) for tokens in token_lists]
+        if not lengths or max(lengths) < 2:
+            return [[] for _ in token_lists]
+        pad_token_id = self.tokenizer.pad_token_id or 0
+        input_ids = torch.full((len(token_lists), max(lengths)), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros_like(input_ids)
+        for row, tokens in enumerate(token_lists):
+            input_ids[row, :len(tokens)] = torch.tensor(tokens, dtype=torch.long)
+            attention_mask[row, :len(tokens)] = 1
+        input_ids = input_ids.to(self.device)
+        attention_mask = attention_mask.to(self.device)
+
+        with torch.no_grad(), self._observe("batch_logprobs") as record:
+            record["tokens"] = sum(lengths)
+            outputs = self.model.get_decoder()(input_ids, attention_mask=attention_mask, use_cache=False)
+            # Position i predicts token i + 1; keep only predictions of real tokens
+            valid = attention_mask[:, 1:].bool()
+            hidden_states = outputs.last_hidden_state[:, :-1][valid]
+            targets = input_ids[:, 1:][valid]
+
+            lm_head = self.model.get_output_embeddings()
+            logprobs = torch.empty(len(targets), dtype=torch.float32, device=self.device)
+            for start in range(0, len(targets), chunk_size):
+                end = start + chunk_size
+                chunk_logprobs = torch.log_softmax(lm_head(hidden_states[start:end]).float(), dim=-1)
+                logprobs[start:end] = chunk_logprobs.gather(-1, targets[start:end, None]).squeeze(-1)
+            flat = logprobs.cpu().tolist()
+
+        results = []
+        offset = 0
+        for length in lengths:
+            count = max(0, length - 1)
+            results.append(flat[offset:offset + count])
+            offset += count
+        return results
+
+    def score_continuations(self, candidates, chunk_size=1024):
+        """
+        Score candidate continuations of the current prompt in one batched pass.
+
+        The prompt is prefilled once, reusing the KV cache kept by get_top_n_tokens,
+        and its last position scores every candidate's first token. The cache is then
+        expanded across the batch and all candidates run together, right-padded, so
+        the prompt is never recomputed per candidate.
+
+        Args:
+            candidates: List of continuation texts or token id lists
+            chunk_size: Number of positions projected through lm_head at once (default 1024)
+
+        Returns:
+            List with, for each candidate, a dict of "token_ids", "tokens",
+            "token_logprobs" (one per candidate token) and "logprob" (their sum)
+        """
+        if not self.prompt_tokens:
+            raise ValueError("Scoring continuations needs a non-empty prompt")
+        token_lists = [
+            self.tokenizer.encode(candidate, add_special_tokens=False) if isinstance(candidate, str)
+            else list(candidate)
+            for candidate in candidates
+        ]
+        lengths = [len(tokens) for tokens in token_lists]
+        flat = []
+        if any(lengths):
+            pad_token_id = self.tokenizer.pad_token_id or 0
+            input_ids = torch.full((len(token_lists), max(lengths)), pad_token_id, dtype=torch.long)
+            for row, tokens in enumerate(token_lists):
+                input_ids[row, :len(tokens)] = torch.tensor(tokens, dtype=torch.long)
+            input_ids = input_ids.to(self.device)
+            valid = torch.arange(input_ids.shape[1])[None, :] < torch.tensor(lengths)[:, None]
+            valid = valid.to(self.device)
+
+            with torch.no_grad(), self._observe("continuations") as record:
+                self._prompt_cache = self._reusable_cache(self._prompt_cache, self._prompt_cache_tokens)
+                cached = self._prompt_cache.get_seq_length()
+                record["cached_tokens"] = cached + (len(self.prompt_tokens) - cached) * (len(token_lists) - 1)
+                record["tokens"] = len(self.prompt_tokens) - cached + sum(lengths)
+                prompt_ids = torch.tensor([self.prompt_tokens[cached:]], dtype=torch.long, device=self.device)
+                decoder = self.model.get_decoder()
+                prompt_outputs = decoder(prompt_ids, past_key_values=self._prompt_cache, use_cache=True)
+                self._prompt_cache_tokens = list(self.prompt_tokens)
+
+                # The prompt cache stays usable by get_top_n_tokens; the batch extends a copy
+                past_key_values = _expand_cache(copy.deepcopy(self._prompt_cache), len(token_lists))
+                # Padding is on the right, so causal attention keeps it out of every real position
+                outputs = decoder(input_ids, past_key_values=past_key_values, use_cache=True)
+                # Candidate position j is predicted by the prompt's last position for j == 0,
+                # and by the candidate's own position j - 1 otherwise
+                prompt_hidden = prompt_outputs.last_hidden_state[:, -1:].expand(len(token_lists), -1, -1)
+                hidden_states = torch.cat([prompt_hidden, outputs.last_hidden_state[:, :-1]], dim=1)[valid]
+                targets = input_ids[valid]
+
+                lm_head = self.model.get_output_embeddings()
+                logprobs = torch.empty(len(targets), dtype=torch.float32, device=self.device)
+                for start in range(0, len(targets), chunk_size):
+                    end = start + chunk_size
+                    chunk_logprobs = torch.log_softmax(lm_head(hidden_states[start:end]).float(), dim=-1)
+                    logprobs[start:end] = chunk_logprobs.gather(-1, targets[start:end, None]).squeeze(-1)
+                flat = logprobs.cpu().tolist()
+
+        results = []
+        offset = 0
+        for tokens in token_lists:
+            token_logprobs = flat[offset:offset + len(tokens)]
+            offset += len(tokens)
+            results.append({
+                "token_ids": tokens,
+                "tokens": [self.token_string(token_id) for token_id in tokens],
+                "token_logprobs": token_logprobs,
+                "logprob": sum(token_logprobs),
+            })
+        return results
+
     def get_prompt(self):
         """
         Get the current prompt text.
@@ -104,8 +515,43 @@ class Explorer:
         """
         Get the current prompt tokens as a string.
         """
-        return [self.tokenizer.decode(token) for token in self.prompt_tokens]
+        return [self.token_string(token) for token in self.prompt_tokens]
     
+    def encode(self, prompt_text):
+        """
+        Encode text into token ids without touching the current prompt.
+
+        Args:
+            prompt_text: The text to encode
+
+        Returns:
+            List of token ids
+        """
+        return self.tokenizer.encode(prompt_text)
+
+    def decode(self, token_ids):
+        """
+        Decode a list of token ids into text without touching the current prompt.
+
+        Args:
+            token_ids: The token ids to decode
+
+        Returns:
+            The decoded text
+        """
+        return self.tokenizer.decode(token_ids)
+
+    def set_prompt_tokens(self, token_ids):
+        """
+        Set the current prompt from token ids, e.g. to branch from a position.
+
+        Args:
+            token_ids: The token ids of the new prompt
+        """
+        self.prompt_tokens = list(token_ids)
+        self.prompt_text = self.tokenizer.decode(self.prompt_tokens)
+        return self
+
     def pop_token(self):
         """
         Remove and return the last token from the prompt tokens.
@@ -148,46 +594,577 @@ class Explorer:
             search: Optional string to filter tokens (default "")
             
         Returns:
-            List of dicts containing token info and probabilities, sorted by probability
+            TokenDistribution of candidate tokens sorted by probability; indexing it
+            yields dicts containing token info and probabilities
+        """
+        if not self.prompt_tokens:
+            return TokenDistribution.empty()
+        key = (n, tuple(self.prompt_tokens))
+        if not search and key in self._distributions:
+            return self._distributions[key]
+        with torch.no_grad(), self._observe("top_n") as record:
+            next_token_logprobs = self._next_token_logprobs(record)
+
+            if search:
+                # Filter tokens whose decoded string contains the search string
+                search = search.lower()
+                matching_ids = [
+                    token_id for token_id, token in enumerate(self._lower_vocab_strings())
+                    if search in token
+                ]
+                if not matching_ids:
+                    return TokenDistribution.empty()
+                candidate_ids = torch.tensor(matching_ids, dtype=torch.long, device=self.device)
+                candidate_logprobs = next_token_logprobs[candidate_ids]
+                top_logprobs, top_positions = torch.topk(candidate_logprobs, min(n, len(matching_ids)))
+                top_indices = candidate_ids[top_positions]
+            else:
+                top_logprobs, top_indices = torch.topk(next_token_logprobs, n)
+
+            token_ids, logprobs = _to_host(top_indices, top_logprobs)
+        distribution = TokenDistribution(token_ids, logprobs, self.token_string)
+        if not search:
+            self._cache_distribution(key, distribution)
+        return distribution
+
+    def get_nucleus_tokens(self, top_p=0.9, max_n=None):
+        """
+        Get the smallest set of most likely next tokens whose probabilities sum to at
+        least top_p, optionally capped at max_n tokens.
+
+        The sort and cumulative sum run on the model's device, so only the selected
+        tokens are transferred to the host and decoded.
+
+        Args:
+            top_p: Cumulative probability the tokens must cover (default 0.9)
+            max_n: Maximum number of tokens to return (default None, no cap)
+
+        Returns:
+            TokenDistribution of the selected tokens sorted by probability
+        """
+        if not self.prompt_tokens:
+            return TokenDistribution.empty()
+        key = (("top_p", top_p, max_n), tuple(self.prompt_tokens))
+        if key in self._distributions:
+            return self._distributions[key]
+        with torch.no_grad(), self._observe("top_p") as record:
+            next_token_logprobs = self._next_token_logprobs(record)
+            if max_n is not None and max_n < len(next_token_logprobs):
+                # A cap bounds the set, so a top-k replaces the full sort
+                sorted_logprobs, sorted_ids = torch.topk(next_token_logprobs, max_n)
+            else:
+                sorted_logprobs, sorted_ids = torch.sort(next_token_logprobs, descending=True)
+            cumulative = torch.cumsum(sorted_logprobs.exp(), dim=0)
+            # Tokens before the one that reaches top_p, plus that token
+            count = min(int((cumulative < top_p).sum()) + 1, len(sorted_ids))
+            token_ids, logprobs = _to_host(sorted_ids[:count], sorted_logprobs[:count])
+        distribution = TokenDistribution(token_ids, logprobs, self.token_string)
+        self._cache_distribution(key, distribution)
+        return distribution
+
+    def _next_token_logprobs(self, record):
+        """
+        Run the prompt through the model, reusing the KV cache of the unchanged prefix,
+        and return the next-token log-probabilities as a device tensor.
+        """
+        self._prompt_cache = self._reusable_cache(self._prompt_cache, self._prompt_cache_tokens)
+        record["cached_tokens"] = self._prompt_cache.get_seq_length()
+        record["tokens"] = len(self.prompt_tokens) - record["cached_tokens"]
+        input_ids = torch.tensor([self.prompt_tokens[record["cached_tokens"]:]],
+                                 dtype=torch.long, device=self.device)
+        logits, _ = _forward(self.model, input_ids, past_key_values=self._prompt_cache, use_cache=True)
+        self._prompt_cache_tokens = list(self.prompt_tokens)
+        return torch.log_softmax(logits[0, -1, :].float(), dim=0)
+
+    def get_top_n_tokens_batch(self, prompts_tokens, n=5, top_p=None):
+        """
+        Get the top n next tokens for several prompts at once.
+
+        Distributions already computed for the same tokens (by this method or by
+        get_top_n_tokens) are reused. The remaining prompts are scored in one
+        right-padded batch forward pass, and the prefix they all share is run only once
+        and its KV cache expanded across the batch.
+
+        Args:
+            prompts_tokens: List of token id lists
+            n: Number of top tokens per prompt (default 5)
+            top_p: Also cache each prompt's top_p nucleus capped at n, as returned by
+                   get_nucleus_tokens(top_p, max_n=n) (default None)
+
+        Returns:
+            List of TokenDistribution, one per prompt
+        """
+        stale = sorted({
+            tuple(tokens) for tokens in prompts_tokens
+            if tokens and (n, tuple(tokens)) not in self._distributions
+        })
+        computed = dict(zip(stale, self._score_next_tokens(stale, n))) if stale else {}
+        for tokens, distribution in computed.items():
+            self._cache_distribution((n, tokens), distribution)
+        distributions = [
+            computed[tuple(tokens)] if tuple(tokens) in computed
+            else self._distributions.get((n, tuple(tokens)), TokenDistribution.empty())
+            for tokens in prompts_tokens
+        ]
+        if top_p is not None:
+            # The nucleus capped at n is a prefix of the top n, so switching to any of
+            # these prompts needs no forward pass with a top_p table either
+            for tokens, distribution in zip(prompts_tokens, distributions):
+                key = (("top_p", top_p, n), tuple(tokens))
+                if tokens and key not in self._distributions:
+                    self._cache_distribution(key, distribution.nucleus(top_p))
+        return distributions
+
+    def _score_next_tokens(self, token_lists, n):
+        """Score the next token of every (non-empty) token list in one batch forward pass."""
+        # Keep at least one token per row so every row has a last position to read
+        shared = min(len(tokens) for tokens in token_lists) - 1
+        for tokens in token_lists[1:]:
+            shared = min(shared, _common_prefix_length(token_lists[0], tokens))
+        suffixes = [tokens[shared:] for tokens in token_lists]
+        lengths = torch.tensor([len(suffix) for suffix in suffixes], device=self.device)
+        pad_token_id = self.tokenizer.pad_token_id or 0
+        input_ids = torch.full((len(suffixes), int(lengths.max())), pad_token_id, dtype=torch.long)
+        for row, suffix in enumerate(suffixes):
+            input_ids[row, :len(suffix)] = torch.tensor(suffix, dtype=torch.long)
+
+        with torch.no_grad(), self._observe("top_n_batch") as record:
+            record["tokens"] = shared + sum(len(suffix) for suffix in suffixes)
+            record["cached_tokens"] = shared * (len(suffixes) - 1)
+            decoder = self.model.get_decoder()
+            past_key_values = None
+            if shared:
+                prefix_ids = torch.tensor([token_lists[0][:shared]], dtype=torch.long, device=self.device)
+                past_key_values = _expand_cache(decoder(prefix_ids, use_cache=True).past_key_values, len(suffixes))
+            # Padding is on the right, so causal attention keeps it out of every real position
+            outputs = decoder(input_ids.to(self.device), past_key_values=past_key_values,
+                              use_cache=past_key_values is not None)
+            hidden_states = outputs.last_hidden_state[torch.arange(len(suffixes), device=self.device), lengths - 1]
+            logprobs = torch.log_softmax(self.model.get_output_embeddings()(hidden_states).float(), dim=-1)
+            top_logprobs, top_ids = torch.topk(logprobs, n, dim=-1)
+            ids, logprobs = _to_host(top_ids, top_logprobs)
+        return [
+            TokenDistribution(row_ids, row_logprobs, self.token_string)
+            for row_ids, row_logprobs in zip(ids, logprobs)
+        ]
+
+    def _cache_distribution(self, key, distribution):
+        self._distributions[key] = distribution
+        while len(self._distributions) > DISTRIBUTION_CACHE_SIZE:
+            del self._distributions[next(iter(self._distributions))]
+
+    def token_string(self, token_id):
+        """
+        Decode a single token id, caching the result.
+
+        Args:
+            token_id: The token id to decode
+
+        Returns:
+            The decoded token string
+        """
+        token = self._token_strings.get(token_id)
+        if token is None:
+            token = self._token_strings[token_id] = self.tokenizer.decode(token_id)
+        return token
+
+    def _lower_vocab_strings(self):
+        """Lower-cased decoded strings for the whole vocabulary, built once for search."""
+        if self._lower_vocab is None:
+            self._lower_vocab = [self.token_string(token_id).lower() for token_id in range(len(self.tokenizer))]
+        return self._lower_vocab
+
+    def get_nearest_tokens(self, token_ids, n=10):
+        """
+        Get the tokens closest to each given token in the model's input embedding space.
+
+        The normalized embedding index is built on first use and cached on disk under
+        cache/embeddings, so lookups need no forward pass.
+
+        Args:
+            token_ids: List of token ids to look up
+            n: Number of neighbours per token (default 10)
+
+        Returns:
+            List with, for each token id, a list of dicts with token_id, token and
+            cosine similarity, most similar first
+        """
+        if "index" not in self._embedding_index:
+            self._embedding_index["index"] = EmbeddingIndex.load_or_build(
+                self.model, default_index_dir(self.model_name), device=self.device,
+                vocab_size=len(self.tokenizer),
+            )
+        neighbour_ids, similarities = self._embedding_index["index"].nearest(token_ids, k=n)
+        return [
+            [
+                {"token_id": token_id, "token": self.token_string(token_id), "similarity": similarity}
+                for token_id, similarity in zip(ids.tolist(), scores.tolist())
+            ]
+            for ids, scores in zip(neighbour_ids, similarities)
+        ]
+
+    def get_logit_lens(self, position=None, n=5, layer_chunk_size=8):
+        """
+        Get the top n tokens predicted at every layer for one position (the "logit lens").
+
+        Hidden states come from a single forward pass. Only the selected position is
+        projected through the final norm and lm_head, a few layers at a time, so
+        memory stays bounded by layer_chunk_size x vocab_size.
+
+        Args:
+            position: Index of the prompt token whose next-token prediction to inspect
+                      (default None, the last token, i.e. the actual next-token prediction)
+            n: Number of top tokens per layer (default 5)
+            layer_chunk_size: Number of layers projected at once (default 8)
+
+        Returns:
+            List of TokenDistribution, one per layer, starting with the embedding output
         """
         if not self.prompt_tokens:
             return []
-        # Get model output for the encoded prompt
-        with torch.no_grad():
+        if position is None:
+            position = len(self.prompt_tokens) - 1
+        with torch.no_grad(), self._observe("logit_lens") as record:
+            record["tokens"] = position + 1
+            input_ids = torch.tensor([self.prompt_tokens[:position + 1]], dtype=torch.long, device=self.device)
+            outputs = self.model.get_decoder()(input_ids, output_hidden_states=True, use_cache=False)
+            layer_states = torch.stack([state[0, -1] for state in outputs.hidden_states])
+
+            # The last entry already has the final norm applied; the others are the residual stream
+            norm = _final_norm(self.model)
+            layer_states = torch.cat([norm(layer_states[:-1]), layer_states[-1:]])
+
+            lm_head = self.model.get_output_embeddings()
+            top_ids = []
+            top_logprobs = []
+            for start in range(0, len(layer_states), layer_chunk_size):
+                logits = lm_head(layer_states[start:start + layer_chunk_size])
+                logprobs, ids = torch.topk(torch.log_softmax(logits.float(), dim=-1), n, dim=-1)
+                top_ids.append(ids)
+                top_logprobs.append(logprobs)
+
+            ids, logprobs = _to_host(torch.cat(top_ids), torch.cat(top_logprobs))
+        return [
+            TokenDistribution(layer_ids, layer_logprobs, self.token_string)
+            for layer_ids, layer_logprobs in zip(ids, logprobs)
+        ]
+
+    def generate_continuations(self, n=4, max_new_tokens=100, temperature=1.0):
+        """
+        Sample n continuations of the current prompt in a single batch.
+
+        The prompt is prefilled once and its KV cache is expanded across the batch,
+        so sampling n continuations costs about as much as sampling one.
+
+        Args:
+            n: Number of continuations to sample (default 4)
+            max_new_tokens: Maximum number of tokens per continuation (default 100)
+            temperature: Sampling temperature (default 1.0)
+
+        Returns:
+            List of n lists of sampled token ids, each truncated after the end token
+        """
+        if not self.prompt_tokens or n < 1 or max_new_tokens < 1:
+            return []
+        eos_token_id = self.tokenizer.eos_token_id
+
+        with torch.no_grad(), self._observe("continuations") as record:
+            record["tokens"] = len(self.prompt_tokens)
             input_ids = torch.tensor([self.prompt_tokens], dtype=torch.long, device=self.device)
-            outputs = self.model(input_ids)
-            
-        # Get logits for the next token
-        next_token_logits = outputs.logits[0, -1, :]
-        
-        # Get probabilities using softmax
-        next_token_probs = torch.nn.functional.softmax(next_token_logits, dim=0)
-
-        if search:
-            # Filter tokens that contain the search string
-            matching_tokens = []
-            for idx, prob in enumerate(next_token_probs):
-                token = self.tokenizer.decode(idx)
-                if search.lower() in token.lower():
-                    matching_tokens.append({
-                        "token_id": idx,
-                        "token": token,
-                        "probability": prob.item()
-                    })
-            
-            # Sort by probability and take top n
-            matching_tokens.sort(key=lambda x: x["probability"], reverse=True)
-            return matching_tokens[:n]
-        else:
-            # Original behavior for no search string
-            top_probs, top_indices = torch.topk(next_token_probs, n)
-            
-            results = []
-            for prob, idx in zip(top_probs, top_indices):
-                token = self.tokenizer.decode(idx)
-                results.append({
-                    "token": token,
-                    "token_id": idx.item(),
-                    "probability": prob.item()
-                })
-            return results
+            logits, past_key_values = _forward(self.model, input_ids, use_cache=True)
+            past_key_values = _expand_cache(past_key_values, n)
+            next_token_logits = logits[:, -1, :].expand(n, -1)
+
+            finished = torch.zeros(n, dtype=torch.bool, device=self.device)
+            generated = []
+            for step in range(max_new_tokens):
+                next_token_probs = torch.softmax(next_token_logits / temperature, dim=-1)
+                next_ids = torch.multinomial(next_token_probs, num_samples=1)
+                if eos_token_id is not None:
+                    next_ids[finished] = eos_token_id
+                    finished |= next_ids[:, 0] == eos_token_id
+                generated.append(next_ids)
+                if finished.all() or step == max_new_tokens - 1:
+                    break
+                logits, past_key_values = _forward(self.model, next_ids, past_key_values=past_key_values, use_cache=True)
+                next_token_logits = logits[:, -1, :]
+                record["tokens"] += n
+
+        continuations = []
+        for sequence in torch.cat(generated, dim=1).tolist():
+            if eos_token_id is not None and eos_token_id in sequence:
+                sequence = sequence[:sequence.index(eos_token_id) + 1]
+            continuations.append(sequence)
+        return continuations
+
+
+    def append_speculative_tokens(self, k=4, top_n=None, top_p=None):
+        """
+        Extend the prompt by one round of speculative decoding.
+
+        The draft model proposes up to k tokens and the target model verifies them
+        in a single forward pass. Each draft token is accepted with probability
+        min(1, p/q); the first rejected one is resampled from max(0, p - q), and if
+        all are accepted a bonus token is sampled from the target. The appended
+        tokens are therefore distributed exactly as if sampled from the target.
+
+        Args:
+            k: Number of tokens proposed by the draft model per round (default 4)
+            top_n: If set, the target distribution is restricted to its top_n
+                   tokens and renormalized, matching weighted sampling from the
+                   displayed table (default None)
+            top_p: If set, the target distribution is restricted to its top_p
+                   nucleus (capped at top_n) and renormalized, matching a table
+                   from get_nucleus_tokens (default None)
+
+        Returns:
+            List of appended token ids (between 1 and k + 1 tokens)
+        """
+        if self.draft_model is None:
+            raise ValueError("No draft model configured")
+        if not self.prompt_tokens:
+            return []
+        eos_token_id = self.tokenizer.eos_token_id
+        target_cache, draft_cache = self._sync_speculative_caches()
+        prompt_length = len(self.prompt_tokens)
+
+        with torch.no_grad(), self._observe("speculative") as record:
+            # Draft proposes up to k tokens autoregressively
+            draft_ids = []
+            draft_probs = []
+            draft_input = self.prompt_tokens[draft_cache.get_seq_length():]
+            for _ in range(k):
+                input_ids = torch.tensor([draft_input], dtype=torch.long, device=self.device)
+                logits, _ = _forward(self.draft_model, input_ids, past_key_values=draft_cache, use_cache=True)
+                probs = self._match_target_vocab(torch.softmax(logits[0, -1, :].float(), dim=-1))
+                token_id = torch.multinomial(probs, num_samples=1).item()
+                draft_ids.append(token_id)
+                draft_probs.append(probs)
+                draft_input = [token_id]
+                if token_id == eos_token_id:
+                    break
+
+            # Target scores every draft position (plus one bonus position) in one pass
+            target_input = self.prompt_tokens[target_cache.get_seq_length():] + draft_ids
+            record["tokens"] = len(target_input)
+            record["cached_tokens"] = target_cache.get_seq_length()
+            input_ids = torch.tensor([target_input], dtype=torch.long, device=self.device)
+            logits, _ = _forward(self.model, input_ids, positions=slice(-len(draft_ids) - 1, None),
+                                 past_key_values=target_cache, use_cache=True)
+            target_probs = torch.softmax(logits[0].float(), dim=-1)
+            if top_p is not None:
+                target_probs = _restrict_to_nucleus(target_probs, top_p, top_n)
+            elif top_n:
+                target_probs = _restrict_to_top_n(target_probs, top_n)
+
+            new_tokens = []
+            for position, token_id in enumerate(draft_ids):
+                p = target_probs[position]
+                q = draft_probs[position]
+                if torch.rand(()).item() < (p[token_id] / q[token_id]).item():
+                    new_tokens.append(token_id)
+                    continue
+                residual = torch.clamp(p - q, min=0)
+                if residual.sum() <= 0:
+                    residual = p
+                new_tokens.append(torch.multinomial(residual / residual.sum(), num_samples=1).item())
+                break
+            else:
+                if draft_ids[-1] != eos_token_id:
+                    new_tokens.append(torch.multinomial(target_probs[-1], num_samples=1).item())
+
+        accepted = sum(1 for draft, new in zip(draft_ids, new_tokens) if draft == new)
+        self.speculative_stats["rounds"] += 1
+        self.speculative_stats["proposed"] += len(draft_ids)
+        self.speculative_stats["accepted"] += accepted
+
+        # Keep only cache entries for tokens that made it into the prompt
+        _crop_cache(target_cache, prompt_length + accepted)
+        _crop_cache(draft_cache, prompt_length + accepted)
+        self.prompt_tokens.extend(new_tokens)
+        self.prompt_text = self.tokenizer.decode(self.prompt_tokens)
+        self._speculative_tokens = list(self.prompt_tokens)
+        return new_tokens
+
+    def get_speculative_stats(self):
+        """
+        Get acceptance statistics for speculative decoding.
+
+        Returns:
+            Dict with rounds, proposed and accepted draft token counts, the
+            acceptance rate and the mean number of tokens produced per round
+        """
+        stats = dict(self.speculative_stats)
+        stats["acceptance_rate"] = stats["accepted"] / stats["proposed"] if stats["proposed"] else 0.0
+        stats["tokens_per_round"] = (stats["accepted"] + stats["rounds"]) / stats["rounds"] if stats["rounds"] else 0.0
+        return stats
+
+    def memory_bytes(self):
+        """Return the number of bytes held by the parameters and buffers of the loaded models."""
+        total = 0
+        for model in (self.model, self.draft_model):
+            if model is not None:
+                tensors = list(model.parameters()) + list(model.buffers())
+                total += sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+        return total
+
+    @contextlib.contextmanager
+    def _observe(self, operation):
+        """
+        Time the enclosed forward pass and report it to the observers.
+
+        The body fills the yielded record with the number of tokens it ran through
+        the model ("tokens") and the number it reused from a cache ("cached_tokens").
+        """
+        record = {"tokens": 0, "cached_tokens": 0}
+        start = time.perf_counter()
+        yield record
+        if self.observers:
+            seconds = time.perf_counter() - start
+            for observer in self.observers:
+                observer("forward", operation=operation, seconds=seconds, **record)
+
+    def _sync_speculative_caches(self):
+        """Reuse the speculative KV caches for the part of the prompt they still match."""
+        self._target_cache = self._reusable_cache(self._target_cache, self._speculative_tokens)
+        self._draft_cache = self._reusable_cache(self._draft_cache, self._speculative_tokens)
+        return self._target_cache, self._draft_cache
+
+    def _reusable_cache(self, cache, cached_tokens):
+        """
+        Crop a KV cache built for `cached_tokens` to the prefix it shares with the
+        current prompt, or start a fresh one if nothing can be reused. The last prompt
+        token is always left out so it can be fed to get next-token logits.
+        """
+        keep = min(_common_prefix_length(cached_tokens, self.prompt_tokens), len(self.prompt_tokens) - 1)
+        if cache is None or keep <= 0:
+            return DynamicCache()
+        _crop_cache(cache, keep)
+        return cache
+
+    def _match_target_vocab(self, probs):
+        """Pad or trim draft probabilities to the target model's vocabulary size."""
+        vocab_size = self.model.config.vocab_size
+        if probs.shape[-1] > vocab_size:
+            probs = probs[..., :vocab_size]
+            return probs / probs.sum(dim=-1, keepdim=True)
+        if probs.shape[-1] < vocab_size:
+            return torch.nn.functional.pad(probs, (0, vocab_size - probs.shape[-1]))
+        return probs
+
+
+def _load_model(model_name):
+    """Load (tokenizer, model), memory-mapping the weights if model_name is a local snapshot."""
+    if is_snapshot(model_name):
+        model, tokenizer = load_snapshot(model_name)
+        return tokenizer, model
+    return AutoTokenizer.from_pretrained(model_name), AutoModelForCausalLM.from_pretrained(model_name)
+
+
+def _final_norm(model):
+    """Return the decoder's final normalization layer (identity if it has none)."""
+    decoder = model.get_decoder()
+    for name in ("norm", "final_layernorm", "ln_f"):
+        if hasattr(decoder, name):
+            return getattr(decoder, name)
+    return torch.nn.Identity()
+
+
+def _forward(model, input_ids, positions=slice(-1, None), **kwargs):
+    """
+    Run a causal LM forward pass, projecting only the selected positions through lm_head.
+
+    The full [batch, sequence, vocab] logits tensor is never materialized; the decoder
+    produces hidden states and only hidden[:, positions] goes through the output layer.
+
+    Args:
+        model: A causal language model
+        input_ids: Token id tensor of shape [batch, sequence]
+        positions: Slice of sequence positions to project (default: last position only)
+        **kwargs: Passed through to the decoder (past_key_values, use_cache, ...)
+
+    Returns:
+        Tuple of (logits for the selected positions, past_key_values or None)
+    """
+    outputs = model.get_decoder()(input_ids, **kwargs)
+    hidden_states = outputs.last_hidden_state[:, positions, :]
+    logits = model.get_output_embeddings()(hidden_states)
+    return logits, outputs.past_key_values
+
+
+def _restrict_to_top_n(probs, n):
+    """Zero all but the top n entries of each row and renormalize."""
+    top_probs, top_indices = torch.topk(probs, n, dim=-1)
+    restricted = torch.zeros_like(probs).scatter_(-1, top_indices, top_probs)
+    return restricted / restricted.sum(dim=-1, keepdim=True)
+
+
+def _restrict_to_nucleus(probs, top_p, max_n=None):
+    """
+    Zero all but each row's smallest top_p nucleus (at most max_n entries) and renormalize,
+    keeping the same tokens as get_nucleus_tokens.
+    """
+    sorted_probs, sorted_ids = torch.sort(probs, dim=-1, descending=True)
+    # A token is kept while the tokens ranked above it cover less than top_p
+    keep = (torch.cumsum(sorted_probs, dim=-1) - sorted_probs) < top_p
+    if max_n is not None:
+        keep[..., max_n:] = False
+    restricted = torch.zeros_like(probs).scatter_(-1, sorted_ids, sorted_probs * keep)
+    return restricted / restricted.sum(dim=-1, keepdim=True)
+
+
+def _common_prefix_length(a, b):
+    """Length of the longest common prefix of two token lists."""
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+def _aligned_suffix(tokens, scores, start, rows):
+    """
+    Token ids, log-probabilities and entropies of tokens[start:], padded to rows
+    with -1 and NaN. Token i is scored at position i - 1, and token 0 has no score.
+    """
+    ids = np.full(rows, -1, dtype=np.int64)
+    logprobs = np.full(rows, np.nan)
+    entropy = np.full(rows, np.nan)
+    count = len(tokens) - start
+    ids[:count] = tokens[start:]
+    first = max(start, 1)
+    logprobs[first - start:count] = scores["chosen_logprobs"][first - 1:]
+    entropy[first - start:count] = scores["entropy"][first - 1:]
+    return ids, logprobs, entropy
+
+
+def _to_host(token_ids, logprobs):
+    """
+    Copy token ids and their log-probabilities to NumPy in one device-to-host transfer.
+
+    Both are stacked as float64, which holds every token id exactly.
+    """
+    host = torch.stack([token_ids.to(torch.float64), logprobs.to(torch.float64)]).cpu().numpy()
+    return host[0].astype(np.int64), host[1]
+
+
+def _crop_cache(cache, length):
+    """Drop cached key/values beyond the first `length` positions."""
+    excess = cache.get_seq_length() - length
+    if excess > 0:
+        # A negative count removes that many positions in every transformers version
+        cache.crop(-excess)
+
+
+def _expand_cache(past_key_values, n):
+    """Repeat a batch-size-1 KV cache n times along the batch dimension."""
+    if n == 1:
+        return past_key_values
+    if hasattr(past_key_values, "batch_repeat_interleave"):
+        past_key_values.batch_repeat_interleave(n)
+        return past_key_values
+    return tuple(
+        tuple(tensor.repeat_interleave(n, dim=0) for tensor in layer)
+        for layer in past_key_values
+    )
@@ -0,0 +1,195 @@
+"""
+Columnar export of exploration sessions to Arrow IPC or Parquet.
+
+Each branch (prompt) of a session becomes one row holding its text, token ids, the
+per-position log-probability and entropy of every token, the top-k alternatives at
+every position and the next-token distribution after the last token. Arrays are
+concatenated in NumPy and wrapped as Arrow buffers, so no value passes through a
+Python object. The file stores the exporting model's name, and loading it with the
+same model gives back a TokenSession whose scores and next-token table need no
+forward pass.
+
+Requires pyarrow (`uv add pyarrow`).
+"""
+import json
+
+import numpy as np
+
+from src.distribution import TokenDistribution
+from src.explorer import DEFAULT_ALTERNATIVES
+from src.session import TokenSession
+
+METADATA_KEY = b"token_explorer"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError("Session export requires pyarrow: uv add pyarrow") from error
+    return pyarrow
+
+
+def _list_array(pa, arrays, dtype, list_size=None):
+    """Build a list<...> column from per-row NumPy arrays with one concatenation."""
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int32)
+    np.cumsum([len(array) for array in arrays], out=offsets[1:])
+    values = np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype=dtype)
+    if list_size is None:
+        values = pa.array(values)
+    else:
+        values = pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), list_size)
+    return pa.ListArray.from_arrays(pa.array(offsets), values)
+
+
+def _list_column(table, name, list_size=None):
+    """Split a list<...> column back into per-row NumPy views."""
+    column = table.column(name).combine_chunks()
+    offsets = column.offsets.to_numpy()
+    values = column.values
+    if list_size is None:
+        values = values.to_numpy()
+    else:
+        values = values.flatten().to_numpy().reshape(-1, list_size)
+    return [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def export_branches(explorer, prompts_tokens, path, prompt_index=0, k=DEFAULT_ALTERNATIVES, next_tokens=30,
+                    top_p=None):
+    """
+    Score every prompt and write the results to an Arrow or Parquet file.
+
+    Args:
+        explorer: The Explorer to score with; its prompt is restored afterwards
+        prompts_tokens: List of token id lists (the session's branches), scored as they are
+                        rather than re-encoded from their text
+        path: Output file; .parquet writes Parquet, anything else an Arrow IPC file
+        prompt_index: Index of the active prompt (default 0)
+        k: Number of alternatives per position (default 5)
+        next_tokens: Number of next-token candidates stored per prompt (default 30)
+        top_p: Nucleus setting of the exporting session, restored on load (default None)
+
+    Returns:
+        The output path
+    """
+    pa = _pyarrow()
+    saved_text, saved_tokens = explorer.prompt_text, list(explorer.prompt_tokens)
+    texts, rows = [], []
+    try:
+        for tokens in prompts_tokens:
+            explorer.set_prompt_tokens(tokens)
+            texts.append(explorer.get_prompt())
+            scores = explorer.get_prompt_scores(k)
+            distribution = explorer.get_top_n_tokens(n=next_tokens)
+            rows.append((np.asarray(explorer.prompt_tokens, dtype=np.int64), scores, distribution))
+    finally:
+        explorer.prompt_text, explorer.prompt_tokens = saved_text, saved_tokens
+
+    table = pa.table({
+        "text": pa.array(texts, pa.string()),
+        "token_ids": _list_array(pa, [tokens for tokens, _, _ in rows], np.int64),
+        "logprobs": _list_array(pa, [scores["chosen_logprobs"] for _, scores, _ in rows], np.float64),
+        "entropy": _list_array(pa, [scores["entropy"] for _, scores, _ in rows], np.float64),
+        "top_ids": _list_array(pa, [scores["top_ids"] for _, scores, _ in rows], np.int64, k),
+        "top_logprobs": _list_array(pa, [scores["top_logprobs"] for _, scores, _ in rows], np.float64, k),
+        "next_ids": _list_array(pa, [distribution.token_ids for _, _, distribution in rows], np.int64),
+        "next_logprobs": _list_array(pa, [distribution.logprobs for _, _, distribution in rows], np.float64),
+    })
+    metadata = {"model_name": explorer.model_name, "prompt_index": prompt_index, "k": k,
+                "next_tokens": next_tokens, "top_p": top_p}
+    table = table.replace_schema_metadata({METADATA_KEY: json.dumps(metadata)})
+
+    if str(path).endswith(".parquet"):
+        pa.parquet.write_table(table, path)
+    else:
+        with pa.ipc.new_file(path, table.schema) as writer:
+            writer.write_table(table)
+    return path
+
+
+def export_session(session, path, k=DEFAULT_ALTERNATIVES):
+    """Export every branch of a TokenSession (see export_branches)."""
+    return export_branches(session.explorer, session.prompts_tokens, path, prompt_index=session.prompt_index,
+                           k=k, next_tokens=session.tokens_to_show, top_p=session.top_p)
+
+
+def read_export(path):
+    """
+    Read a file written by export_branches.
+
+    Args:
+        path: Arrow IPC or Parquet file
+
+    Returns:
+        Tuple of (list of per-branch dicts of NumPy arrays, export metadata dict)
+    """
+    pa = _pyarrow()
+    if str(path).endswith(".parquet"):
+        table = pa.parquet.read_table(path)
+    else:
+        table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+    metadata = json.loads(table.schema.metadata[METADATA_KEY])
+    k = metadata["k"]
+
+    columns = {
+        "token_ids": _list_column(table, "token_ids"),
+        "logprobs": _list_column(table, "logprobs"),
+        "entropy": _list_column(table, "entropy"),
+        "top_ids": _list_column(table, "top_ids", k),
+        "top_logprobs": _list_column(table, "top_logprobs", k),
+        "next_ids": _list_column(table, "next_ids"),
+        "next_logprobs": _list_column(table, "next_logprobs"),
+    }
+    branches = [
+        {"text": text, **{name: values[row] for name, values in columns.items()}}
+        for row, text in enumerate(table.column("text").to_pylist())
+    ]
+    return branches, metadata
+
+
+def load_session(path, explorer, rng=None):
+    """
+    Rebuild a TokenSession from an export.
+
+    When the explorer runs the model the export was made with, the next-token table
+    and per-position scores of the active prompt come from the file and no forward
+    pass is run; otherwise they are recomputed.
+
+    Args:
+        path: File written by export_branches or export_session
+        explorer: The Explorer the session should use
+        rng: Optional random.Random for weighted sampling
+
+    Returns:
+        A TokenSession with every exported branch and the exported active prompt
+    """
+    branches, metadata = read_export(path)
+    prompt_index = metadata["prompt_index"]
+    active = branches[prompt_index]
+    same_model = metadata["model_name"] == explorer.model_name
+
+    top_p = metadata.get("top_p")
+    displayed_tokens = None
+    if same_model:
+        displayed_tokens = TokenDistribution(active["next_ids"], active["next_logprobs"], explorer.token_string)
+        if top_p is not None:
+            # The stored candidates are the top next_tokens, so the capped nucleus is a prefix of them
+            displayed_tokens = displayed_tokens.nucleus(top_p)
+    # Branches built token by token need not round-trip through their text
+    prompts_tokens = [branch["token_ids"].tolist() for branch in branches] if same_model else None
+    session = TokenSession.restore(
+        explorer, [branch["text"] for branch in branches], prompt_index=prompt_index,
+        displayed_tokens=displayed_tokens, tokens_to_show=metadata["next_tokens"], rng=rng, top_p=top_p,
+        prompts_tokens=prompts_tokens,
+    )
+    if same_model:
+        explorer.set_prompt_scores({
+            "tokens": active["token_ids"].tolist(),
+            "chosen_logprobs": active["logprobs"],
+            "entropy": active["entropy"],
+            "top_ids": active["top_ids"],
+            "top_logprobs": active["top_logprobs"],
+        })
+    return session
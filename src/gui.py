@@ -1,14 +1,32 @@
 import asyncio
 import html
+import math
 
-from nicegui import ui
+from fastapi import Response
+from nicegui import app, ui
 from nicegui.events import KeyEventArguments
 
+from src.api import register_api
+from src.executor import SerialExecutor, Superseded
 from src.explorer import Explorer
+from src.metrics import CONTENT_TYPE, ServerMetrics
+from src.pool import ExplorerPool, PooledExplorer
+from src.registry import ModelRegistry
 from src.session import TokenSession
 
+# Seconds of idle typing before an edited prompt is re-tokenized and rescored
+EDIT_DEBOUNCE_SECONDS = 0.3
 
-def run_gui(prompt, host, port, model_name, tokens_to_show):
+# Next-token candidates shown per branch when comparing branches
+COMPARE_TOKENS = 5
+
+# Seconds a page may take to build its session, which can include loading a model
+SESSION_TIMEOUT_SECONDS = 120
+
+
+def run_gui(prompt, host, port, model_name, tokens_to_show, fan_out_tokens=100, draft_model_name=None,
+            workers=0, model_names=None, memory_budget=None, candidates=None, top_p=None,
+            max_prompts=None):
     ui.add_head_html(
         """
         <link rel="preconnect" href="https://fonts.googleapis.com">
@@ -137,6 +155,10 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
                 display: block;
             }
 
+            .token-selected {
+                outline: 2px solid var(--ink);
+            }
+
             .legend-swatch {
                 width: 24px;
                 height: 18px;
@@ -150,10 +172,60 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
         shared=True,
     )
 
-    @ui.page("/")
-    def main_page():
-        explorer = Explorer(model_name)
-        session = TokenSession(explorer, prompt=prompt, tokens_to_show=tokens_to_show)
+    # Executors of the connected pages, for the queue depth metric
+    executors = set()
+    metrics = ServerMetrics(
+        model_memory=lambda: registry.memory_bytes(),
+        queue_depth=lambda: sum(executor.pending for executor in list(executors)),
+    )
+
+    def load_explorer(name):
+        if name != model_name:
+            explorer = Explorer(name)
+        else:
+            # The draft model and the worker pool serve the default model
+            explorer = Explorer(model_name, draft_model_name=draft_model_name)
+            if workers:
+                # Forward passes for every page run on a pool of processes sharing the weights
+                explorer = PooledExplorer(ExplorerPool(explorer, num_workers=workers))
+        explorer.observers.append(metrics.observe)
+        return explorer
+
+    # One copy of each model is shared by every page and the JSON API
+    registry = ModelRegistry([model_name] + list(model_names or []), memory_budget=memory_budget,
+                             load=load_explorer)
+
+    api_session = TokenSession(registry.fork(model_name), prompt=prompt, tokens_to_show=tokens_to_show, top_p=top_p)
+    api_session.observers.append(metrics.observe)
+    register_api(app, api_session)
+
+    @app.get("/metrics")
+    async def metrics_endpoint():
+        return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+    def create_session():
+        # Forking may load the model again after an eviction, and a fresh fork scores the prompt from scratch
+        session = TokenSession(registry.fork(model_name), prompt=prompt, tokens_to_show=tokens_to_show, top_p=top_p)
+        session.observers.append(metrics.observe)
+        return session
+
+    @ui.page("/", response_timeout=SESSION_TIMEOUT_SECONDS)
+    async def main_page():
+        # All session/model calls for this page run here, off the event loop and in order
+        executor = SerialExecutor()
+        executors.add(executor)
+        metrics.active_sessions.inc()
+
+        def close_session():
+            executors.discard(executor)
+            metrics.active_sessions.dec()
+            executor.shutdown()
+
+        # on_disconnect also fires on websocket drops the page reconnects from;
+        # the session is only closed once the client is removed for good
+        ui.context.client.on_delete(close_session)
+
+        session = await executor.run(create_session)
 
         base_prompt_text = prompt
         base_token_ids = list(session.get_prompt_tokens())
@@ -161,11 +233,20 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
 
         show_token_numbers = False
         show_probabilities = False
+        show_lens = False
+        show_compare = False
+        show_models = False
+        show_diff = False
+        diff_branch = None  # branch chosen to diff against, None for the first (or second) one
+        selected_token_index = None
         continue_task = None
         continue_cancelled = False
         continue_active = False
+        edit_task = None
+        view = None
+        continuations = None  # (prompt tokens, candidates, scores) of the last ranking
 
-        end_token_id = _resolve_end_token_id(explorer)
+        end_token_id = _resolve_end_token_id(session.explorer)
 
         def prob_to_color(probability):
             probability = max(0.0, min(1.0, probability))
@@ -175,21 +256,89 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
         def token_ids_to_text(token_ids):
             return " ".join(str(token_id) for token_id in token_ids)
 
-        def sync_prompt_from_input():
+        def snapshot(with_probabilities, with_lens, with_compare, with_models, with_diff, token_index, diff_index):
+            """Collect everything the page renders. Runs on the session's executor thread."""
+            tokens = list(session.get_prompt_tokens())
+            other_index = 0 if session.prompt_index != 0 else 1
+            if diff_index is not None and diff_index != session.prompt_index and diff_index < len(session.prompts):
+                other_index = diff_index
+            if token_index is not None and token_index >= len(tokens):
+                token_index = None
+            return {
+                "prompt": session.get_prompt(),
+                "tokens": tokens,
+                "token_strings": session.get_prompt_tokens_strings(),
+                "displayed_tokens": session.displayed_tokens,
+                "prompts": list(session.prompts),
+                "prompt_index": session.prompt_index,
+                "probabilities": session.get_prompt_token_probabilities() if with_probabilities else None,
+                # A selected prompt token shows the prediction made at it; otherwise the next token
+                "lens": session.get_logit_lens(position=token_index) if with_lens else None,
+                # Only prompts whose tokens changed are rescored, together in one batch
+                "compare": session.get_all_top_n_tokens() if with_compare else None,
+                # Every model scores the prompt concurrently
+                "models": (
+                    registry.top_n_tokens(session.get_prompt(), n=COMPARE_TOKENS) if with_models else None
+                ),
+                # The active branch against the chosen one (default the first, or the second from the
+                # first); only their divergent suffixes are scored, and an unchanged pair is cached
+                "diff": (
+                    (other_index, session.diff_prompts(other_index))
+                    if with_diff and len(session.prompts) > 1 else None
+                ),
+                "selected_token_index": token_index,
+                # Cached per prompt, so selecting another token needs no forward pass
+                "alternatives": (
+                    session.get_prompt_alternatives()[token_index]
+                    if with_probabilities and token_index is not None else None
+                ),
+            }
+
+        async def run_session(action=None, *args, key=None):
+            """
+            Run a session call and snapshot the page state on the executor, then render.
+
+            Returns the call's result, or None if a newer call with the same key
+            superseded it before it started.
+            """
+            nonlocal view, selected_token_index
+            options = (show_probabilities, show_lens, show_compare, show_models, show_diff, selected_token_index,
+                       diff_branch)
+
+            def job():
+                result = action(*args) if action is not None else None
+                return result, snapshot(*options)
+
+            try:
+                result, view = await executor.run(job, key=key)
+            except Superseded:
+                return None
+            selected_token_index = view["selected_token_index"]
+            render()
+            return result
+
+        async def apply_prompt_edit(current_text):
             nonlocal base_prompt_text, base_token_ids, base_token_count
-            if show_token_numbers:
-                return
-            current_text = input_area.value or ""
             if current_text == base_prompt_text:
                 return
             base_prompt_text = current_text
-            session.set_prompt_text(base_prompt_text)
-            base_token_ids = list(session.get_prompt_tokens())
-            base_token_count = len(base_token_ids)
-            refresh_ui()
+            await run_session(session.edit_prompt_text, current_text, key="edit")
+            if view is not None and view["prompt"] == base_prompt_text:
+                base_token_ids = list(view["tokens"])
+                base_token_count = len(base_token_ids)
+                update_edit_state()
+
+        async def sync_prompt_from_input():
+            nonlocal edit_task
+            if show_token_numbers:
+                return
+            if edit_task is not None:
+                edit_task.cancel()
+                edit_task = None
+            await apply_prompt_edit(input_area.value or "")
 
         def render_output():
-            prompt_tokens = session.get_prompt_tokens()
+            prompt_tokens = view["tokens"]
             if not prompt_tokens:
                 update_html(output_area, "")
                 return
@@ -200,12 +349,14 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
                     update_html(output_area, html.escape(" ".join(labels)))
                     return
             else:
-                labels = session.get_prompt_tokens_strings()
+                labels = view["token_strings"]
                 if not show_probabilities:
-                    update_html(output_area, html.escape(session.get_prompt()))
+                    update_html(output_area, html.escape(view["prompt"]))
                     return
 
-            probabilities = session.get_prompt_token_probabilities()
+            probabilities = view["probabilities"]
+            if probabilities is None:
+                return
             pieces = []
             for idx, label in enumerate(labels):
                 token_label = label
@@ -213,12 +364,15 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
                     token_label += " "
                 safe_label = html.escape(token_label)
                 bg = prob_to_color(probabilities[idx]) if show_probabilities else "transparent"
-                pieces.append(f'<span class="token-chip" style="background:{bg}">{safe_label}</span>')
+                selected = " token-selected" if idx == selected_token_index else ""
+                pieces.append(
+                    f'<span class="token-chip{selected}" data-idx="{idx}" style="background:{bg}">{safe_label}</span>'
+                )
             update_html(output_area, "".join(pieces))
 
         def render_next_tokens():
             next_tokens_container.clear()
-            displayed_tokens = session.displayed_tokens
+            displayed_tokens = view["displayed_tokens"]
             if not displayed_tokens:
                 return
             with next_tokens_container:
@@ -242,6 +396,183 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
                             ui.element("div").classes("prob-bar").style(f"width: {prob * 100:.2f}%;")
                             ui.label(f"{percent}").classes("prob-text")
 
+        def render_lens():
+            lens_container.clear()
+            if not show_lens or view["lens"] is None:
+                return
+            with lens_container:
+                title = "Next token" if selected_token_index is None else f"After token {selected_token_index + 1}"
+                ui.label(f"Logit lens: {title}").style("font-weight: 600; margin-bottom: 6px;")
+                for layer, tokens in enumerate(view["lens"]):
+                    with ui.row().classes("items-center gap-2").style("flex-wrap: nowrap;"):
+                        ui.label("emb" if layer == 0 else f"L{layer}").style("width: 36px; font-weight: 600;")
+                        for token in tokens:
+                            label = str(token["token_id"]) if show_token_numbers else token["token"]
+                            chip = ui.label(f"{label} {token['probability'] * 100:.0f}%").classes("token-chip")
+                            chip.style(f"background: {prob_to_color(token['probability'])}; white-space: pre;")
+
+        def render_alternatives():
+            alternatives_container.clear()
+            candidates = view["alternatives"]
+            if selected_token_index is None or not show_probabilities or candidates is None:
+                return
+            with alternatives_container:
+                with ui.row().classes("items-center gap-2"):
+                    ui.label(f"Token {selected_token_index + 1} alternatives:").style("font-weight: 600;")
+                    for token in candidates:
+                        label = str(token["token_id"]) if show_token_numbers else token["token"]
+                        chip = ui.label(f"{label} {token['probability'] * 100:.0f}%").classes("token-chip next-cell")
+                        chip.style(f"background: {prob_to_color(token['probability'])}; white-space: pre;")
+                        chip.on("click", lambda _, token_id=token["token_id"]: branch_at(selected_token_index, token_id))
+                    if selected_token_index > 0:
+                        ui.button("Branch here", on_click=lambda: branch_at(selected_token_index)).props("outline dense")
+
+        async def branch_at(position, token_id=None):
+            nonlocal base_prompt_text, base_token_ids, base_token_count, selected_token_index
+            selected_token_index = None
+            if not await run_session(session.branch_at, position, token_id, max_prompts):
+                if max_prompts is not None and len(view["prompts"]) >= max_prompts:
+                    ui.notify(f"All {max_prompts} branches are in use; remove one to branch again")
+                return
+            base_prompt_text = view["prompt"]
+            base_token_ids = list(view["tokens"])
+            base_token_count = len(base_token_ids)
+            input_area.value = token_ids_to_text(base_token_ids) if show_token_numbers else base_prompt_text
+            update_edit_state()
+
+        async def select_prompt_token(index):
+            nonlocal selected_token_index
+            if not show_probabilities:
+                return
+            selected_token_index = None if index == selected_token_index else index
+            await run_session(key="view")
+
+        def switch_model(model_name):
+            session.set_explorer(registry.fork(model_name))
+            return session.explorer.encode(base_prompt_text)
+
+        async def set_model(model_name):
+            nonlocal end_token_id, base_token_ids, base_token_count
+            token_ids = await run_session(switch_model, model_name)
+            # Token ids of the base prompt depend on the model's tokenizer
+            base_token_ids = token_ids
+            base_token_count = len(base_token_ids)
+            end_token_id = _resolve_end_token_id(session.explorer)
+            if show_token_numbers:
+                input_area.value = token_ids_to_text(base_token_ids)
+            update_speculative_stats()
+            update_edit_state()
+
+        async def set_show_models(value):
+            nonlocal show_models
+            show_models = value
+            models_card.set_visibility(show_models)
+            await run_session(key="view")
+
+        def render_models():
+            models_container.clear()
+            if view["models"] is None:
+                return
+            with models_container:
+                for name, tokens in view["models"].items():
+                    with ui.row().classes("items-center gap-2"):
+                        ui.label(name).style("font-weight: 600; min-width: 160px;")
+                        for token in tokens:
+                            label = str(token["token_id"]) if show_token_numbers else token["token"]
+                            chip = ui.label(f"{label} {token['probability'] * 100:.0f}%").classes("token-chip")
+                            chip.style(f"background: {prob_to_color(token['probability'])}; white-space: pre;")
+
+        async def score_continuations():
+            nonlocal continuations
+            candidates = [line for line in continuations_input.value.splitlines() if line.strip()]
+            if not candidates:
+                continuations = None
+                render_continuations()
+                return
+            try:
+                scores = await run_session(session.score_continuations, candidates)
+            except ValueError as error:
+                ui.notify(str(error))
+                return
+            if scores is not None:
+                continuations = (view["tokens"], candidates, scores)
+                render_continuations()
+
+        def render_continuations():
+            continuations_container.clear()
+            # Rankings are for the prompt they were scored after
+            if continuations is None or continuations[0] != view["tokens"]:
+                return
+            _, candidates, scores = continuations
+            ranked = sorted(zip(candidates, scores), key=lambda pair: pair[1]["logprob"], reverse=True)
+            with continuations_container:
+                for candidate, score in ranked:
+                    with ui.row().classes("items-center gap-2"):
+                        ui.label(f"{score['logprob']:.2f}").style("font-weight: 600; min-width: 56px;")
+                        for token_id, token, logprob in zip(score["token_ids"], score["tokens"], score["token_logprobs"]):
+                            probability = math.exp(logprob)
+                            label = str(token_id) if show_token_numbers else token
+                            chip = ui.label(f"{label} {probability * 100:.0f}%").classes("token-chip")
+                            chip.style(f"background: {prob_to_color(probability)}; white-space: pre;")
+
+        async def set_show_diff(value):
+            nonlocal show_diff
+            show_diff = value
+            diff_card.set_visibility(show_diff)
+            await run_session(key="view")
+
+        async def set_diff_branch(index):
+            nonlocal diff_branch
+            if index == diff_branch:
+                return
+            diff_branch = index
+            await run_session(key="view")
+
+        def render_diff():
+            diff_container.clear()
+            if view["diff"] is None:
+                return
+            other_index, diff = view["diff"]
+            explorer = session.explorer
+            with diff_container:
+                with ui.row().classes("items-center gap-2"):
+                    ui.label(f"Branch {view['prompt_index'] + 1} vs").style("font-weight: 600;")
+                    branches = {
+                        index: f"Branch {index + 1}" for index in range(len(view["prompts"]))
+                        if index != view["prompt_index"]
+                    }
+                    ui.select(branches, value=other_index, on_change=lambda e: set_diff_branch(e.value)).props("dense")
+                    ui.label(f"{diff['prefix_length']} shared tokens").style("font-weight: 600;")
+                for row in range(len(diff["token_ids_a"])):
+                    with ui.row().classes("items-center gap-2").style("flex-wrap: nowrap;"):
+                        for side in ("a", "b"):
+                            token_id = int(diff[f"token_ids_{side}"][row])
+                            logprob = diff[f"logprobs_{side}"][row]
+                            if token_id < 0:
+                                ui.label("").style("min-width: 180px;")
+                                continue
+                            probability = 0.0 if math.isnan(logprob) else math.exp(logprob)
+                            label = str(token_id) if show_token_numbers else explorer.token_string(token_id)
+                            entropy = diff[f"entropy_{side}"][row]
+                            entropy_text = "" if math.isnan(entropy) else f" H {entropy:.2f}"
+                            chip = ui.label(f"{label} {probability * 100:.0f}%{entropy_text}").classes("token-chip")
+                            chip.style(f"background: {prob_to_color(probability)}; white-space: pre; min-width: 180px;")
+                        delta = diff["logprob_delta"][row]
+                        if not math.isnan(delta):
+                            delta_p = math.exp(diff["logprobs_b"][row]) - math.exp(diff["logprobs_a"][row])
+                            ui.label(f"Δp {delta_p * 100:+.0f}  ΔH {diff['entropy_delta'][row]:+.2f}")
+
+        async def set_show_compare(value):
+            nonlocal show_compare
+            show_compare = value
+            await run_session(key="view")
+
+        async def set_show_lens(value):
+            nonlocal show_lens
+            show_lens = value
+            lens_card.set_visibility(show_lens)
+            await run_session(key="view")
+
         def render_legend():
             legend_container.clear()
             if not show_probabilities:
@@ -255,10 +586,40 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
                     swatch.style(f"background: {color};")
                     ui.label(f"{percent}%")
 
-        def refresh_ui():
+        def render_branches():
+            branches_container.clear()
+            if len(view["prompts"]) <= 1:
+                return
+            with branches_container:
+                for index, branch_text in enumerate(view["prompts"]):
+                    if branch_text.startswith(base_prompt_text):
+                        branch_text = branch_text[len(base_prompt_text):]
+                    label = f"{index + 1}. {branch_text.strip() or '(prompt)'}"
+                    branch = ui.label(label).classes("next-cell").style("white-space: pre-wrap;")
+                    if index == view["prompt_index"]:
+                        branch.style("background: #eef6ff; font-weight: 600;")
+                    branch.on("click", lambda _, index=index: select_branch(index))
+                    if view["compare"] is not None:
+                        with ui.row().classes("items-center gap-2").style("margin: 0 0 6px 12px;"):
+                            for token in view["compare"][index][:COMPARE_TOKENS]:
+                                label = str(token["token_id"]) if show_token_numbers else token["token"]
+                                chip = ui.label(f"{label} {token['probability'] * 100:.0f}%").classes("token-chip")
+                                chip.style(f"background: {prob_to_color(token['probability'])}; white-space: pre;")
+                ui.button("Remove branch", on_click=remove_branch).props("outline dense")
+
+        def render():
+            if view is None:
+                return
             render_output()
             render_next_tokens()
             render_legend()
+            render_lens()
+            render_alternatives()
+            render_branches()
+            update_fan_out_limit()
+            render_models()
+            render_continuations()
+            render_diff()
             update_edit_state()
 
         def set_show_token_numbers(value):
@@ -269,62 +630,97 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
                 input_area.value = token_ids_to_text(base_token_ids)
             else:
                 input_area.value = base_prompt_text
-            refresh_ui()
+            render()
 
-        def set_show_probabilities(value):
+        async def set_show_probabilities(value):
             nonlocal show_probabilities
             show_probabilities = value
-            refresh_ui()
-
-        def append_token(token_id):
-            sync_prompt_from_input()
-            session.explorer.append_token(token_id)
-            session.prompts[session.prompt_index] = session.explorer.get_prompt()
-            session._refresh_tokens()
-            refresh_ui()
-
-        def append_weighted():
-            sync_prompt_from_input()
-            if session.append_weighted_token():
-                refresh_ui()
-
-        def delete_last():
-            sync_prompt_from_input()
-            if len(session.get_prompt_tokens()) > base_token_count:
-                session.pop_token(min_tokens=base_token_count)
-                refresh_ui()
-
-        def delete_all():
-            sync_prompt_from_input()
-            session.set_prompt_text(base_prompt_text)
-            refresh_ui()
+            await run_session(key="view")
+
+        async def append_token(token_id):
+            await sync_prompt_from_input()
+            await run_session(session.append_token, token_id)
+
+        async def append_weighted():
+            await sync_prompt_from_input()
+            await run_session(session.append_weighted_token)
+
+        async def delete_last():
+            await sync_prompt_from_input()
+            if len(view["tokens"]) > base_token_count:
+                await run_session(session.pop_token, base_token_count)
+
+        async def delete_all():
+            await sync_prompt_from_input()
+            await run_session(session.set_prompt_text, base_prompt_text)
+
+        async def select_branch(index):
+            await run_session(session.select_prompt, index)
+
+        async def remove_branch():
+            await run_session(session.remove_prompt)
+
+        async def run_fan_out():
+            await sync_prompt_from_input()
+            n = int(fan_out_input.value or 1)
+            fan_out_button.disable()
+            try:
+                branches = await run_session(session.fan_out, n, fan_out_tokens, max_prompts)
+            finally:
+                fan_out_button.enable()
+            if max_prompts is not None and not branches:
+                ui.notify(f"All {max_prompts} branches are in use; remove one to fan out again")
+            elif len(branches) < n:
+                ui.notify(f"Added {len(branches)} of {n} branches, the limit is {max_prompts}")
+            update_fan_out_limit()
+
+        def update_fan_out_limit():
+            if max_prompts is None:
+                return
+            # Fan-out adds at most the free branch slots
+            remaining = max_prompts - len(view["prompts"])
+            fan_out_input.max = max(1, remaining)
+            fan_out_button.set_enabled(remaining > 0)
 
         def is_end_token():
-            if end_token_id is None:
+            if end_token_id is None or view is None:
                 return False
-            prompt_tokens = session.get_prompt_tokens()
+            prompt_tokens = view["tokens"]
             return bool(prompt_tokens and prompt_tokens[-1] == end_token_id)
 
         async def run_continue():
             nonlocal continue_cancelled, continue_task
+            if session.explorer.draft_model is not None:
+                step = session.append_speculative_tokens
+            else:
+                step = session.append_weighted_token
             try:
                 while not continue_cancelled and not is_end_token():
-                    success = await asyncio.to_thread(session.append_weighted_token)
+                    success = await run_session(step)
                     if not success:
                         break
-                    refresh_ui()
-                    await asyncio.sleep(0)
+                    update_speculative_stats()
             finally:
                 continue_cancelled = False
                 continue_task = None
                 set_continue_button(False)
 
-        def toggle_continue():
+        def update_speculative_stats():
+            if session.explorer.draft_model is None:
+                speculative_label.text = ""
+                return
+            stats = session.explorer.get_speculative_stats()
+            speculative_label.text = (
+                f"Draft acceptance: {stats['acceptance_rate'] * 100:.0f}% "
+                f"({stats['tokens_per_round']:.1f} tokens/round)"
+            )
+
+        async def toggle_continue():
             nonlocal continue_cancelled, continue_task
-            sync_prompt_from_input()
             if continue_task is None:
-                continue_cancelled = False
                 set_continue_button(True)
+                await sync_prompt_from_input()
+                continue_cancelled = False
                 continue_task = asyncio.create_task(run_continue())
             else:
                 continue_cancelled = True
@@ -334,21 +730,23 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
             if event.key in ("Escape", "Esc") and continue_task is not None:
                 continue_cancelled = True
 
-        def on_input_blur():
-            sync_prompt_from_input()
+        async def on_input_blur():
+            await sync_prompt_from_input()
+
+        async def apply_prompt_edit_later(text):
+            nonlocal edit_task
+            await asyncio.sleep(EDIT_DEBOUNCE_SECONDS)
+            edit_task = None
+            await apply_prompt_edit(text)
 
         def on_input_change(value):
-            nonlocal base_prompt_text, base_token_ids, base_token_count
+            nonlocal edit_task
             if show_token_numbers:
                 return
-            current_text = value or ""
-            if current_text == base_prompt_text:
-                return
-            base_prompt_text = current_text
-            session.set_prompt_text(base_prompt_text)
-            base_token_ids = list(session.get_prompt_tokens())
-            base_token_count = len(base_token_ids)
-            refresh_ui()
+            # Wait for a pause in typing before re-tokenizing and rescoring
+            if edit_task is not None:
+                edit_task.cancel()
+            edit_task = asyncio.create_task(apply_prompt_edit_later(value or ""))
 
         def set_continue_button(active):
             nonlocal continue_active
@@ -371,7 +769,9 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
             update_edit_state()
 
         def update_edit_state():
-            completion_empty = len(session.get_prompt_tokens()) == base_token_count
+            if view is None:
+                return
+            completion_empty = len(view["tokens"]) == base_token_count
             if completion_empty:
                 edit_button.disable()
             else:
@@ -386,25 +786,25 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
             # Disable Next and Continue when at end token (unless continue is active/cancelling)
             at_end = is_end_token()
             if not continue_active:
-                if at_end or not session.get_prompt_tokens():
+                if at_end or not view["tokens"]:
                     next_button.disable()
                     continue_button.disable()
                 else:
                     next_button.enable()
                     continue_button.enable()
 
-        def handle_edit():
+        async def handle_edit():
             nonlocal continue_cancelled, continue_task, base_token_ids, base_token_count
             if continue_task is not None:
                 continue_cancelled = True
                 continue_task.cancel()
                 set_continue_button(False)
-            session.set_prompt_text(base_prompt_text)
-            base_token_ids = list(session.get_prompt_tokens())
+            await run_session(session.set_prompt_text, base_prompt_text)
+            base_token_ids = list(view["tokens"])
             base_token_count = len(base_token_ids)
             if show_token_numbers:
                 input_area.value = token_ids_to_text(base_token_ids)
-            refresh_ui()
+            update_edit_state()
             focus_prompt()
 
         def focus_prompt():
@@ -434,11 +834,45 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
                     with ui.card().classes("panel w-full"):
                         ui.label("Completion").style("font-weight: 600; margin-bottom: 6px;")
                         output_area = ui.html("", sanitize=False).classes("token-output")
+                        output_area.on(
+                            "click",
+                            lambda e: select_prompt_token(e.args),
+                            js_handler="(e) => { const idx = e.target.dataset.idx;"
+                                       " if (idx !== undefined) emit(Number(idx)); }",
+                        )
+                        alternatives_container = ui.column().classes("gap-2 w-full")
+
+                    with ui.card().classes("panel w-full") as lens_card:
+                        lens_container = ui.column().classes("gap-1 w-full")
+                    lens_card.set_visibility(False)
 
                     with ui.card().classes("panel w-full"):
                         ui.label("Next tokens").style("font-weight: 600;")
                         next_tokens_container = ui.element("div").classes("next-table").style("width: 100%;")
 
+                    with ui.card().classes("panel w-full") as models_card:
+                        ui.label("Models").style("font-weight: 600;")
+                        models_container = ui.column().classes("gap-2 w-full")
+                    models_card.set_visibility(False)
+
+                    with ui.card().classes("panel w-full") as diff_card:
+                        ui.label("Branch diff").style("font-weight: 600;")
+                        diff_container = ui.column().classes("gap-1 w-full")
+                    diff_card.set_visibility(False)
+
+                    with ui.card().classes("panel w-full"):
+                        ui.label("Continuations").style("font-weight: 600;")
+                        continuations_input = ui.textarea(value="\n".join(candidates or []),
+                                                          placeholder="One candidate continuation per line")
+                        continuations_input.props("rows=3")
+                        continuations_input.style("width: 100%;")
+                        ui.button("Rank", on_click=score_continuations).props("outline dense")
+                        continuations_container = ui.column().classes("gap-1 w-full")
+
+                    with ui.card().classes("panel w-full"):
+                        ui.label("Branches").style("font-weight: 600;")
+                        branches_container = ui.column().classes("gap-2 w-full")
+
                 with ui.column().classes("panel controls"):
                     ui.label("Controls").style("font-weight: 600;")
                     edit_button = ui.button("Edit", on_click=lambda: handle_edit()).props("outline")
@@ -447,14 +881,27 @@ def run_gui(prompt, host, port, model_name, tokens_to_show):
                     delete_all_button = ui.button("Delete All", on_click=lambda: delete_all()).props("outline")
                     continue_button = ui.button("Continue", on_click=lambda: toggle_continue())
                     continue_button.props("outline")
+                    speculative_label = ui.label("").style("font-size: 12px; opacity: 0.8;")
+                    fan_out_input = ui.number("Branches", value=4, min=1, max=64, step=1, format="%d")
+                    fan_out_button = ui.button("Fan out N", on_click=run_fan_out).props("outline")
 
                     token_numbers_checkbox = ui.checkbox("Show token numbers", value=False, on_change=lambda e: set_show_token_numbers(e.value))
                     probabilities_checkbox = ui.checkbox("Show probabilities", value=False, on_change=lambda e: set_show_probabilities(e.value))
 
+                    lens_checkbox = ui.checkbox("Show logit lens", value=False, on_change=lambda e: set_show_lens(e.value))
+                    compare_checkbox = ui.checkbox("Compare branches", value=False,
+                                                   on_change=lambda e: set_show_compare(e.value))
+                    ui.checkbox("Diff branches", value=False, on_change=lambda e: set_show_diff(e.value))
+
+                    if len(registry.model_names) > 1:
+                        ui.select(registry.model_names, value=model_name, label="Model",
+                                  on_change=lambda e: set_model(e.value))
+                        ui.checkbox("Compare models", value=False, on_change=lambda e: set_show_models(e.value))
+
                     legend_container = ui.column().classes("gap-2")
 
         ui.keyboard(on_key=handle_key)
-        refresh_ui()
+        ui.timer(0, lambda: run_session(key="view"), once=True)
 
     ui.run(host=host, port=port, reload=False)
 
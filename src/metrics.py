@@ -0,0 +1,178 @@
+"""
+Operational metrics for the GUI server, exposed in the Prometheus text format.
+
+Explorer and TokenSession report forward passes, prompt refreshes and appended tokens
+to their observers; ServerMetrics is such an observer and aggregates the reports into
+counters and histograms. Gauges such as model memory and queue depth are read when
+/metrics is scraped. The exposition format is simple enough that no client library
+is needed.
+"""
+import bisect
+import threading
+
+# Latency buckets in seconds, from a cached single-token step up to a long prompt rescore
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge:
+    """Value that can go up and down, or is read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, func=None):
+        self.name = name
+        self.help_text = help_text
+        self.func = func
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def samples(self):
+        value = self.func() if self.func is not None else self._value
+        return [(self.name, (), value)]
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative))
+                samples.append((f"{self.name}_sum", key, series["sum"]))
+                samples.append((f"{self.name}_count", key, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class ServerMetrics:
+    """Metrics for a GUI server; pass `observe` to Explorer and TokenSession observers."""
+
+    def __init__(self, model_memory=lambda: 0, queue_depth=lambda: 0):
+        """
+        Args:
+            model_memory: Callable returning the bytes held by model weights
+            queue_depth: Callable returning the number of queued or running inference calls
+        """
+        self.registry = MetricsRegistry()
+        register = self.registry.register
+        self.active_sessions = register(Gauge(
+            "explorer_active_sessions", "Number of connected GUI sessions"))
+        self.forward_seconds = register(Histogram(
+            "explorer_forward_seconds", "Latency of model forward passes by operation"))
+        self.forward_tokens = register(Counter(
+            "explorer_forward_tokens_total", "Tokens run through the model by operation"))
+        self.cached_tokens = register(Counter(
+            "explorer_cached_tokens_total", "Tokens served from a KV or score cache by operation"))
+        self.refresh_seconds = register(Histogram(
+            "explorer_session_refresh_seconds", "Latency of refreshing a session's next-token distribution"))
+        self.appended_tokens = register(Counter(
+            "explorer_appended_tokens_total", "Tokens appended to session prompts"))
+        register(Gauge(
+            "explorer_model_memory_bytes", "Bytes held by model weights", func=model_memory))
+        register(Gauge(
+            "explorer_inference_queue_depth", "Inference calls queued or running", func=queue_depth))
+
+    def observe(self, event, **fields):
+        """Observer callback for Explorer and TokenSession events."""
+        if event == "forward":
+            operation = fields["operation"]
+            self.forward_seconds.observe(fields["seconds"], operation=operation)
+            self.forward_tokens.inc(fields.get("tokens", 0), operation=operation)
+            self.cached_tokens.inc(fields.get("cached_tokens", 0), operation=operation)
+        elif event == "refresh":
+            self.refresh_seconds.observe(fields["seconds"])
+        elif event == "append":
+            self.appended_tokens.inc(fields["tokens"])
+
+    def render(self):
+        return self.registry.render()
@@ -0,0 +1,293 @@
+"""
+Multi-process worker pool for Explorer forward passes.
+
+The parent process loads the model once and moves its weights into shared memory.
+Worker processes receive the model through torch.multiprocessing, which passes
+shared-memory handles instead of copying tensors, so N workers use one copy of the
+weights. Models loaded from a local snapshot are instead memory-mapped again by each
+worker, which shares the same pages through the page cache. Each worker gets a slice
+of the machine's cores for its intra-op threads so the pool as a whole does not
+oversubscribe the CPU.
+
+Each PooledExplorer is pinned to one worker, which keeps an Explorer fork for it, so
+the session's prompt cache is reused from one call to the next. Batches that belong
+to no session (corpus scoring, comparing branches) are split across all workers.
+"""
+import itertools
+import os
+import threading
+import weakref
+
+import torch
+import torch.multiprocessing as mp
+
+from src.distribution import TokenDistribution
+from src.explorer import Explorer
+from src.snapshot import is_snapshot
+
+# Explorer owned by the current worker process
+_worker_explorer = None
+# Per-session forks of _worker_explorer, so each session keeps its own prompt cache
+_worker_sessions = {}
+
+
+def _init_worker(explorer, num_threads):
+    global _worker_explorer
+    torch.set_num_threads(num_threads)
+    if isinstance(explorer, tuple):
+        # Snapshot paths: map the same files, sharing the page cache with the parent
+        model_name, draft_model_name = explorer
+        explorer = Explorer(model_name, draft_model_name=draft_model_name)
+    _worker_explorer = explorer
+
+
+def _session_explorer(session, prompt_tokens):
+    if session is None:
+        explorer = _worker_explorer
+    else:
+        explorer = _worker_sessions.get(session)
+        if explorer is None:
+            explorer = _worker_sessions[session] = _worker_explorer.fork()
+    explorer.prompt_tokens = list(prompt_tokens)
+    return explorer
+
+
+def _release_session(session):
+    _worker_sessions.pop(session, None)
+
+
+def _top_n_tokens(prompt_tokens, n, search, session=None):
+    distribution = _session_explorer(session, prompt_tokens).get_top_n_tokens(n=n, search=search)
+    return distribution.token_ids, distribution.logprobs
+
+
+def _nucleus_tokens(prompt_tokens, top_p, max_n, session=None):
+    distribution = _session_explorer(session, prompt_tokens).get_nucleus_tokens(top_p=top_p, max_n=max_n)
+    return distribution.token_ids, distribution.logprobs
+
+
+def _prompt_token_probabilities(prompt_tokens, session=None):
+    return _session_explorer(session, prompt_tokens).get_prompt_token_probabilities()
+
+
+def _token_logprobs_batch(token_lists, chunk_size):
+    return _worker_explorer.get_token_logprobs_batch(token_lists, chunk_size=chunk_size)
+
+
+class ExplorerPool:
+    """Pool of worker processes serving forward passes from one shared copy of the weights."""
+
+    def __init__(self, explorer, num_workers=None, threads_per_worker=None):
+        """
+        Args:
+            explorer: A loaded CPU Explorer whose model the workers share
+            num_workers: Number of worker processes (default: one per 4 cores)
+            threads_per_worker: Intra-op threads per worker (default: cores / workers)
+        """
+        if explorer.device.type != "cpu":
+            raise ValueError("ExplorerPool shares CPU weights; use a single process on GPU")
+        cpu_count = os.cpu_count() or 1
+        self.num_workers = num_workers or max(1, cpu_count // 4)
+        self.threads_per_worker = threads_per_worker or max(1, cpu_count // self.num_workers)
+        self.explorer = explorer
+
+        if is_snapshot(explorer.model_name):
+            worker_explorer = (explorer.model_name, explorer.draft_model_name)
+        else:
+            explorer.model.share_memory()
+            if explorer.draft_model is not None:
+                explorer.draft_model.share_memory()
+            worker_explorer = explorer.fork()
+            # Observers live in the parent; forward passes are reported by PooledExplorer
+            worker_explorer.observers = []
+        context = mp.get_context("spawn")
+        # One single-process pool per worker, so calls can be sent to a given worker
+        self._workers = [
+            context.Pool(1, initializer=_init_worker, initargs=(worker_explorer, self.threads_per_worker))
+            for _ in range(self.num_workers)
+        ]
+        self._sessions = itertools.count()
+        self._session_counts = [0] * self.num_workers
+        self._lock = threading.Lock()
+
+    def assign(self):
+        """
+        Pin a new session to the worker serving the fewest sessions.
+
+        Returns:
+            Tuple of (worker index, session id)
+        """
+        with self._lock:
+            worker = self._session_counts.index(min(self._session_counts))
+            self._session_counts[worker] += 1
+            return worker, next(self._sessions)
+
+    def release(self, worker, session):
+        """Drop a session's state on its worker."""
+        with self._lock:
+            self._session_counts[worker] -= 1
+        try:
+            self._workers[worker].apply_async(_release_session, (session,))
+        except ValueError:
+            # The pool was already closed
+            pass
+
+    def _map(self, func, args_list, worker=None):
+        """Run func(*args) for each args tuple, on one worker or spread over all of them."""
+        if worker is not None:
+            results = [self._workers[worker].apply_async(func, args) for args in args_list]
+        else:
+            results = [
+                self._workers[index % self.num_workers].apply_async(func, args)
+                for index, args in enumerate(args_list)
+            ]
+        return [result.get() for result in results]
+
+    def top_n_tokens(self, prompts_tokens, n=5, search="", worker=None, session=None):
+        """
+        Get next-token distributions for several prompts in parallel.
+
+        Args:
+            prompts_tokens: List of token id lists
+            n: Number of top tokens per prompt (default 5)
+            search: Optional string to filter tokens (default "")
+            worker: Worker to run on, from assign() (default None, spread over all workers)
+            session: Session id from assign() whose prompt cache to use (default None)
+
+        Returns:
+            List of TokenDistribution, one per prompt
+        """
+        results = self._map(_top_n_tokens, [(tokens, n, search, session) for tokens in prompts_tokens], worker)
+        return [
+            TokenDistribution(token_ids, logprobs, self.explorer.token_string)
+            for token_ids, logprobs in results
+        ]
+
+    def nucleus_tokens(self, prompts_tokens, top_p=0.9, max_n=None, worker=None, session=None):
+        """
+        Get the smallest next-token sets covering top_p for several prompts in parallel.
+
+        Args:
+            prompts_tokens: List of token id lists
+            top_p: Cumulative probability each set must cover (default 0.9)
+            max_n: Maximum number of tokens per prompt (default None, no cap)
+            worker: Worker to run on, from assign() (default None, spread over all workers)
+            session: Session id from assign() whose prompt cache to use (default None)
+
+        Returns:
+            List of TokenDistribution, one per prompt
+        """
+        results = self._map(_nucleus_tokens, [(tokens, top_p, max_n, session) for tokens in prompts_tokens], worker)
+        return [
+            TokenDistribution(token_ids, logprobs, self.explorer.token_string)
+            for token_ids, logprobs in results
+        ]
+
+    def prompt_token_probabilities(self, prompts_tokens, worker=None, session=None):
+        """
+        Get per-token probabilities for several prompts in parallel.
+
+        Args:
+            prompts_tokens: List of token id lists
+            worker: Worker to run on, from assign() (default None, spread over all workers)
+            session: Session id from assign() whose prompt cache to use (default None)
+
+        Returns:
+            List of probability lists, one per prompt
+        """
+        return self._map(_prompt_token_probabilities, [(tokens, session) for tokens in prompts_tokens], worker)
+
+    def token_logprobs_batch(self, token_lists, chunk_size=1024):
+        """
+        Score a batch of token sequences, split into one sub-batch per worker.
+
+        Args:
+            token_lists: List of token id lists
+            chunk_size: Number of positions each worker projects at once (default 1024)
+
+        Returns:
+            Per-sequence token log-probabilities, as Explorer.get_token_logprobs_batch
+        """
+        # Contiguous slices, so length-sorted input keeps each sub-batch's padding small
+        size = -(-len(token_lists) // self.num_workers)
+        chunks = [token_lists[start:start + size] for start in range(0, len(token_lists), size)]
+        results = self._map(_token_logprobs_batch, [(chunk, chunk_size) for chunk in chunks])
+        return [logprobs for chunk_logprobs in results for logprobs in chunk_logprobs]
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+        for worker in self._workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PooledExplorer(Explorer):
+    """Explorer whose forward passes run on the ExplorerPool worker it is pinned to."""
+
+    def __init__(self, pool):
+        """
+        Args:
+            pool: The ExplorerPool to dispatch forward passes to
+        """
+        self.__dict__.update(pool.explorer.fork().__dict__)
+        self.pool = pool
+        self.worker, self.session = pool.assign()
+        weakref.finalize(self, pool.release, self.worker, self.session)
+
+    def fork(self):
+        return PooledExplorer(self.pool)
+
+    def get_top_n_tokens(self, n=5, search=""):
+        if not self.prompt_tokens:
+            return TokenDistribution.empty()
+        key = (n, tuple(self.prompt_tokens))
+        if not search and key in self._distributions:
+            return self._distributions[key]
+        with self._observe("top_n") as record:
+            record["tokens"] = len(self.prompt_tokens)
+            distribution = self.pool.top_n_tokens(
+                [self.prompt_tokens], n=n, search=search, worker=self.worker, session=self.session
+            )[0]
+        if not search:
+            self._cache_distribution(key, distribution)
+        return distribution
+
+    def get_nucleus_tokens(self, top_p=0.9, max_n=None):
+        if not self.prompt_tokens:
+            return TokenDistribution.empty()
+        key = (("top_p", top_p, max_n), tuple(self.prompt_tokens))
+        if key in self._distributions:
+            return self._distributions[key]
+        with self._observe("top_p") as record:
+            record["tokens"] = len(self.prompt_tokens)
+            distribution = self.pool.nucleus_tokens(
+                [self.prompt_tokens], top_p=top_p, max_n=max_n, worker=self.worker, session=self.session
+            )[0]
+        self._cache_distribution(key, distribution)
+        return distribution
+
+    def _score_next_tokens(self, token_lists, n):
+        # One prompt per worker call instead of a padded batch in this process
+        with self._observe("top_n_batch") as record:
+            record["tokens"] = sum(len(tokens) for tokens in token_lists)
+            return self.pool.top_n_tokens([list(tokens) for tokens in token_lists], n=n)
+
+    def get_prompt_token_probabilities(self):
+        if not self.prompt_tokens:
+            return []
+        with self._observe("prompt_scores") as record:
+            record["tokens"] = len(self.prompt_tokens)
+            return self.pool.prompt_token_probabilities(
+                [self.prompt_tokens], worker=self.worker, session=self.session
+            )[0]
+
+    def get_token_logprobs_batch(self, token_lists, chunk_size=1024):
+        with self._observe("batch_logprobs") as record:
+            record["tokens"] = sum(len(tokens) for tokens in token_lists)
+            return self.pool.token_logprobs_batch([list(tokens) for tokens in token_lists], chunk_size=chunk_size)
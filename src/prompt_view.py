@@ -0,0 +1,223 @@
+"""
+Virtualized prompt view for the TUI.
+
+The prompt is kept as a list of per-token styled segments grouped into logical lines
+(split on newlines). Logical lines are wrapped to the widget width only when they
+scroll into view. Appending or popping a token keeps the finished visual rows of the
+last logical line and only divides its last row again, so redraw cost does not grow
+with prompt length.
+"""
+from bisect import bisect_left, bisect_right
+
+from rich.color import Color
+from rich.segment import Segment
+from rich.style import Style
+from textual.geometry import Size
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+from src.utils import probability_to_rgb
+
+# One background style per percentage point, so tokens never format colors themselves
+PROBABILITY_STYLES = [
+    Style(bgcolor=Color.from_rgb(*probability_to_rgb(percent / 100))) for percent in range(101)
+]
+PLAIN_STYLE = Style()
+CURSOR_STYLE = Style(underline=True, bold=True)
+
+
+def probability_style(probability):
+    if probability is None:
+        return PLAIN_STYLE
+    return PROBABILITY_STYLES[int(round(max(0.0, min(1.0, probability)) * 100))]
+
+
+class PromptView(ScrollView):
+    """Scrollable prompt display that only renders the visible lines."""
+
+    DEFAULT_CSS = """
+    PromptView {
+        height: 1fr;
+    }
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._token_pieces = []   # per token: list of text pieces separated by newlines
+        self._token_styles = []   # per token: background style
+        self._token_line = []     # per token: logical line the token starts on
+        self._lines = [[]]        # per logical line: list of Segments
+        self._line_cells = [0]    # per logical line: total cell width
+        self._wrapped = [None]    # per logical line: cached wrapped Strips for the current width
+        self._visual_starts = [0] # per logical line: index of its first visual line
+        self._wrap_width = 0
+        self._cursor = None       # index of the highlighted token, if any
+
+    def set_tokens(self, token_strings, probabilities=None):
+        """Replace the whole prompt."""
+        self._token_pieces = []
+        self._token_styles = []
+        self._token_line = []
+        self._lines = [[]]
+        self._line_cells = [0]
+        self._wrapped = [None]
+        for index, token in enumerate(token_strings):
+            probability = probabilities[index] if probabilities is not None else None
+            self._add_token(token, probability)
+        self._relayout(0)
+
+    def append_token(self, token_string, probability=None):
+        """Append one token, re-wrapping only the last visual row it touches."""
+        at_end = self.scroll_y >= self.max_scroll_y
+        first_line = len(self._lines) - 1
+        self._add_token(token_string, probability)
+        self._relayout(first_line)
+        # Follow the end of the prompt unless the user scrolled up to read
+        if at_end and self.is_mounted:
+            self.scroll_end(animate=False)
+
+    def pop_token(self):
+        """Remove the last token, rebuilding at most the last logical line."""
+        if not self._token_pieces:
+            return
+        pieces = self._token_pieces.pop()
+        self._token_styles.pop()
+        line = self._token_line.pop()
+        if len(pieces) == 1:
+            # The token's segment, if any, is the last one of the last line
+            if pieces[0]:
+                segment = self._lines[line].pop()
+                self._line_cells[line] -= segment.cell_length
+                self._trim_wrapped(line)
+            self._relayout(line)
+            return
+        del self._lines[line + 1:]
+        del self._line_cells[line + 1:]
+        del self._wrapped[line + 1:]
+
+        segments = self._line_segments(line)
+        self._lines[line] = segments
+        self._line_cells[line] = sum(segment.cell_length for segment in segments)
+        self._wrapped[line] = None
+        self._relayout(line)
+
+    def set_cursor(self, index):
+        """Highlight the token at index (None to clear), restyling only its lines."""
+        previous, self._cursor = self._cursor, index
+        for token in (previous, index):
+            if token is None or token >= len(self._token_pieces):
+                continue
+            first_line = self._token_line[token]
+            for line in range(first_line, first_line + len(self._token_pieces[token])):
+                self._lines[line] = self._line_segments(line)
+                self._wrapped[line] = None
+        self.refresh()
+
+    def _token_style(self, index):
+        style = self._token_styles[index]
+        return style + CURSOR_STYLE if index == self._cursor else style
+
+    def _line_segments(self, line):
+        """Build the segments of one logical line from the tokens that touch it."""
+        first = bisect_left(self._token_line, line)
+        segments = []
+        # A token starting on an earlier line may end on this one
+        if first > 0:
+            previous = first - 1
+            pieces = self._token_pieces[previous]
+            if self._token_line[previous] + len(pieces) - 1 >= line:
+                piece = pieces[line - self._token_line[previous]]
+                if piece:
+                    segments.append(Segment(piece, self._token_style(previous)))
+                if self._token_line[previous] + len(pieces) - 1 > line:
+                    return segments
+        for index in range(first, len(self._token_pieces)):
+            if self._token_line[index] != line:
+                break
+            pieces = self._token_pieces[index]
+            if pieces[0]:
+                segments.append(Segment(pieces[0], self._token_style(index)))
+            if len(pieces) > 1:
+                break
+        return segments
+
+    def _add_token(self, token_string, probability):
+        style = probability_style(probability)
+        pieces = token_string.split("\n")
+        self._token_pieces.append(pieces)
+        self._token_styles.append(style)
+        self._token_line.append(len(self._lines) - 1)
+        if len(self._token_pieces) - 1 == self._cursor:
+            style = self._token_style(self._cursor)
+        for index, piece in enumerate(pieces):
+            if index > 0:
+                self._lines.append([])
+                self._line_cells.append(0)
+                self._wrapped.append(None)
+            if piece:
+                segment = Segment(piece, style)
+                self._lines[-1].append(segment)
+                self._line_cells[-1] += segment.cell_length
+                self._extend_wrapped(len(self._lines) - 1, segment)
+
+    def _extend_wrapped(self, line, segment):
+        """Add a segment to the end of a line's cached wrap, dividing only its last row again."""
+        wrapped = self._wrapped[line]
+        if wrapped is None:
+            return
+        width = max(1, self._wrap_width)
+        tail = Strip([*wrapped.pop(), segment])
+        cuts = list(range(width, tail.cell_length, width)) + [tail.cell_length]
+        wrapped.extend(tail.divide(cuts))
+
+    def _trim_wrapped(self, line):
+        """Shorten a line's cached wrap to its current cell width after removing a segment."""
+        wrapped = self._wrapped[line]
+        if wrapped is None:
+            return
+        width = max(1, self._wrap_width)
+        cells = self._line_cells[line]
+        rows = max(1, -(-cells // width))
+        del wrapped[rows:]
+        wrapped[-1] = wrapped[-1].crop(0, cells - (rows - 1) * width) if cells else Strip.blank(0)
+
+    def _line_height(self, line):
+        width = max(1, self._wrap_width)
+        return max(1, -(-self._line_cells[line] // width))
+
+    def _relayout(self, first_line):
+        """Recompute visual line offsets from first_line onwards and refresh."""
+        del self._visual_starts[first_line + 1:]
+        if not self._visual_starts:
+            self._visual_starts.append(0)
+        for line in range(first_line + 1, len(self._lines)):
+            self._visual_starts.append(self._visual_starts[-1] + self._line_height(line - 1))
+        total = self._visual_starts[-1] + self._line_height(len(self._lines) - 1)
+        self.virtual_size = Size(self._wrap_width, total)
+        self.refresh()
+
+    def on_resize(self, event):
+        width = self.scrollable_content_region.width
+        if width != self._wrap_width:
+            self._wrap_width = width
+            self._wrapped = [None] * len(self._lines)
+            self._relayout(0)
+
+    def _wrapped_line(self, line):
+        if self._wrapped[line] is None:
+            width = max(1, self._wrap_width)
+            strip = Strip(self._lines[line], self._line_cells[line])
+            cuts = list(range(width, self._line_cells[line], width)) + [self._line_cells[line]]
+            self._wrapped[line] = strip.divide(cuts) if self._line_cells[line] else [Strip.blank(0)]
+        return self._wrapped[line]
+
+    def render_line(self, y):
+        scroll_x, scroll_y = self.scroll_offset
+        y += scroll_y
+        width = self.scrollable_content_region.width
+        total = self.virtual_size.height
+        if y >= total:
+            return Strip.blank(width, self.rich_style)
+        line = bisect_right(self._visual_starts, y) - 1
+        strip = self._wrapped_line(line)[y - self._visual_starts[line]]
+        return strip.extend_cell_length(width).crop(scroll_x, scroll_x + width)
@@ -0,0 +1,150 @@
+"""
+Registry of several resident models with least-recently-used eviction.
+
+Explorers are loaded on first use and kept resident until the models' combined
+weight memory exceeds a budget, at which point the least recently used ones are
+dropped. Models still in use are never evicted: the default and the active model,
+models with live forks handed out by `fork`, and the models of a running comparison,
+since dropping the registry's reference would not free weights a fork still shares.
+Next-token distributions for one prompt can be computed on several models
+concurrently for a side-by-side comparison.
+"""
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from src.explorer import Explorer
+
+
+class ModelRegistry:
+    """Loads Explorers by model name and keeps them resident within a memory budget."""
+
+    def __init__(self, model_names, memory_budget=None, load=Explorer):
+        """
+        Args:
+            model_names: Models that can be activated; the first is the default
+            memory_budget: Maximum bytes of resident weights (default None, unlimited)
+            load: Callable creating an Explorer from a model name (default Explorer)
+        """
+        self.model_names = list(dict.fromkeys(model_names))
+        self.memory_budget = memory_budget
+        self.active = self.model_names[0]
+        self._load = load
+        self._explorers = {}          # resident explorers, least recently used first
+        self._compare_explorers = {}  # forks used for comparisons, by model name
+        self._forks = {model_name: weakref.WeakSet() for model_name in self.model_names}
+        self._load_locks = {model_name: threading.Lock() for model_name in self.model_names}
+        self._lock = threading.RLock()
+        self._compare_lock = threading.Lock()
+
+    def get(self, model_name):
+        """
+        Get the Explorer for a model, loading it if it is not resident.
+
+        Args:
+            model_name: One of the registered model names
+
+        Returns:
+            The model's Explorer
+        """
+        return self._get(model_name, keep=(model_name,))
+
+    def fork(self, model_name):
+        """
+        Fork a model's Explorer for a session; the model stays resident while the fork is alive.
+
+        Args:
+            model_name: One of the registered model names
+
+        Returns:
+            A fork of the model's Explorer
+        """
+        explorer = self.get(model_name)
+        forked = explorer.fork()
+        with self._lock:
+            self._forks[model_name].add(forked)
+            # An eviction since get would leave the fork's weights untracked
+            self._explorers.setdefault(model_name, explorer)
+        return forked
+
+    def _get(self, model_name, keep):
+        if model_name not in self.model_names:
+            raise ValueError(f"Unknown model {model_name!r}, expected one of {self.model_names}")
+        # Loading happens outside the registry lock, so other models and memory_bytes
+        # stay available; the per-model lock keeps a model from being loaded twice
+        with self._load_locks[model_name]:
+            with self._lock:
+                explorer = self._explorers.pop(model_name, None)
+            if explorer is None:
+                explorer = self._load(model_name)
+            with self._lock:
+                self._explorers[model_name] = explorer
+                self._evict(keep)
+                return explorer
+
+    def activate(self, model_name):
+        """Make a model the active one (protected from eviction) and return its Explorer."""
+        with self._lock:
+            self.active = model_name
+        return self.get(model_name)
+
+    def next_model(self, model_name, step=1):
+        """Return the registered model step places after model_name, wrapping around."""
+        index = self.model_names.index(model_name)
+        return self.model_names[(index + step) % len(self.model_names)]
+
+    def resident(self):
+        """Names of the resident models, least recently used first."""
+        with self._lock:
+            return list(self._explorers)
+
+    def memory_bytes(self):
+        """Bytes held by the weights of every resident model."""
+        with self._lock:
+            return sum(explorer.memory_bytes() for explorer in self._explorers.values())
+
+    def _evict(self, keep):
+        if self.memory_budget is None:
+            return
+        protected = {self.model_names[0], self.active, *keep}
+        protected.update(model_name for model_name, forks in self._forks.items() if len(forks))
+        for model_name in list(self._explorers):
+            if self.memory_bytes() <= self.memory_budget:
+                break
+            if model_name not in protected:
+                del self._explorers[model_name]
+                self._compare_explorers.pop(model_name, None)
+
+    def top_n_tokens(self, prompt_text, n=5, model_names=None):
+        """
+        Get next-token distributions for a prompt from several models concurrently.
+
+        Each model scores the prompt on its own thread, using a fork kept for
+        comparisons so its KV and distribution caches carry over between calls.
+
+        Args:
+            prompt_text: The prompt, tokenized separately by each model
+            n: Number of top tokens per model (default 5)
+            model_names: Models to compare (default: every registered model)
+
+        Returns:
+            Dict of model name to TokenDistribution, in the order of model_names
+        """
+        model_names = list(model_names or self.model_names)
+
+        def score(explorer):
+            explorer.set_prompt(prompt_text)
+            return explorer.get_top_n_tokens(n=n)
+
+        # The comparison forks hold prompt state, so one comparison runs at a time
+        with self._compare_lock:
+            explorers = []
+            for model_name in model_names:
+                # Every model of the comparison is kept, so loading one never evicts another
+                explorer = self._get(model_name, keep=model_names)
+                with self._lock:
+                    if model_name not in self._compare_explorers:
+                        self._compare_explorers[model_name] = explorer.fork()
+                    explorers.append(self._compare_explorers[model_name])
+            with ThreadPoolExecutor(max_workers=len(explorers)) as pool:
+                return dict(zip(model_names, pool.map(score, explorers)))
@@ -0,0 +1,162 @@
+"""
+Corpus perplexity scoring.
+
+Scores every document under a set of paths with the configured model and streams one
+JSON line per document to an output file. Documents are sorted by token length and
+grouped into batches under a token budget, so padding stays small and each forward
+pass is well filled. Documents already present in the output file are skipped, which
+makes an interrupted run resumable.
+"""
+import glob
+import json
+import math
+import os
+import time
+
+SUPPORTED_SUFFIXES = (".txt", ".jsonl")
+
+
+def iter_documents(paths, exclude=()):
+    """
+    Yield (doc_id, text) for every document under the given paths.
+
+    Directories are searched recursively for .txt and .jsonl files, skipping the files
+    in exclude (e.g. the results file). Each .txt file is one document; each line of a
+    .jsonl file with a "text" field is one document.
+    """
+    excluded = {os.path.realpath(file) for file in exclude}
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(
+                file for file in glob.glob(os.path.join(path, "**", "*"), recursive=True)
+                if file.endswith(SUPPORTED_SUFFIXES) and os.path.realpath(file) not in excluded
+            )
+        else:
+            files = [path]
+        for file in files:
+            if file.endswith(".jsonl"):
+                with open(file) as f:
+                    for line_number, line in enumerate(f):
+                        if not line.strip():
+                            continue
+                        text = json.loads(line).get("text")
+                        if text is not None:
+                            yield f"{file}:{line_number}", text
+            else:
+                with open(file) as f:
+                    yield file, f.read()
+
+
+def length_batches(documents, max_batch_tokens):
+    """
+    Group (doc_id, token_ids) pairs into batches of similar length.
+
+    Documents are sorted by length and a batch is closed once its padded size
+    (batch size x longest document) would exceed max_batch_tokens.
+    """
+    batch = []
+    for document in sorted(documents, key=lambda document: len(document[1])):
+        if batch and (len(batch) + 1) * len(document[1]) > max_batch_tokens:
+            yield batch
+            batch = []
+        batch.append(document)
+    if batch:
+        yield batch
+
+
+def load_scored(output_path):
+    """Return {doc_id: record} for documents already written to output_path."""
+    scored = {}
+    if not os.path.exists(output_path):
+        return scored
+    with open(output_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run interrupted mid-write can leave a partial last line
+                continue
+            scored[record["id"]] = record
+    return scored
+
+
+def _drop_partial_line(output_path):
+    """Truncate output_path after its last newline, so appended records start on a fresh line."""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def score_corpus(explorer, paths, output_path, max_batch_tokens=8192, max_tokens=None, log=print):
+    """
+    Score every document under paths and append per-document results to output_path.
+
+    Args:
+        explorer: The Explorer whose model scores the documents
+        paths: Files or directories to score
+        output_path: JSON lines file to append results to (and resume from)
+        max_batch_tokens: Padded token budget per forward pass (default 8192)
+        max_tokens: Truncate documents to this many tokens (default None, no limit)
+        log: Callable used for progress messages (default print)
+
+    Returns:
+        Dict with aggregate statistics over all scored documents
+    """
+    scored = load_scored(output_path)
+    pending = []
+    # A results file inside a scanned directory would otherwise be read back as documents
+    for doc_id, text in iter_documents(paths, exclude=[output_path]):
+        if doc_id in scored:
+            continue
+        token_ids = explorer.tokenizer.encode(text)
+        if max_tokens is not None:
+            token_ids = token_ids[:max_tokens]
+        pending.append((doc_id, token_ids))
+    log(f"{len(scored)} documents already scored, {len(pending)} to go")
+
+    start = time.perf_counter()
+    scored_tokens = 0
+    # The partial last line of an interrupted run would otherwise swallow the next record
+    _drop_partial_line(output_path)
+    with open(output_path, "a") as out:
+        for batch in length_batches(pending, max_batch_tokens):
+            batch_logprobs = explorer.get_token_logprobs_batch([token_ids for _, token_ids in batch])
+            for (doc_id, token_ids), logprobs in zip(batch, batch_logprobs):
+                record = _document_record(doc_id, token_ids, logprobs)
+                out.write(json.dumps(record) + "\n")
+                scored[doc_id] = record
+                scored_tokens += len(token_ids)
+            out.flush()
+            elapsed = time.perf_counter() - start
+            log(f"scored {len(batch)} documents of up to {len(batch[-1][1])} tokens, "
+                f"{scored_tokens / elapsed:.0f} tokens/s")
+
+    elapsed = time.perf_counter() - start
+    total_logprob = sum(record["total_logprob"] for record in scored.values())
+    total_predicted = sum(len(record["logprobs"]) for record in scored.values())
+    summary = {
+        "documents": len(scored),
+        "predicted_tokens": total_predicted,
+        "perplexity": math.exp(-total_logprob / total_predicted) if total_predicted else None,
+        "tokens_per_second": scored_tokens / elapsed if elapsed > 0 else None,
+    }
+    log(f"{summary['documents']} documents, {total_predicted} predicted tokens, "
+        f"perplexity {summary['perplexity']}, {scored_tokens} tokens scored this run "
+        f"in {elapsed:.1f} s")
+    return summary
+
+
+def _document_record(doc_id, token_ids, logprobs):
+    total_logprob = sum(logprobs)
+    return {
+        "id": doc_id,
+        "num_tokens": len(token_ids),
+        "token_ids": token_ids,
+        "logprobs": logprobs,
+        "surprisal_bits": [-logprob / math.log(2) for logprob in logprobs],
+        "total_logprob": total_logprob,
+        "perplexity": math.exp(-total_logprob / len(logprobs)) if logprobs else None,
+    }
@@ -1,59 +1,160 @@
 import random
+import time
 
 
 class TokenSession:
     """Owns prompt state and token-selection logic independent of any UI."""
 
-    def __init__(self, explorer, prompt="", tokens_to_show=30, rng=None):
+    def __init__(self, explorer, prompt="", tokens_to_show=30, rng=None, top_p=None):
         self.explorer = explorer
         self.tokens_to_show = tokens_to_show
+        # With top_p set, displayed_tokens is the smallest set covering top_p, at most tokens_to_show long
+        self.top_p = top_p
         self.rng = rng or random.Random()
 
         self.prompts = [prompt]
         self.prompt_index = 0
         self.selected_row = 0
         self.displayed_tokens = []
+        # Callables observer(event, **fields) notified on refreshes and appended tokens
+        self.observers = []
 
         self.explorer.set_prompt(prompt)
+        # Token ids of each prompt; branches built token by token need not round-trip through their text
+        self.prompts_tokens = [list(self.explorer.get_prompt_tokens())]
         self._refresh_tokens()
 
+    @classmethod
+    def restore(cls, explorer, prompts, prompt_index=0, displayed_tokens=None, tokens_to_show=30, rng=None,
+                top_p=None, prompts_tokens=None):
+        """
+        Rebuild a session from saved prompts without running the model.
+
+        If displayed_tokens is None the active prompt's distribution is computed as usual.
+        If prompts_tokens is None each prompt's token ids are re-encoded from its text.
+        """
+        session = cls.__new__(cls)
+        session.explorer = explorer
+        session.tokens_to_show = tokens_to_show
+        session.top_p = top_p
+        session.rng = rng or random.Random()
+        session.prompts = list(prompts)
+        session.prompt_index = prompt_index
+        session.selected_row = 0
+        session.displayed_tokens = []
+        session.observers = []
+        if prompts_tokens is None:
+            prompts_tokens = [explorer.encode(text) for text in session.prompts]
+        session.prompts_tokens = [list(tokens) for tokens in prompts_tokens]
+
+        explorer.set_prompt_tokens(session.prompts_tokens[prompt_index])
+        if displayed_tokens is None:
+            session._refresh_tokens()
+        else:
+            session.displayed_tokens = displayed_tokens
+        return session
+
     def _refresh_tokens(self):
-        self.displayed_tokens = self.explorer.get_top_n_tokens(n=self.tokens_to_show)
+        start = time.perf_counter()
+        if self.top_p is None:
+            self.displayed_tokens = self.explorer.get_top_n_tokens(n=self.tokens_to_show)
+        else:
+            self.displayed_tokens = self.explorer.get_nucleus_tokens(top_p=self.top_p, max_n=self.tokens_to_show)
         self.selected_row = 0
+        self._notify("refresh", seconds=time.perf_counter() - start)
         return self.displayed_tokens
 
+    def _load_prompt(self):
+        self.explorer.set_prompt_tokens(self.prompts_tokens[self.prompt_index])
+        return self._refresh_tokens()
+
+    def _store_prompt(self):
+        self.prompts[self.prompt_index] = self.explorer.get_prompt()
+        self.prompts_tokens[self.prompt_index] = list(self.explorer.get_prompt_tokens())
+
+    def _notify(self, event, **fields):
+        for observer in self.observers:
+            observer(event, **fields)
+
+    def set_explorer(self, explorer):
+        """Switch to another Explorer (e.g. another model), keeping the prompts as text."""
+        self.explorer = explorer
+        # Token ids belong to the previous model's tokenizer
+        self.prompts_tokens = [explorer.encode(text) for text in self.prompts]
+        return self._load_prompt()
+
     def set_prompt_text(self, prompt_text):
         self.explorer.set_prompt(prompt_text)
-        self.prompts[self.prompt_index] = self.explorer.get_prompt()
+        self._store_prompt()
+        return self._refresh_tokens()
+
+    def edit_prompt_text(self, prompt_text):
+        """Like set_prompt_text, but only re-encodes the text around the edit."""
+        self.explorer.update_prompt(prompt_text)
+        self._store_prompt()
         return self._refresh_tokens()
 
     def add_prompt(self, max_prompts=None):
         if max_prompts is not None and len(self.prompts) >= max_prompts:
             return False
         self.prompts.append(self.explorer.get_prompt())
+        self.prompts_tokens.append(list(self.explorer.get_prompt_tokens()))
         self.prompt_index = (self.prompt_index + 1) % len(self.prompts)
-        self.explorer.set_prompt(self.prompts[self.prompt_index])
-        self._refresh_tokens()
+        self._load_prompt()
         return True
 
     def remove_prompt(self):
         if len(self.prompts) <= 1:
             return False
         self.prompts.pop(self.prompt_index)
+        self.prompts_tokens.pop(self.prompt_index)
         self.prompt_index = (self.prompt_index - 1) % len(self.prompts)
-        self.explorer.set_prompt(self.prompts[self.prompt_index])
-        self._refresh_tokens()
+        self._load_prompt()
         return True
 
     def increment_prompt(self):
         self.prompt_index = (self.prompt_index + 1) % len(self.prompts)
-        self.explorer.set_prompt(self.prompts[self.prompt_index])
-        self._refresh_tokens()
+        self._load_prompt()
 
     def decrement_prompt(self):
         self.prompt_index = (self.prompt_index - 1) % len(self.prompts)
-        self.explorer.set_prompt(self.prompts[self.prompt_index])
-        self._refresh_tokens()
+        self._load_prompt()
+
+    def select_prompt(self, index):
+        if not 0 <= index < len(self.prompts):
+            return False
+        self.prompt_index = index
+        self._load_prompt()
+        return True
+
+    def fan_out(self, n, max_new_tokens=100, max_prompts=None):
+        """Sample n continuations of the active prompt and add each as a new prompt."""
+        if max_prompts is not None:
+            n = min(n, max_prompts - len(self.prompts))
+        if n < 1:
+            return []
+        base_tokens = list(self.explorer.get_prompt_tokens())
+        continuations = self.explorer.generate_continuations(n=n, max_new_tokens=max_new_tokens)
+        branches_tokens = [base_tokens + list(continuation) for continuation in continuations]
+        branches = [self.explorer.decode(tokens) for tokens in branches_tokens]
+        self.prompts.extend(branches)
+        self.prompts_tokens.extend(branches_tokens)
+        return branches
+
+    def branch_at(self, position, token_id=None, max_prompts=None):
+        """Add a new prompt cut just before `position`, optionally continued with token_id."""
+        if max_prompts is not None and len(self.prompts) >= max_prompts:
+            return False
+        tokens = list(self.explorer.get_prompt_tokens()[:position])
+        if token_id is not None:
+            tokens.append(token_id)
+        if not tokens:
+            return False
+        self.prompts.append(self.explorer.decode(tokens))
+        self.prompts_tokens.append(tokens)
+        self.prompt_index = len(self.prompts) - 1
+        self._load_prompt()
+        return True
 
     def select_next_token(self):
         if self.selected_row < len(self.displayed_tokens) - 1:
@@ -67,12 +168,20 @@ class TokenSession:
             return True
         return False
 
+    def append_token(self, token_id):
+        self.explorer.append_token(token_id)
+        self._store_prompt()
+        self._notify("append", tokens=1)
+        self._refresh_tokens()
+        return True
+
     def append_selected_token(self):
         if not self.displayed_tokens:
             return False
         token = self.displayed_tokens[self.selected_row]
         self.explorer.append_token(token["token_id"])
-        self.prompts[self.prompt_index] = self.explorer.get_prompt()
+        self._store_prompt()
+        self._notify("append", tokens=1)
         self._refresh_tokens()
         return True
 
@@ -84,7 +193,20 @@ class TokenSession:
             return False
         chosen_token = self.rng.choices(self.displayed_tokens, weights=weights, k=1)[0]
         self.explorer.append_token(chosen_token["token_id"])
-        self.prompts[self.prompt_index] = self.explorer.get_prompt()
+        self._store_prompt()
+        self._notify("append", tokens=1)
+        self._refresh_tokens()
+        return True
+
+    def append_speculative_tokens(self, k=4):
+        """Append one round of speculatively decoded tokens, sampled like append_weighted_token."""
+        if not self.displayed_tokens:
+            return False
+        new_tokens = self.explorer.append_speculative_tokens(k=k, top_n=self.tokens_to_show, top_p=self.top_p)
+        if not new_tokens:
+            return False
+        self._store_prompt()
+        self._notify("append", tokens=len(new_tokens))
         self._refresh_tokens()
         return True
 
@@ -92,13 +214,17 @@ class TokenSession:
         if len(self.explorer.get_prompt_tokens()) <= min_tokens:
             return False
         self.explorer.pop_token()
-        self.prompts[self.prompt_index] = self.explorer.get_prompt()
+        self._store_prompt()
         self._refresh_tokens()
         return True
 
     def get_prompt(self):
         return self.explorer.get_prompt()
 
+    def get_all_top_n_tokens(self):
+        """Next-token distributions for every prompt, scoring the changed ones in one batch."""
+        return self.explorer.get_top_n_tokens_batch(self.prompts_tokens, n=self.tokens_to_show, top_p=self.top_p)
+
     def get_prompt_tokens(self):
         return self.explorer.get_prompt_tokens()
 
@@ -107,3 +233,16 @@ class TokenSession:
 
     def get_prompt_token_probabilities(self):
         return self.explorer.get_prompt_token_probabilities()
+
+    def get_logit_lens(self, position=None, n=5):
+        return self.explorer.get_logit_lens(position=position, n=n)
+
+    def get_prompt_alternatives(self, k=5):
+        return self.explorer.get_prompt_alternatives(k=k)
+
+    def diff_prompts(self, index, k=5):
+        """Compare the active prompt's per-token scores with prompt `index`'s (see Explorer.diff_prompt_scores)."""
+        return self.explorer.diff_prompt_scores(self.prompts_tokens[index], k=k)
+
+    def score_continuations(self, candidates):
+        return self.explorer.score_continuations(candidates)
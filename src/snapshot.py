@@ -0,0 +1,141 @@
+"""
+Local model snapshots that load without copying weights.
+
+A snapshot directory holds the model config, a serialized fast tokenizer and a single
+safetensors file with every parameter and buffer already in the target dtype. Loading
+memory-maps that file and points the model's tensors straight into the mapping, so
+weights are paged in lazily on first use and several processes loading the same
+snapshot share one copy in the page cache.
+"""
+import json
+import os
+import struct
+
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+
+MARKER_FILE = "explorer_snapshot.json"
+WEIGHTS_FILE = "model.safetensors"
+
+DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def is_snapshot(path):
+    """Return True if path is a directory written by prepare_snapshot."""
+    return os.path.isfile(os.path.join(path, MARKER_FILE))
+
+
+def default_snapshot_dir(model_name):
+    return os.path.join("snapshots", model_name.rstrip("/").split("/")[-1])
+
+
+def prepare_snapshot(model_name, output_dir, dtype="float32"):
+    """
+    Write an mmap-able snapshot of a Hugging Face model.
+
+    Args:
+        model_name: Name or path of the model to convert
+        output_dir: Directory to write the snapshot to
+        dtype: Target dtype name, e.g. "float32", "bfloat16" (default "float32")
+
+    Returns:
+        The output directory
+    """
+    from safetensors.torch import save_file
+
+    torch_dtype = getattr(torch, dtype)
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch_dtype)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    # Parameters and all buffers (including non-persistent ones such as rotary
+    # frequencies); tied weights are written once and re-tied on load
+    tensors = {}
+    seen = set()
+    for name, tensor in list(model.named_parameters()) + list(model.named_buffers()):
+        key = (tensor.data_ptr(), tuple(tensor.shape))
+        if key in seen:
+            continue
+        seen.add(key)
+        tensors[name] = tensor.detach().clone()
+
+    os.makedirs(output_dir, exist_ok=True)
+    save_file(tensors, os.path.join(output_dir, WEIGHTS_FILE))
+    model.config.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, MARKER_FILE), "w") as f:
+        json.dump({"source": model_name, "dtype": dtype}, f, indent=2)
+    return output_dir
+
+
+def load_snapshot(path):
+    """
+    Load a snapshot written by prepare_snapshot without copying the weights.
+
+    Args:
+        path: Snapshot directory
+
+    Returns:
+        Tuple of (model, tokenizer)
+    """
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    config = AutoConfig.from_pretrained(path)
+    with torch.device("meta"):
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=config.torch_dtype)
+
+    for name, tensor in mmap_safetensors(os.path.join(path, WEIGHTS_FILE)).items():
+        module_name, _, tensor_name = name.rpartition(".")
+        module = model.get_submodule(module_name)
+        if tensor_name in module._parameters:
+            module._parameters[tensor_name] = torch.nn.Parameter(tensor, requires_grad=False)
+        else:
+            module._buffers[tensor_name] = tensor
+    model.tie_weights()
+
+    missing = [name for name, tensor in model.state_dict().items() if tensor.is_meta]
+    if missing:
+        raise ValueError(f"Snapshot {path} is missing tensors: {', '.join(missing[:5])}")
+    return model.eval(), tokenizer
+
+
+def mmap_safetensors(path):
+    """
+    Map a safetensors file into memory and return tensors that view the mapping.
+
+    The mapping is private, so the file is never written to, but clean pages are
+    shared with every other process that maps the same file.
+
+    Args:
+        path: Path to a .safetensors file
+
+    Returns:
+        Dict of tensor name to tensor
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+    data_start = 8 + header_size
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+
+    tensors = {}
+    for name, info in header.items():
+        dtype = DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        byte_offset = data_start + begin
+        if byte_offset % dtype.itemsize:
+            raise ValueError(f"Tensor {name} in {path} is not aligned for zero-copy loading")
+        tensor = torch.empty(0, dtype=dtype)
+        tensor.set_(storage, byte_offset // dtype.itemsize, info["shape"])
+        tensors[name] = tensor
+    return tensors
@@ -1,15 +1,13 @@
-def probability_to_color(probability, alpha=1.0):
+def probability_to_rgb(probability):
     """
-    Maps a probability value (0.0-1.0) to a color on a blue-red scale.
-    Blue represents high probability (1.0)
-    Red represents low probability (0.0)
+    Maps a probability value (0.0-1.0) to the (red, green, blue) components used by
+    probability_to_color.
     
     Args:
         probability (float): Probability value between 0.0 and 1.0
-        alpha (float, optional): Alpha/opacity value between 0.0 and 1.0. Defaults to 1.0.
     
     Returns:
-        str: RGBA color string (format: 'rgba(r, g, b, a)')
+        tuple: (red, green, blue) integers between 0 and 255
     """
     # Ensure probability is in valid range
     probability = max(0, min(1, probability))
@@ -23,5 +21,23 @@ def probability_to_color(probability, alpha=1.0):
     # Green component (kept at 0 for a cleaner red-blue gradient)
     green = 0
     
+    return red, green, blue
+
+
+def probability_to_color(probability, alpha=1.0):
+    """
+    Maps a probability value (0.0-1.0) to a color on a blue-red scale.
+    Blue represents high probability (1.0)
+    Red represents low probability (0.0)
+    
+    Args:
+        probability (float): Probability value between 0.0 and 1.0
+        alpha (float, optional): Alpha/opacity value between 0.0 and 1.0. Defaults to 1.0.
+    
+    Returns:
+        str: RGBA color string (format: 'rgba(r, g, b, a)')
+    """
+    red, green, blue = probability_to_rgb(probability)
+    
     # Return rgba string
     return f"rgba({red}, {green}, {blue}, {alpha})"
@@ -0,0 +1,38 @@
+import math
+
+from src.distribution import TokenDistribution
+
+
+def test_dict_style_access_and_lazy_strings():
+    decoded = []
+
+    def token_string(token_id):
+        decoded.append(token_id)
+        return f"<{token_id}>"
+
+    dist = TokenDistribution([7, 3, 9], [math.log(0.6), math.log(0.3), math.log(0.1)], token_string)
+    assert decoded == []
+
+    assert len(dist) == 3
+    row = dist[1]
+    assert (row["token_id"], row["token"]) == (3, "<3>")
+    assert abs(row["probability"] - 0.3) < 1e-12
+    assert [token["token_id"] for token in dist] == [7, 3, 9]
+    assert dist.tokens == ["<7>", "<3>", "<9>"]
+
+    top = dist[:2]
+    assert isinstance(top, TokenDistribution)
+    assert top.token_ids.tolist() == [7, 3]
+    assert abs(top.probs.sum() - 0.9) < 1e-12
+
+
+def test_empty_distribution_is_falsy():
+    assert not TokenDistribution.empty()
+    assert TokenDistribution.empty().to_list() == []
+
+
+def test_nucleus_keeps_smallest_covering_prefix():
+    dist = TokenDistribution([7, 3, 9], [math.log(0.6), math.log(0.3), math.log(0.1)], str)
+    assert dist.nucleus(0.5).token_ids.tolist() == [7]
+    assert dist.nucleus(0.85).token_ids.tolist() == [7, 3]
+    assert dist.nucleus(1.5).token_ids.tolist() == [7, 3, 9]
@@ -0,0 +1,81 @@
+import os
+
+import torch
+
+from src.embedding_index import EmbeddingIndex, default_index_dir
+
+
+class EmbeddingModel:
+    def __init__(self, vocab_size=50, hidden_size=16, seed=0):
+        torch.manual_seed(seed)
+        self.embeddings = torch.nn.Embedding(vocab_size, hidden_size)
+
+    def get_input_embeddings(self):
+        return self.embeddings
+
+
+def brute_force_nearest(model, token_id, k):
+    weight = torch.nn.functional.normalize(model.embeddings.weight.detach(), dim=-1)
+    scores = weight @ weight[token_id]
+    scores[token_id] = -float("inf")
+    return torch.topk(scores, k).indices.tolist()
+
+
+def test_nearest_matches_brute_force_and_skips_query():
+    model = EmbeddingModel()
+    index = EmbeddingIndex.from_model(model)
+
+    ids, similarities = index.nearest([3, 7], k=4)
+
+    assert ids.shape == (2, 4)
+    assert ids[0].tolist() == brute_force_nearest(model, 3, 4)
+    assert ids[1].tolist() == brute_force_nearest(model, 7, 4)
+    assert 3 not in ids[0].tolist()
+    assert all(similarities[0][i] >= similarities[0][i + 1] for i in range(3))
+
+
+def test_int8_cache_round_trips(tmp_path):
+    model = EmbeddingModel()
+    path = tmp_path / "index"
+
+    built = EmbeddingIndex.load_or_build(model, path, dtype="int8")
+    loaded = EmbeddingIndex.load(path)
+
+    assert os.path.exists(path / "scales.npy")
+    assert torch.allclose(loaded.embeddings.float(), built.embeddings.float(), atol=2e-2)
+    assert loaded.nearest([5], k=3)[0].tolist() == built.nearest([5], k=3)[0].tolist()
+
+
+def test_load_or_build_rebuilds_for_another_shape(tmp_path):
+    path = tmp_path / "index"
+    EmbeddingIndex.load_or_build(EmbeddingModel(vocab_size=50), path)
+
+    index = EmbeddingIndex.load_or_build(EmbeddingModel(vocab_size=60), path)
+
+    assert index.embeddings.shape == (60, 16)
+    assert EmbeddingIndex.load(path).embeddings.shape == (60, 16)
+
+
+def test_load_or_build_rebuilds_for_other_weights_of_same_shape(tmp_path):
+    path = tmp_path / "index"
+    EmbeddingIndex.load_or_build(EmbeddingModel(seed=0), path)
+
+    model = EmbeddingModel(seed=1)
+    index = EmbeddingIndex.load_or_build(model, path)
+
+    assert index.nearest([3], k=4)[0][0].tolist() == brute_force_nearest(model, 3, 4)
+    assert EmbeddingIndex.load(path).fingerprint == index.fingerprint
+
+
+def test_nearest_skips_padding_rows():
+    model = EmbeddingModel()
+    index = EmbeddingIndex.from_model(model, vocab_size=40)
+
+    ids, _ = index.nearest([3, 45], k=39)
+
+    assert ids.max() < 40
+    assert 3 not in ids[0].tolist()
+
+
+def test_default_index_dir_keys_on_full_name():
+    assert default_index_dir("Qwen/Qwen2.5-0.5B") != default_index_dir("someorg/Qwen2.5-0.5B")
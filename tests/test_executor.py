@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+from src.executor import SerialExecutor, Superseded
+
+
+def test_calls_run_in_order_on_one_thread():
+    executor = SerialExecutor()
+    calls = []
+
+    def record(value):
+        calls.append((value, threading.current_thread().name))
+        return value
+
+    async def main():
+        return await asyncio.gather(*(executor.run(record, value) for value in range(5)))
+
+    assert asyncio.run(main()) == [0, 1, 2, 3, 4]
+    assert [value for value, _ in calls] == [0, 1, 2, 3, 4]
+    assert len({thread for _, thread in calls}) == 1
+    assert calls[0][1] != threading.current_thread().name
+    executor.shutdown()
+
+
+def test_pending_calls_with_same_key_are_superseded():
+    executor = SerialExecutor()
+    started = threading.Event()
+    release = threading.Event()
+    edits = []
+
+    def block():
+        started.set()
+        release.wait()
+
+    async def main():
+        blocker = asyncio.ensure_future(executor.run(block))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        first = asyncio.ensure_future(executor.run(edits.append, "a", key="edit"))
+        second = asyncio.ensure_future(executor.run(edits.append, "ab", key="edit"))
+        other = asyncio.ensure_future(executor.run(edits.append, "other", key="view"))
+        await asyncio.sleep(0)
+        release.set()
+        await blocker
+        results = await asyncio.gather(first, second, other, return_exceptions=True)
+        return results
+
+    results = asyncio.run(main())
+    assert isinstance(results[0], Superseded)
+    assert edits == ["ab", "other"]
+    executor.shutdown()
@@ -1,3 +1,6 @@
+import math
+import os
+
 from src.explorer import Explorer
 
 def test_get_prompt_token_probabilities():
@@ -17,3 +20,207 @@ def test_get_top_n_tokens():
     assert all("probability" in token for token in tokens)
     probabilities = [token["probability"] for token in tokens]
     assert probabilities == sorted(probabilities, reverse=True)
+
+def test_generate_continuations():
+    explorer = Explorer()
+    explorer.set_prompt("Hello, world")
+    prompt_tokens = list(explorer.prompt_tokens)
+    continuations = explorer.generate_continuations(n=3, max_new_tokens=5)
+    assert len(continuations) == 3
+    assert all(1 <= len(continuation) <= 5 for continuation in continuations)
+    assert explorer.prompt_tokens == prompt_tokens
+
+
+def test_append_speculative_tokens():
+    explorer = Explorer(draft_model_name="Qwen/Qwen2.5-0.5B")
+    explorer.set_prompt("Hello, world")
+    prompt_tokens = list(explorer.prompt_tokens)
+    new_tokens = explorer.append_speculative_tokens(k=4)
+    assert 1 <= len(new_tokens) <= 5
+    assert explorer.prompt_tokens == prompt_tokens + new_tokens
+    stats = explorer.get_speculative_stats()
+    assert stats["rounds"] == 1
+    assert 0.0 <= stats["acceptance_rate"] <= 1.0
+
+
+def test_update_prompt_matches_full_encode():
+    explorer = Explorer()
+    explorer.set_prompt("The quick brown fox jumps over the lazy dog.")
+    explorer.get_top_n_tokens(n=5)
+    edited = "The quick brown fox leaps over the lazy dog. It was fast."
+    explorer.update_prompt(edited)
+    assert explorer.get_prompt() == edited
+    assert explorer.prompt_tokens == explorer.tokenizer.encode(edited)
+    cached = explorer.get_top_n_tokens(n=5)
+    fresh = Explorer().set_prompt(edited).get_top_n_tokens(n=5)
+    assert cached.token_ids.tolist() == fresh.token_ids.tolist()
+
+
+def test_get_logit_lens():
+    explorer = Explorer()
+    explorer.set_prompt("Hello, world")
+    layers = explorer.get_logit_lens(n=3, layer_chunk_size=5)
+    assert len(layers) == explorer.model.config.num_hidden_layers + 1
+    assert all(len(layer) == 3 for layer in layers)
+    # The final layer is the model's actual next-token prediction
+    assert layers[-1].token_ids.tolist() == explorer.get_top_n_tokens(n=3).token_ids.tolist()
+
+def test_get_token_logprobs_batch_matches_single_prompt():
+    explorer = Explorer()
+    explorer.set_prompt("The quick brown fox jumps over the lazy dog")
+    long_tokens = list(explorer.prompt_tokens)
+    single = explorer.get_prompt_token_probabilities()[1:]
+    batch = explorer.get_token_logprobs_batch([long_tokens[:3], long_tokens])
+    assert len(batch[0]) == 2
+    assert len(batch[1]) == len(long_tokens) - 1
+    assert all(abs(math.exp(logprob) - prob) < 1e-4 for logprob, prob in zip(batch[1], single))
+
+
+def test_get_prompt_alternatives_reuses_prefix():
+    explorer = Explorer()
+    explorer.set_prompt("The quick brown fox jumps over the lazy dog")
+    full = explorer.get_prompt_alternatives(k=3)
+    assert len(full) == len(explorer.prompt_tokens)
+    assert len(full[0]) == 0
+    assert all(len(alternatives) == 3 for alternatives in full[1:])
+
+    # Branch at position 4 with its top alternative; the shared prefix is reused
+    position = 4
+    alternative = full[position].token_ids[0].item()
+    explorer.set_prompt_tokens(explorer.prompt_tokens[:position] + [alternative])
+    branched = explorer.get_prompt_alternatives(k=3)
+    assert [alts.token_ids.tolist() for alts in branched] == [alts.token_ids.tolist() for alts in full[:position + 1]]
+
+    fresh = Explorer().set_prompt_tokens(explorer.prompt_tokens).get_prompt_token_probabilities()
+    assert all(abs(a - b) < 1e-4 for a, b in zip(explorer.get_prompt_token_probabilities(), fresh))
+
+
+def test_get_top_n_tokens_batch_matches_single_prompt():
+    explorer = Explorer()
+    prompts = ["The quick brown fox", "The quick brown fox jumps over", "The lazy dog"]
+    prompts_tokens = [explorer.encode(prompt) for prompt in prompts]
+    batch = explorer.get_top_n_tokens_batch(prompts_tokens + [[]], n=5)
+    assert len(batch[-1]) == 0
+
+    fresh = Explorer()
+    for tokens, distribution in zip(prompts_tokens, batch):
+        single = fresh.set_prompt_tokens(tokens).get_top_n_tokens(n=5)
+        assert distribution.token_ids.tolist() == single.token_ids.tolist()
+        assert all(abs(a - b) < 1e-4 for a, b in zip(distribution.probs, single.probs))
+
+    # Switching to a batch-scored prompt reuses its distribution
+    explorer.set_prompt_tokens(prompts_tokens[1])
+    assert explorer.get_top_n_tokens(n=5) is batch[1]
+
+
+def test_get_nearest_tokens(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    explorer = Explorer()
+    token_id = explorer.encode(" fox")[0]
+    [neighbours] = explorer.get_nearest_tokens([token_id], n=5)
+    assert len(neighbours) == 5
+    assert token_id not in [neighbour["token_id"] for neighbour in neighbours]
+    similarities = [neighbour["similarity"] for neighbour in neighbours]
+    assert similarities == sorted(similarities, reverse=True)
+    # The index is cached on disk and shared with forks
+    assert os.path.exists(os.path.join("cache", "embeddings", "Qwen--Qwen2.5-0.5B", "embeddings.npy"))
+    assert explorer.fork().get_nearest_tokens([token_id], n=5) == [neighbours]
+
+
+def test_score_continuations_matches_full_sequences():
+    explorer = Explorer()
+    explorer.set_prompt("The quick brown fox")
+    prompt_tokens = list(explorer.prompt_tokens)
+    top = explorer.get_top_n_tokens(n=5)
+    candidates = [" jumps over", " sleeps", explorer.encode(" the lazy dog"), []]
+    scores = explorer.score_continuations(candidates)
+    assert explorer.prompt_tokens == prompt_tokens
+    assert scores[-1] == {"token_ids": [], "tokens": [], "token_logprobs": [], "logprob": 0}
+
+    reference = explorer.get_token_logprobs_batch([prompt_tokens + score["token_ids"] for score in scores[:-1]])
+    for score, logprobs in zip(scores, reference):
+        count = len(score["token_ids"])
+        assert len(score["token_logprobs"]) == count
+        assert all(abs(a - b) < 1e-4 for a, b in zip(score["token_logprobs"], logprobs[-count:]))
+        assert abs(score["logprob"] - sum(score["token_logprobs"])) < 1e-6
+
+    # The prompt's KV cache is still valid for the next-token distribution
+    explorer._distributions.clear()
+    assert explorer.get_top_n_tokens(n=5).token_ids.tolist() == top.token_ids.tolist()
+
+
+def test_diff_prompt_scores_runs_only_divergent_suffixes():
+    explorer = Explorer()
+    a = explorer.encode("The quick brown fox jumps over the lazy dog")
+    b = a[:5] + explorer.encode(" cat sleeps")
+    explorer.set_prompt_tokens(a)
+    explorer.get_prompt_token_probabilities()
+    forwarded = []
+    explorer.observers.append(lambda event, **fields: forwarded.append(fields["tokens"]))
+
+    diff = explorer.diff_prompt_scores(b)
+    assert diff["prefix_length"] == 5
+    # The cached prompt's prefix is reused for b, then a's suffix is restored
+    assert sum(forwarded) == (len(b) - 5) + (len(a) - 5)
+    assert explorer.prompt_tokens == a
+
+    rows = max(len(a), len(b)) - 5
+    assert len(diff["logprobs_a"]) == len(diff["logprobs_b"]) == rows
+    assert diff["token_ids_a"].tolist() == a[5:] + [-1] * (rows - len(a) + 5)
+    assert diff["token_ids_b"].tolist() == b[5:] + [-1] * (rows - len(b) + 5)
+    # Both branches predict their first divergent token from the same context
+    assert abs(diff["entropy_a"][0] - diff["entropy_b"][0]) < 1e-5
+
+    # Comparing the same branches again, e.g. on a redraw, runs no forward pass
+    forwarded.clear()
+    assert explorer.diff_prompt_scores(b) is diff
+    assert forwarded == []
+
+    fresh = Explorer()
+    for tokens, logprobs in ((a, diff["logprobs_a"]), (b, diff["logprobs_b"])):
+        probabilities = fresh.set_prompt_tokens(tokens).get_prompt_token_probabilities()[5:]
+        assert all(abs(math.exp(logprob) - prob) < 1e-4 for logprob, prob in zip(logprobs, probabilities))
+
+
+def test_get_nucleus_tokens_covers_top_p():
+    explorer = Explorer()
+    explorer.set_prompt("The quick brown fox")
+    top = explorer.get_top_n_tokens(n=50)
+    nucleus = explorer.get_nucleus_tokens(top_p=0.05)
+    # The smallest prefix of the sorted distribution that reaches top_p
+    assert nucleus.probs.sum() >= 0.05 > nucleus.probs[:-1].sum()
+    assert nucleus.token_ids.tolist() == top.token_ids[:len(nucleus)].tolist()
+    assert explorer.get_nucleus_tokens(top_p=0.05) is nucleus
+
+    capped = explorer.get_nucleus_tokens(top_p=0.99, max_n=10)
+    assert capped.token_ids.tolist() == top.token_ids[:10].tolist()
+
+
+def test_get_top_n_tokens_batch_fills_nucleus_cache():
+    explorer = Explorer()
+    prompts_tokens = [explorer.encode("The quick brown fox"), explorer.encode("The lazy dog")]
+    batch = explorer.get_top_n_tokens_batch(prompts_tokens, n=10, top_p=0.02)
+    forwarded = []
+    explorer.observers.append(lambda event, **fields: forwarded.append(fields["operation"]))
+
+    nucleus = explorer.set_prompt_tokens(prompts_tokens[1]).get_nucleus_tokens(top_p=0.02, max_n=10)
+    assert forwarded == []
+    assert nucleus.token_ids.tolist() == batch[1].token_ids[:len(nucleus)].tolist()
+    assert nucleus.token_ids.tolist() == Explorer().set_prompt_tokens(prompts_tokens[1]).get_nucleus_tokens(
+        top_p=0.02, max_n=10).token_ids.tolist()
+
+
+def test_append_speculative_tokens_with_top_p_stays_in_nucleus():
+    import torch
+    from src.explorer import _restrict_to_nucleus
+
+    probs = torch.tensor([[0.1, 0.5, 0.3, 0.1]])
+    assert _restrict_to_nucleus(probs, 0.7).tolist() == [[0.0, 0.625, 0.375, 0.0]]
+    assert _restrict_to_nucleus(probs, 0.9, max_n=1).tolist() == [[0.0, 1.0, 0.0, 0.0]]
+
+    explorer = Explorer(draft_model_name="Qwen/Qwen2.5-0.5B")
+    explorer.set_prompt("Hello, world")
+    nucleus = set(explorer.get_nucleus_tokens(top_p=0.01, max_n=5).token_ids.tolist())
+    new_tokens = explorer.fork().set_prompt("Hello, world").append_speculative_tokens(k=1, top_n=5, top_p=0.01)
+    # The first appended token is predicted from the prompt, like the table
+    assert new_tokens[0] in nucleus
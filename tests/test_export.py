@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from src.distribution import TokenDistribution
+from src.export import export_branches, load_session, read_export
+
+
+class ScoringExplorer:
+    """Deterministic stand-in that scores each prompt from its token ids."""
+
+    def __init__(self, model_name="fake-model"):
+        self.model_name = model_name
+        self.prompt_text = ""
+        self.prompt_tokens = []
+        self.forward_passes = 0
+        self.seeded_scores = None
+
+    def set_prompt(self, prompt_text):
+        self.prompt_text = prompt_text
+        self.prompt_tokens = [int(tok) for tok in prompt_text.split()]
+        return self
+
+    def encode(self, prompt_text):
+        return [int(tok) for tok in prompt_text.split()]
+
+    def set_prompt_tokens(self, token_ids):
+        self.prompt_tokens = list(token_ids)
+        self.prompt_text = " ".join(str(tok) for tok in self.prompt_tokens)
+        return self
+
+    def get_prompt(self):
+        return self.prompt_text
+
+    def get_prompt_tokens(self):
+        return self.prompt_tokens
+
+    def token_string(self, token_id):
+        return f"<{token_id}>"
+
+    def get_prompt_scores(self, k=5):
+        self.forward_passes += 1
+        targets = np.asarray(self.prompt_tokens[1:], dtype=np.int64)
+        return {
+            "tokens": list(self.prompt_tokens),
+            "chosen_logprobs": -targets / 10,
+            "entropy": targets / 100,
+            "top_ids": targets[:, None] + np.arange(k),
+            "top_logprobs": np.tile(-np.arange(k, dtype=np.float64), (len(targets), 1)),
+        }
+
+    def get_top_n_tokens(self, n=5, search=""):
+        self.forward_passes += 1
+        last = self.prompt_tokens[-1] if self.prompt_tokens else 0
+        return TokenDistribution(np.arange(n) + last, np.log(np.full(n, 1 / n)), self.token_string)
+
+    def set_prompt_scores(self, scores):
+        self.seeded_scores = scores
+        return list(scores["tokens"]) == self.prompt_tokens
+
+
+@pytest.mark.parametrize("suffix", [".arrow", ".parquet"])
+def test_export_round_trips_scores(tmp_path, suffix):
+    explorer = ScoringExplorer().set_prompt("7 8")
+    path = tmp_path / f"session{suffix}"
+
+    export_branches(explorer, [[1, 2, 3], [4]], path, prompt_index=1, k=3, next_tokens=4)
+    branches, metadata = read_export(path)
+
+    assert explorer.get_prompt() == "7 8"
+    assert metadata == {"model_name": "fake-model", "prompt_index": 1, "k": 3, "next_tokens": 4, "top_p": None}
+    assert [branch["text"] for branch in branches] == ["1 2 3", "4"]
+    assert branches[0]["token_ids"].tolist() == [1, 2, 3]
+    assert branches[0]["logprobs"].tolist() == [-0.2, -0.3]
+    assert branches[0]["top_ids"].tolist() == [[2, 3, 4], [3, 4, 5]]
+    assert branches[1]["top_ids"].shape == (0, 3)
+    assert branches[1]["next_ids"].tolist() == [4, 5, 6, 7]
+
+
+def test_load_session_reuses_exported_scores(tmp_path):
+    path = tmp_path / "session.arrow"
+    export_branches(ScoringExplorer(), [[1, 2, 3], [4, 5]], path, prompt_index=1, k=2, next_tokens=3)
+
+    explorer = ScoringExplorer()
+    session = load_session(path, explorer)
+
+    assert explorer.forward_passes == 0
+    assert session.prompts == ["1 2 3", "4 5"]
+    assert session.prompt_index == 1
+    assert session.get_prompt() == "4 5"
+    assert [token["token_id"] for token in session.displayed_tokens] == [5, 6, 7]
+    assert explorer.seeded_scores["entropy"].tolist() == [0.05]
+
+
+def test_load_session_restores_top_p_from_exported_tokens(tmp_path):
+    path = tmp_path / "session.arrow"
+    # Four equally likely next tokens, so covering 0.5 takes the first two
+    export_branches(ScoringExplorer(), [[1, 2]], path, k=2, next_tokens=4, top_p=0.5)
+
+    explorer = ScoringExplorer()
+    session = load_session(path, explorer)
+
+    assert explorer.forward_passes == 0
+    assert session.top_p == 0.5
+    assert [token["token_id"] for token in session.displayed_tokens] == [2, 3]
+
+
+def test_export_scores_branch_tokens_that_do_not_round_trip(tmp_path):
+    path = tmp_path / "session.arrow"
+    exporter = ScoringExplorer()
+    # Re-encoding a branch's text would give other tokens than the ones it was built from
+    exporter.set_prompt = lambda prompt_text: exporter.set_prompt_tokens([9])
+    exporter.encode = lambda prompt_text: [9]
+    export_branches(exporter, [[1, 2], [3, 4]], path, prompt_index=1, k=2, next_tokens=3)
+
+    branches, _ = read_export(path)
+    assert [branch["token_ids"].tolist() for branch in branches] == [[1, 2], [3, 4]]
+    assert branches[1]["logprobs"].tolist() == [-0.4]
+
+    explorer = ScoringExplorer()
+    explorer.encode = lambda prompt_text: [9]
+    session = load_session(path, explorer)
+
+    assert explorer.prompt_tokens == [3, 4]
+    assert explorer.seeded_scores["tokens"] == [3, 4]
+    assert session.prompts_tokens == [[1, 2], [3, 4]]
+    assert [token["token_id"] for token in session.displayed_tokens] == [4, 5, 6]
+
+
+def test_load_session_with_other_model_recomputes(tmp_path):
+    path = tmp_path / "session.arrow"
+    export_branches(ScoringExplorer(), [[1, 2]], path, k=2, next_tokens=3)
+
+    explorer = ScoringExplorer(model_name="other-model")
+    session = load_session(path, explorer)
+
+    assert explorer.forward_passes == 1
+    assert explorer.seeded_scores is None
+    assert len(session.displayed_tokens) == 3
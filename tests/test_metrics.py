@@ -0,0 +1,29 @@
+from src.metrics import ServerMetrics
+
+
+def test_render_reports_observed_events():
+    metrics = ServerMetrics(model_memory=lambda: 2048, queue_depth=lambda: 3)
+    metrics.active_sessions.inc()
+    metrics.observe("forward", operation="top_n", seconds=0.02, tokens=4, cached_tokens=12)
+    metrics.observe("forward", operation="top_n", seconds=0.5, tokens=1, cached_tokens=0)
+    metrics.observe("append", tokens=2)
+
+    lines = metrics.render().splitlines()
+
+    assert "# TYPE explorer_forward_seconds histogram" in lines
+    assert 'explorer_forward_seconds_bucket{operation="top_n",le="0.025"} 1' in lines
+    assert 'explorer_forward_seconds_bucket{operation="top_n",le="+Inf"} 2' in lines
+    assert 'explorer_forward_seconds_count{operation="top_n"} 2' in lines
+    assert 'explorer_forward_tokens_total{operation="top_n"} 5' in lines
+    assert 'explorer_cached_tokens_total{operation="top_n"} 12' in lines
+    assert "explorer_appended_tokens_total 2" in lines
+    assert "explorer_active_sessions 1" in lines
+    assert "explorer_model_memory_bytes 2048" in lines
+    assert "explorer_inference_queue_depth 3" in lines
+
+
+def test_label_values_are_escaped():
+    metrics = ServerMetrics()
+    metrics.observe("forward", operation='a"b\\c', seconds=0.1)
+
+    assert 'explorer_forward_tokens_total{operation="a\\"b\\\\c"} 0' in metrics.render().splitlines()
@@ -0,0 +1,30 @@
+import gc
+
+from src.explorer import Explorer
+from src.pool import ExplorerPool, PooledExplorer
+
+
+def test_pooled_sessions_are_pinned_and_match_in_process_scores():
+    explorer = Explorer()
+    with ExplorerPool(explorer, num_workers=2, threads_per_worker=1) as pool:
+        first, second = PooledExplorer(pool), PooledExplorer(pool)
+        assert {first.worker, second.worker} == {0, 1}
+
+        reference = explorer.fork().set_prompt("The quick brown fox")
+        first.set_prompt("The quick brown fox")
+        for token_id in (12, 34):
+            reference.append_token(token_id)
+            first.append_token(token_id)
+            assert first.get_top_n_tokens(n=5).token_ids.tolist() == reference.get_top_n_tokens(n=5).token_ids.tolist()
+
+        token_lists = [explorer.encode(text) for text in ["a b", "Hello there, world", "x", "one two three four"]]
+        pooled = first.get_token_logprobs_batch(token_lists)
+        in_process = explorer.get_token_logprobs_batch(token_lists)
+        assert [len(logprobs) for logprobs in pooled] == [len(logprobs) for logprobs in in_process]
+        assert all(abs(a - b) < 1e-4 for row, other in zip(pooled, in_process) for a, b in zip(row, other))
+
+        # A collected session frees its worker slot for the next one
+        worker = second.worker
+        del second
+        gc.collect()
+        assert PooledExplorer(pool).worker == worker
@@ -0,0 +1,53 @@
+from src.prompt_view import PromptView
+
+
+def _lines_text(view):
+    return ["".join(segment.text for segment in line) for line in view._lines]
+
+
+def test_incremental_updates_match_full_rebuild():
+    tokens = ["Once", " upon", " a\n", "time", "\n\n", "there", " was"]
+    probabilities = [0.5, 0.9, 0.2, 0.4, 0.1, 0.7, 0.3]
+
+    incremental = PromptView()
+    incremental.set_tokens(tokens[:2], probabilities[:2])
+    for token, probability in zip(tokens[2:], probabilities[2:]):
+        incremental.append_token(token, probability)
+
+    full = PromptView()
+    full.set_tokens(tokens, probabilities)
+    assert _lines_text(incremental) == _lines_text(full) == ["Once upon a", "time", "", "there was"]
+
+    for count in range(len(tokens) - 1, 0, -1):
+        incremental.pop_token()
+        full.set_tokens(tokens[:count], probabilities[:count])
+        assert _lines_text(incremental) == _lines_text(full)
+        assert incremental._line_cells == full._line_cells
+
+
+def _rows_text(view, line):
+    return ["".join(segment.text for segment in strip) for strip in view._wrapped_line(line)]
+
+
+def test_cached_wrap_is_extended_and_trimmed_in_place():
+    tokens = ["Once", " upon", " a", " time", "", " there", " was", "\n", "an", " end"]
+
+    incremental = PromptView()
+    incremental._wrap_width = 7
+    incremental.set_tokens([])
+    full = PromptView()
+    full._wrap_width = 7
+    for count, token in enumerate(tokens, start=1):
+        incremental._wrapped_line(len(incremental._lines) - 1)
+        incremental.append_token(token)
+        full.set_tokens(tokens[:count])
+        for line in range(len(full._lines)):
+            assert _rows_text(incremental, line) == _rows_text(full, line)
+
+    for count in range(len(tokens) - 1, 0, -1):
+        incremental._wrapped_line(len(incremental._lines) - 1)
+        incremental.pop_token()
+        full.set_tokens(tokens[:count])
+        assert incremental._line_cells == full._line_cells
+        for line in range(len(full._lines)):
+            assert _rows_text(incremental, line) == _rows_text(full, line)
@@ -0,0 +1,116 @@
+import threading
+
+from src.registry import ModelRegistry
+
+
+class SizedExplorer:
+    def __init__(self, model_name, size=100, barrier=None):
+        self.model_name = model_name
+        self.size = size
+        self.barrier = barrier
+        self.prompt_text = ""
+
+    def memory_bytes(self):
+        return self.size
+
+    def fork(self):
+        return SizedExplorer(self.model_name, self.size, self.barrier)
+
+    def set_prompt(self, prompt_text):
+        self.prompt_text = prompt_text
+        return self
+
+    def get_top_n_tokens(self, n=5, search=""):
+        if self.barrier is not None:
+            self.barrier.wait()
+        return [{"model": self.model_name, "prompt": self.prompt_text, "thread": threading.current_thread().name}]
+
+
+def make_registry(memory_budget=None, barrier=None):
+    loads = []
+
+    def load(model_name):
+        loads.append(model_name)
+        return SizedExplorer(model_name, barrier=barrier)
+
+    return ModelRegistry(["a", "b", "c", "d"], memory_budget=memory_budget, load=load), loads
+
+
+def test_get_loads_once_and_evicts_least_recently_used():
+    registry, loads = make_registry(memory_budget=250)
+    registry.get("b")
+    registry.get("c")
+    assert registry.get("b") is registry.get("b")
+    registry.get("d")
+
+    # "a" is the default and "b" was used more recently than "c"
+    assert loads == ["b", "c", "d"]
+    assert registry.resident() == ["b", "d"]
+    assert registry.memory_bytes() == 200
+
+
+def test_active_model_is_not_evicted():
+    registry, _ = make_registry(memory_budget=200)
+    registry.get("a")
+    registry.activate("b")
+    registry.get("c")
+    registry.get("d")
+
+    # The model just loaded stays too, even above the budget
+    assert sorted(registry.resident()) == ["a", "b", "d"]
+    assert registry.active == "b"
+    assert registry.next_model("d") == "a"
+
+
+def test_top_n_tokens_scores_every_model_concurrently():
+    # Each model blocks until the other is scoring too
+    registry, _ = make_registry(barrier=threading.Barrier(2, timeout=5))
+
+    distributions = registry.top_n_tokens("Hello", model_names=["a", "c"])
+
+    assert list(distributions) == ["a", "c"]
+    assert all(tokens[0]["prompt"] == "Hello" for tokens in distributions.values())
+    assert distributions["a"][0]["model"] == "a"
+    assert len({tokens[0]["thread"] for tokens in distributions.values()}) == 2
+
+
+def test_models_in_use_are_not_evicted():
+    registry, loads = make_registry(memory_budget=250)
+    forked = registry.fork("b")
+    registry.get("c")
+    registry.get("d")
+
+    # "b" has a live fork sharing its weights, so "c" goes instead
+    assert registry.resident() == ["b", "d"]
+    del forked
+    registry.get("c")
+    assert registry.resident() == ["d", "c"]
+
+    # A comparison keeps all of its models; repeating it loads nothing
+    loads.clear()
+    for _ in range(3):
+        registry.top_n_tokens("Hello", model_names=["b", "c", "d"])
+    assert loads == ["b"]
+
+
+def test_loading_does_not_hold_the_registry_lock():
+    loading = threading.Event()
+    release = threading.Event()
+
+    def load(model_name):
+        if model_name == "b":
+            loading.set()
+            release.wait(timeout=5)
+        return SizedExplorer(model_name)
+
+    registry = ModelRegistry(["a", "b"], load=load)
+    registry.get("a")
+    thread = threading.Thread(target=registry.get, args=("b",))
+    thread.start()
+    assert loading.wait(timeout=5)
+    # Other models and the memory gauge stay available during the load
+    assert registry.memory_bytes() == 100
+    assert registry.get("a").model_name == "a"
+    release.set()
+    thread.join()
+    assert registry.resident() == ["a", "b"]
@@ -0,0 +1,86 @@
+import json
+import math
+
+from src.scoring import iter_documents, length_batches, score_corpus
+
+
+class FakeTokenizer:
+    def encode(self, text):
+        return [len(word) for word in text.split()]
+
+
+class FakeExplorer:
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.batches = []
+
+    def get_token_logprobs_batch(self, token_lists):
+        self.batches.append([len(tokens) for tokens in token_lists])
+        return [[math.log(0.5)] * (len(tokens) - 1) for tokens in token_lists]
+
+
+def test_length_batches_sorts_and_respects_budget():
+    documents = [("a", [1] * 5), ("b", [1] * 1), ("c", [1] * 3), ("d", [1] * 4)]
+    batches = [[doc_id for doc_id, _ in batch] for batch in length_batches(documents, max_batch_tokens=8)]
+    assert batches == [["b", "c"], ["d"], ["a"]]
+
+
+def test_score_corpus_streams_and_resumes(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "one.txt").write_text("a bb ccc")
+    (corpus / "two.txt").write_text("a bb")
+    output = tmp_path / "scores.jsonl"
+
+    explorer = FakeExplorer()
+    summary = score_corpus(explorer, [str(corpus)], str(output), log=lambda message: None)
+    assert summary["documents"] == 2
+    assert summary["predicted_tokens"] == 3
+    assert math.isclose(summary["perplexity"], 2.0)
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [record["num_tokens"] for record in records] == [2, 3]
+    assert records[0]["surprisal_bits"] == [1.0]
+
+    (corpus / "three.txt").write_text("a bb ccc dddd")
+    explorer = FakeExplorer()
+    summary = score_corpus(explorer, [str(corpus)], str(output), log=lambda message: None)
+    assert explorer.batches == [[4]]
+    assert summary["documents"] == 3
+    assert len(output.read_text().splitlines()) == 3
+
+
+def test_score_corpus_drops_partial_line_before_resuming(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "one.txt").write_text("a bb ccc")
+    (corpus / "two.txt").write_text("a bb")
+    output = tmp_path / "scores.jsonl"
+    score_corpus(FakeExplorer(), [str(corpus / "one.txt")], str(output), log=lambda message: None)
+    # An interrupted run left half a record behind
+    with open(output, "a") as f:
+        f.write('{"id": "trunc')
+
+    summary = score_corpus(FakeExplorer(), [str(corpus)], str(output), log=lambda message: None)
+    assert summary["documents"] == 2
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [record["num_tokens"] for record in records] == [3, 2]
+
+
+def test_score_corpus_skips_records_without_text_and_its_own_output(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "docs.jsonl").write_text('{"text": "a bb"}\n{"title": "no text"}\n\n{"text": "a bb ccc"}\n')
+    output = corpus / "scores.jsonl"
+
+    score_corpus(FakeExplorer(), [str(corpus)], str(output), log=lambda message: None)
+    summary = score_corpus(FakeExplorer(), [str(corpus)], str(output), log=lambda message: None)
+
+    assert summary["documents"] == 2
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [record["id"] for record in records] == [f"{corpus / 'docs.jsonl'}:0", f"{corpus / 'docs.jsonl'}:3"]
+
+    (corpus / "notes.txt").write_text("a")
+    documents = dict(iter_documents([str(corpus)], exclude=[str(corpus / "notes.txt")]))
+    assert str(corpus / "notes.txt") not in documents
+    assert len(documents) == 2
@@ -7,6 +7,7 @@ class FakeExplorer:
     def __init__(self):
         self.prompt_text = ""
         self.prompt_tokens = []
+        self.updated_prompts = []
         self.top_tokens = [
             {"token_id": 10, "token": "A", "probability": 0.7},
             {"token_id": 20, "token": "B", "probability": 0.2},
@@ -21,6 +22,15 @@ class FakeExplorer:
             self.prompt_tokens = []
         return self
 
+    def update_prompt(self, prompt_text):
+        self.updated_prompts.append(prompt_text)
+        return self.set_prompt(prompt_text)
+
+    def set_prompt_tokens(self, token_ids):
+        self.prompt_tokens = list(token_ids)
+        self._sync_text()
+        return self
+
     def get_prompt(self):
         return self.prompt_text
 
@@ -48,6 +58,35 @@ class FakeExplorer:
     def get_top_n_tokens(self, n=5, search=""):
         return self.top_tokens[:n]
 
+    def get_nucleus_tokens(self, top_p=0.9, max_n=None):
+        tokens, total = [], 0.0
+        for token in self.top_tokens[:max_n]:
+            if total >= top_p:
+                break
+            tokens.append(token)
+            total += token["probability"]
+        return tokens
+
+    def generate_continuations(self, n=4, max_new_tokens=100, temperature=1.0):
+        return [[10 * (i + 1)] * max_new_tokens for i in range(n)]
+
+    def append_speculative_tokens(self, k=4, top_n=None, top_p=None):
+        tokens = self.get_nucleus_tokens(top_p, max_n=top_n) if top_p is not None else self.top_tokens[:top_n]
+        new_tokens = [tok["token_id"] for tok in tokens][:k]
+        self.prompt_tokens.extend(new_tokens)
+        self._sync_text()
+        return new_tokens
+
+    def get_top_n_tokens_batch(self, prompts_tokens, n=5, top_p=None):
+        self.batched_prompts = [list(tokens) for tokens in prompts_tokens]
+        return [self.top_tokens[:n] for _ in prompts_tokens]
+
+    def encode(self, prompt_text):
+        return [int(tok) for tok in prompt_text.split()]
+
+    def decode(self, token_ids):
+        return " ".join(str(tok) for tok in token_ids)
+
     def _sync_text(self):
         self.prompt_text = " ".join(str(tok) for tok in self.prompt_tokens)
 
@@ -104,3 +143,140 @@ def test_pop_token_min_tokens():
     assert session.pop_token(min_tokens=1) is True
     assert session.get_prompt() == "1"
     assert session.pop_token(min_tokens=1) is False
+
+
+def test_fan_out_adds_branches_and_keeps_active_prompt():
+    explorer = FakeExplorer()
+    session = TokenSession(explorer, prompt="1 2", tokens_to_show=3)
+
+    branches = session.fan_out(3, max_new_tokens=2, max_prompts=3)
+    assert branches == ["1 2 10 10", "1 2 20 20"]
+    assert session.prompts == ["1 2", "1 2 10 10", "1 2 20 20"]
+    assert session.prompt_index == 0
+    assert session.get_prompt() == "1 2"
+
+    assert session.select_prompt(2) is True
+    assert session.get_prompt_tokens() == [1, 2, 20, 20]
+    assert session.select_prompt(3) is False
+
+
+def test_append_speculative_tokens_updates_prompt():
+    explorer = FakeExplorer()
+    session = TokenSession(explorer, prompt="1", tokens_to_show=2)
+
+    assert session.append_speculative_tokens(k=4) is True
+    assert session.get_prompt_tokens() == [1, 10, 20]
+    assert session.prompts == ["1 10 20"]
+    assert session.selected_row == 0
+
+
+def test_append_speculative_tokens_samples_from_the_nucleus():
+    explorer = FakeExplorer()
+    session = TokenSession(explorer, prompt="1", tokens_to_show=3, top_p=0.5)
+
+    assert session.append_speculative_tokens(k=4) is True
+    assert session.get_prompt_tokens() == [1, 10]
+
+
+def test_append_token_updates_prompt_and_tokens():
+    explorer = FakeExplorer()
+    session = TokenSession(explorer, prompt="1", tokens_to_show=3)
+
+    assert session.select_next_token() is True
+    assert session.append_token(42) is True
+    assert session.get_prompt() == "1 42"
+    assert session.prompts == ["1 42"]
+    assert session.selected_row == 0
+
+
+def test_edit_prompt_text_uses_incremental_update():
+    explorer = FakeExplorer()
+    session = TokenSession(explorer, prompt="1 2", tokens_to_show=3)
+
+    session.edit_prompt_text("1 2 3")
+    assert explorer.updated_prompts == ["1 2 3"]
+    assert session.prompts == ["1 2 3"]
+    assert session.get_prompt_tokens() == [1, 2, 3]
+
+
+def test_branch_at_cuts_prompt_and_switches_to_branch():
+    explorer = FakeExplorer()
+    session = TokenSession(explorer, prompt="1 2 3 4", tokens_to_show=3)
+
+    assert session.branch_at(2, token_id=20) is True
+    assert session.prompts == ["1 2 3 4", "1 2 20"]
+    assert session.prompt_index == 1
+    assert session.get_prompt_tokens() == [1, 2, 20]
+
+    assert session.branch_at(1, max_prompts=2) is False
+    assert session.prompts == ["1 2 3 4", "1 2 20"]
+
+
+def test_switching_prompts_keeps_token_ids_that_do_not_round_trip():
+    explorer = FakeExplorer()
+    # 99 decodes to text that re-encodes as two other tokens
+    explorer.decode = lambda token_ids: " ".join("9 9" if tok == 99 else str(tok) for tok in token_ids)
+    session = TokenSession(explorer, prompt="1 2 3", tokens_to_show=3)
+
+    assert session.branch_at(2, token_id=99) is True
+    session.fan_out(1, max_new_tokens=1)
+    assert session.select_prompt(0) is True
+    assert session.get_prompt_tokens() == [1, 2, 3]
+
+    assert session.select_prompt(1) is True
+    assert session.get_prompt_tokens() == [1, 2, 99]
+    session.increment_prompt()
+    assert session.get_prompt_tokens() == [1, 2, 99, 10]
+    assert session.get_all_top_n_tokens()
+    assert explorer.batched_prompts == [[1, 2, 3], [1, 2, 99], [1, 2, 99, 10]]
+
+
+def test_observers_receive_refreshes_and_appended_tokens():
+    explorer = FakeExplorer()
+    session = TokenSession(explorer, prompt="1", tokens_to_show=2)
+    events = []
+    session.observers.append(lambda event, **fields: events.append((event, fields)))
+
+    session.append_token(10)
+    session.append_speculative_tokens(k=2)
+
+    assert [event for event, _ in events] == ["append", "refresh", "append", "refresh"]
+    assert [fields["tokens"] for event, fields in events if event == "append"] == [1, 2]
+    assert all(fields["seconds"] >= 0 for event, fields in events if event == "refresh")
+
+
+def test_get_all_top_n_tokens_batches_every_prompt():
+    explorer = FakeExplorer()
+    session = TokenSession(explorer, prompt="1 2", tokens_to_show=2)
+    session.add_prompt()
+    session.append_token(10)
+
+    distributions = session.get_all_top_n_tokens()
+
+    assert explorer.batched_prompts == [[1, 2], [1, 2, 10]]
+    assert len(distributions) == 2
+    assert all(len(distribution) == 2 for distribution in distributions)
+
+
+def test_set_explorer_keeps_prompts():
+    session = TokenSession(FakeExplorer(), prompt="1 2", tokens_to_show=2)
+    session.add_prompt()
+    session.append_token(10)
+    other = FakeExplorer()
+
+    session.set_explorer(other)
+
+    assert session.explorer is other
+    assert other.get_prompt_tokens() == [1, 2, 10]
+    assert session.prompts == ["1 2", "1 2 10"]
+
+
+def test_top_p_shows_variable_number_of_tokens():
+    explorer = FakeExplorer()
+    session = TokenSession(explorer, prompt="1", tokens_to_show=3, top_p=0.8)
+    assert [token["token_id"] for token in session.displayed_tokens] == [10, 20]
+
+    explorer.top_tokens = [{"token_id": 40, "token": "D", "probability": 0.95}] + explorer.top_tokens
+    session.append_token(40)
+    assert [token["token_id"] for token in session.displayed_tokens] == [40]
+    assert session.select_next_token() is False
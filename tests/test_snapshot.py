@@ -0,0 +1,11 @@
+from src.explorer import Explorer
+from src.snapshot import is_snapshot, prepare_snapshot
+
+
+def test_snapshot_matches_pretrained(tmp_path):
+    snapshot_dir = prepare_snapshot("Qwen/Qwen2.5-0.5B", str(tmp_path / "snapshot"))
+    assert is_snapshot(snapshot_dir)
+
+    from_snapshot = Explorer(snapshot_dir).set_prompt("Hello, world").get_top_n_tokens(n=5)
+    from_pretrained = Explorer().set_prompt("Hello, world").get_top_n_tokens(n=5)
+    assert from_snapshot.token_ids.tolist() == from_pretrained.token_ids.tolist()